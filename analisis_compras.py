@@ -0,0 +1,313 @@
+"""
+ANALISIS_COMPRAS.PY - Analítica de Compras
+Gasto por cliente, proveedor, categoría e ingrediente en ventanas móviles,
+precio pagado frente a mercado y ahorro potencial acumulado
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import config
+import utils
+import historico_precios
+
+# Ventanas móviles (en semanas) del resumen de gasto
+VENTANAS_SEMANAS = (4, 12)
+
+# Dimensión de análisis -> (columna clave, columna a mostrar)
+DIMENSIONES = {
+    'Cliente': ('ID Cliente', 'Nombre Cliente'),
+    'Proveedor': ('Proveedor', 'Proveedor'),
+    'Categoría': ('Categoría', 'Categoría'),
+    'Ingrediente': ('ID Ingrediente', 'Ingrediente')
+}
+
+# Granularidad del cubo semanal y medidas que se suman
+CLAVES_CUBO = ['Semana', 'ID Cliente', 'Nombre Cliente', 'Proveedor', 'Categoría', 'ID Ingrediente', 'Ingrediente']
+MEDIDAS = ['Gasto', 'Cantidad', 'Gasto Comparable', 'Cantidad Comparable', 'Gasto Mercado', 'Ahorro Potencial', 'Líneas']
+
+# ============================================================================
+# LÍNEAS DE COMPRA ENRIQUECIDAS
+# ============================================================================
+
+def _vacio():
+    return pd.DataFrame(columns=CLAVES_CUBO + MEDIDAS).astype({m: float for m in MEDIDAS})
+
+def _numero(df, columna):
+    return pd.to_numeric(df[columna], errors='coerce') if columna in df.columns else pd.Series(np.nan, index=df.index)
+
+def unir_lineas(df_lineas, df_compras):
+    """LINEAS_COMPRA con Fecha, Cliente y Proveedor de su cabecera en COMPRAS_CLIENTE"""
+    if df_lineas.empty or 'ID Compra' not in df_lineas.columns or 'ID Compra' not in df_compras.columns:
+        return pd.DataFrame()
+    cabeceras = df_compras[[c for c in ['ID Compra', 'ID Cliente', 'Nombre Cliente', 'Fecha', 'Proveedor']
+                            if c in df_compras.columns]].drop_duplicates('ID Compra')
+    return df_lineas.merge(cabeceras, on='ID Compra', how='left', suffixes=('', ' Compra'))
+
+def lineas_enriquecidas(lineas, df_ingredientes, historico=None):
+    """
+    Cada línea de compra (ya unida a su cabecera) con categoría y precio de mercado
+
+    El precio de mercado es el vigente en la fecha de la compra según el
+    histórico de precios (o el del maestro si el ingrediente no tiene histórico).
+    Ahorro Potencial = lo pagado por encima del mercado × cantidad.
+
+    Returns:
+        DataFrame alineado con lineas con las claves del cubo y las medidas
+        (Semana vacía si la compra no tiene fecha)
+    """
+    if lineas.empty:
+        return _vacio()
+
+    fecha = pd.to_datetime(lineas['Fecha'], errors='coerce') if 'Fecha' in lineas.columns \
+        else pd.Series(pd.NaT, index=lineas.index)
+    ids = _numero(lineas, 'ID Ingrediente')
+    cantidad = _numero(lineas, 'Cantidad').fillna(0)
+    precio = _numero(lineas, 'Precio Unitario')
+    gasto = _numero(lineas, 'Total Línea').fillna(precio * cantidad).fillna(0)
+
+    # Datos del maestro por ingrediente
+    categoria = pd.Series('Sin categoría', index=lineas.index)
+    mercado = pd.Series(np.nan, index=lineas.index)
+    nombre = lineas['Nombre Ingrediente'] if 'Nombre Ingrediente' in lineas.columns else pd.Series('', index=lineas.index)
+    if not df_ingredientes.empty and 'ID Ingrediente' in df_ingredientes.columns:
+        maestro = df_ingredientes.assign(**{'ID Ingrediente': _numero(df_ingredientes, 'ID Ingrediente')}) \
+            .drop_duplicates('ID Ingrediente').set_index('ID Ingrediente')
+        if 'Categoría' in maestro.columns:
+            categoria = ids.map(maestro['Categoría']).fillna('Sin categoría')
+        if 'Precio Mercado Medio' in maestro.columns:
+            mercado = ids.map(pd.to_numeric(maestro['Precio Mercado Medio'], errors='coerce'))
+        if 'Nombre' in maestro.columns:
+            nombre = nombre.fillna(ids.map(maestro['Nombre']))
+
+    if historico is not None and len(historico):
+        con_id = ids.notna().to_numpy()
+        en_fecha = np.full(len(lineas), np.nan)
+        en_fecha[con_id] = historico.precios_en(ids[con_id].astype('int64'), fecha[con_id])
+        mercado = pd.Series(en_fecha, index=lineas.index).fillna(mercado)
+
+    comparable = mercado.notna() & precio.notna()
+    return pd.DataFrame({
+        'Semana': fecha.dt.to_period('W'),
+        'ID Cliente': _numero(lineas, 'ID Cliente'),
+        'Nombre Cliente': lineas['Nombre Cliente'] if 'Nombre Cliente' in lineas.columns else '',
+        'Proveedor': lineas['Proveedor'].fillna('Sin proveedor') if 'Proveedor' in lineas.columns else 'Sin proveedor',
+        'Categoría': categoria,
+        'ID Ingrediente': ids,
+        'Ingrediente': nombre,
+        'Gasto': gasto,
+        'Cantidad': cantidad,
+        'Gasto Comparable': gasto.where(comparable, 0),
+        'Cantidad Comparable': cantidad.where(comparable, 0),
+        'Gasto Mercado': (mercado * cantidad).where(comparable, 0),
+        'Ahorro Potencial': ((precio - mercado).clip(lower=0) * cantidad).where(comparable, 0),
+        'Líneas': 1
+    })
+
+# ============================================================================
+# CUBO SEMANAL INCREMENTAL
+# ============================================================================
+
+class CuboCompras:
+    """
+    Gasto semanal por (cliente, proveedor, categoría, ingrediente)
+
+    Al cambiar las compras solo se enriquecen las líneas nuevas y solo se
+    reagregan las semanas afectadas (se restan las líneas eliminadas o
+    modificadas, comparando huellas). Las consultas agregan este cubo,
+    mucho menor que la tabla de líneas.
+    """
+
+    def __init__(self):
+        self._lineas = _vacio()
+        self._cubo = _vacio()
+        self._maestro = None
+        self.lineas_nuevas = 0
+        self.lineas_eliminadas = 0
+
+    def actualizar(self, lineas, df_ingredientes, historico=None):
+        """
+        Incorpora el estado actual de las compras aplicando solo la diferencia
+
+        Args:
+            lineas: Resultado de unir_lineas
+            df_ingredientes: INGREDIENTES_MAESTRO
+            historico: HistoricoPrecios para el precio de mercado en cada fecha
+        """
+        # Si cambia la categoría, el nombre o el precio de algún ingrediente, todas las líneas quedan obsoletas
+        columnas = [c for c in ['ID Ingrediente', 'Nombre', 'Categoría', 'Precio Mercado Medio']
+                    if c in df_ingredientes.columns]
+        maestro = frozenset(utils.huellas_filas(df_ingredientes[columnas])) if columnas else frozenset()
+        if maestro != self._maestro:
+            self.__init__()
+            self._maestro = maestro
+
+        huellas = pd.Index(utils.huellas_filas(lineas)) if not lineas.empty else pd.Index([])
+        nuevas = ~huellas.isin(self._lineas.index)
+        eliminadas = self._lineas[~self._lineas.index.isin(huellas)]
+
+        enriquecidas = lineas_enriquecidas(lineas[nuevas], df_ingredientes, historico)
+        enriquecidas.index = huellas[nuevas]
+
+        # Las líneas sin fecha se recuerdan pero no entran en el cubo
+        delta = pd.concat([enriquecidas, eliminadas.assign(**{m: -eliminadas[m] for m in MEDIDAS})])
+        delta = delta[delta['Semana'].notna()]
+        if not delta.empty:
+            semanas = delta['Semana'].unique()
+            afectadas = self._cubo['Semana'].isin(semanas)
+            recalculadas = pd.concat([self._cubo[afectadas], delta]) \
+                .groupby(CLAVES_CUBO, dropna=False)[MEDIDAS].sum().reset_index()
+            self._cubo = pd.concat([self._cubo[~afectadas], recalculadas[recalculadas['Líneas'] != 0]],
+                                   ignore_index=True)
+
+        self._lineas = pd.concat([self._lineas[~self._lineas.index.isin(eliminadas.index)], enriquecidas])
+        self.lineas_nuevas, self.lineas_eliminadas = len(enriquecidas), len(eliminadas)
+
+    def cubo(self, filtro=None):
+        """
+        Cubo semanal como tabla (una fila por semana y combinación de claves)
+
+        Args:
+            filtro: Dict {columna: valor} para restringir (p. ej. {'ID Cliente': 3})
+        """
+        cubo = self._cubo
+        for columna, valor in (filtro or {}).items():
+            cubo = cubo[cubo[columna] == valor]
+        return cubo
+
+    # ------------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------------
+
+    def gasto_por(self, dimension, filtro=None, semana_actual=None):
+        """
+        Gasto por cliente/proveedor/categoría/ingrediente en las ventanas móviles
+
+        Returns:
+            DataFrame con la dimensión, 'Gasto N sem' por ventana, 'Var % 4 sem'
+            (frente a las 4 semanas anteriores), 'Sobreprecio %' y
+            'Ahorro Potencial 12 sem'
+        """
+        semana_actual = semana_actual or pd.Period(datetime.now(), freq='W')
+        clave, nombre = DIMENSIONES[dimension]
+        cubo = self.cubo(filtro)
+        if cubo.empty:
+            return pd.DataFrame(columns=[nombre] + [f"Gasto {v} sem" for v in VENTANAS_SEMANAS])
+
+        # Antigüedad de cada fila en semanas (0 = semana actual)
+        edad = semana_actual.ordinal - pd.PeriodIndex(cubo['Semana'], freq='W').asi8
+        larga = max(VENTANAS_SEMANAS)
+        columnas = [clave] if clave == nombre else [clave, nombre]
+
+        resumen = cubo[columnas].drop_duplicates(clave).set_index(clave)
+        for ventana in VENTANAS_SEMANAS:
+            en_ventana = (edad >= 0) & (edad < ventana)
+            resumen[f"Gasto {ventana} sem"] = cubo[en_ventana].groupby(clave, dropna=False)['Gasto'].sum()
+        anteriores = cubo[(edad >= 4) & (edad < 8)].groupby(clave, dropna=False)['Gasto'].sum()
+        recientes = cubo[(edad >= 0) & (edad < larga)].groupby(clave, dropna=False)[MEDIDAS].sum()
+
+        resumen = resumen.fillna({f"Gasto {v} sem": 0 for v in VENTANAS_SEMANAS})
+        resumen['Var % 4 sem'] = ((resumen['Gasto 4 sem'] / anteriores.reindex(resumen.index).where(lambda s: s > 0) - 1)
+                                  * 100).round(1)
+        recientes = recientes.reindex(resumen.index)
+        resumen['Sobreprecio %'] = ((recientes['Gasto Comparable'] / recientes['Gasto Mercado'].where(
+            recientes['Gasto Mercado'] > 0) - 1) * 100).round(1)
+        resumen[f"Ahorro Potencial {larga} sem"] = recientes['Ahorro Potencial'].fillna(0).round(2)
+
+        resumen = resumen[resumen[f"Gasto {larga} sem"] > 0]
+        return resumen.sort_values(f"Gasto {larga} sem", ascending=False).reset_index() \
+            .drop(columns=[] if clave == nombre else [clave])
+
+    def serie_semanal(self, filtro=None, semana_actual=None):
+        """
+        Evolución semanal: gasto, sumas móviles, sobreprecio frente a mercado y ahorro potencial acumulado
+
+        Returns:
+            DataFrame indexado por semana (fecha de inicio) desde la primera compra hasta la actual
+        """
+        semana_actual = semana_actual or pd.Period(datetime.now(), freq='W')
+        cubo = self.cubo(filtro)
+        if cubo.empty:
+            return pd.DataFrame()
+
+        semanal = cubo.groupby('Semana')[MEDIDAS].sum()
+        semanas = pd.period_range(min(semanal.index.min(), semana_actual), max(semanal.index.max(), semana_actual), freq='W')
+        semanal = semanal.reindex(semanas, fill_value=0)
+
+        serie = pd.DataFrame({'Gasto': semanal['Gasto']})
+        for ventana in VENTANAS_SEMANAS:
+            serie[f"Gasto {ventana} sem"] = semanal['Gasto'].rolling(ventana, min_periods=1).sum()
+        serie['Sobreprecio %'] = ((semanal['Gasto Comparable'] / semanal['Gasto Mercado'].where(semanal['Gasto Mercado'] > 0)
+                                   - 1) * 100).round(1)
+        serie['Ahorro Potencial Acumulado'] = semanal['Ahorro Potencial'].cumsum().round(2)
+        serie.index = semanas.start_time
+        serie.index.name = 'Semana'
+        return serie
+
+    def precio_vs_mercado(self, id_ingrediente, filtro=None):
+        """Precio medio pagado (ponderado por cantidad) y de mercado por semana para un ingrediente"""
+        cubo = self.cubo(dict(filtro or {}, **{'ID Ingrediente': id_ingrediente}))
+        if cubo.empty:
+            return pd.DataFrame(columns=['Precio Pagado', 'Precio Mercado'])
+
+        semanal = cubo.groupby('Semana')[['Gasto', 'Cantidad', 'Gasto Mercado', 'Cantidad Comparable']].sum()
+        resultado = pd.DataFrame({
+            'Precio Pagado': semanal['Gasto'] / semanal['Cantidad'].where(semanal['Cantidad'] > 0),
+            'Precio Mercado': semanal['Gasto Mercado'] / semanal['Cantidad Comparable'].where(semanal['Cantidad Comparable'] > 0)
+        }).round(2)
+        resultado.index = resultado.index.start_time
+        resultado.index.name = 'Semana'
+        return resultado
+
+    def ingredientes(self, filtro=None):
+        """ID Ingrediente -> nombre de los ingredientes comprados"""
+        cubo = self.cubo(filtro).dropna(subset=['ID Ingrediente'])
+        return dict(zip(cubo['ID Ingrediente'].astype('int64'), cubo['Ingrediente']))
+
+# ============================================================================
+# ACCESO COMPARTIDO
+# ============================================================================
+
+_estado = {'cubo': None, 'version': None}
+_lock = threading.Lock()
+
+def obtener_analitica():
+    """
+    Cubo de compras actualizado con las líneas que han cambiado
+
+    Solo se vuelve a leer cuando cambian OPERACIONES o el histórico de precios.
+    """
+    version = (utils.version_archivo(config.ARCHIVO_OPERACIONES),
+               utils.version_archivo(config.ARCHIVO_HISTORICO_PRECIOS))
+
+    with _lock:
+        if _estado['cubo'] is None:
+            _estado.update(cubo=CuboCompras(), version=None)
+        cubo = _estado['cubo']
+
+        if _estado['version'] != version:
+            # Con otro histórico de precios cambia el precio de mercado de líneas ya vistas
+            if _estado['version'] is not None and _estado['version'][1] != version[1]:
+                cubo = CuboCompras()
+                _estado['cubo'] = cubo
+            try:
+                lineas = unir_lineas(
+                    utils.leer_excel(config.ARCHIVO_OPERACIONES, "LINEAS_COMPRA"),
+                    utils.leer_excel(config.ARCHIVO_OPERACIONES, "COMPRAS_CLIENTE")
+                )
+                cubo.actualizar(lineas, utils.leer_excel(config.ARCHIVO_OPERACIONES, "INGREDIENTES_MAESTRO"),
+                                historico_precios.historico())
+            except Exception as e:
+                print(f"[DEBUG] ❌ Analítica de compras: no se pudieron leer las compras: {e}")
+                return cubo
+            _estado['version'] = version
+            print(f"[DEBUG] 🛒 Analítica de compras: {cubo.lineas_nuevas} líneas nuevas, "
+                  f"{cubo.lineas_eliminadas} eliminadas")
+
+        return cubo
+
+def limpiar_cache():
+    """Olvida el cubo (se reconstruye en la siguiente consulta)"""
+    with _lock:
+        _estado.update(cubo=None, version=None)
@@ -0,0 +1,196 @@
+"""
+BUSQUEDA.PY - Índice de Búsqueda del CRM
+Índice de trigramas sobre leads, clientes e interacciones
+"""
+
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+import config
+import contexto_datos
+import utils
+
+# ============================================================================
+# CONFIGURACIÓN DEL ÍNDICE
+# ============================================================================
+
+# Por hoja: (columna ID, columnas indexadas). La primera columna es el nombre.
+CAMPOS_BUSQUEDA = {
+    "LEADS": ('ID', ['Nombre Comercial', 'Ciudad', 'Nombre Contacto', 'Email', 'Teléfono', 'Notas']),
+    "CLIENTES_ACTIVOS": ('ID', ['Nombre Comercial', 'Razón Social', 'Ciudad', 'Nombre Contacto',
+                                'Email', 'Teléfono', 'Notas']),
+    "INTERACCIONES": ('ID Interacción', ['Nombre Cliente', 'Descripción', 'Próxima Acción', 'Responsable'])
+}
+
+# Fracción mínima de trigramas de la consulta que debe contener un resultado
+UMBRAL_SIMILITUD = 0.6
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+# ============================================================================
+# NORMALIZACIÓN
+# ============================================================================
+
+def normalizar_texto(texto):
+    """Minúsculas, sin tildes y solo letras/números separados por un espacio"""
+    if texto is None or (isinstance(texto, float) and pd.isna(texto)):
+        return ""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii').lower()
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+def normalizar_serie(serie):
+    """Versión vectorizada de normalizar_texto para una columna completa"""
+    texto = (serie.fillna('').astype(str)
+             .str.normalize('NFKD')
+             .str.encode('ascii', 'ignore')
+             .str.decode('ascii')
+             .str.lower())
+    return texto.str.replace(_NO_ALFANUMERICO, ' ', regex=True).str.strip()
+
+def trigramas(texto, bordes=True):
+    """
+    Trigramas de cada palabra de un texto ya normalizado
+
+    Args:
+        texto: Texto normalizado
+        bordes: Si True, añade espacios al principio y final de cada palabra
+            (así los inicios de palabra pesan más). Para la consulta se usan
+            sin bordes, de modo que cualquier subcadena coincide al 100%.
+    """
+    resultado = set()
+    for palabra in texto.split():
+        if bordes:
+            palabra = f"  {palabra} "
+        resultado.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return resultado
+
+# ============================================================================
+# ÍNDICE DE TRIGRAMAS
+# ============================================================================
+
+class IndiceTrigramas:
+    """
+    Índice invertido trigrama -> posiciones de documento
+
+    Una búsqueda solo toca las listas de los trigramas de la consulta,
+    no recorre todas las filas.
+    """
+
+    def __init__(self, claves, textos, nombres):
+        self.claves = np.asarray(claves)
+        self.textos = pd.Series(textos, dtype=object).reset_index(drop=True)
+        self.nombres = pd.Series(nombres, dtype=object).reset_index(drop=True)
+
+        listas = {}
+        for posicion, texto in enumerate(self.textos):
+            for trigrama in trigramas(texto):
+                listas.setdefault(trigrama, []).append(posicion)
+        self._listas = {t: np.asarray(p, dtype=np.int32) for t, p in listas.items()}
+
+    def __len__(self):
+        return len(self.claves)
+
+    def buscar(self, consulta, limite=None, umbral=UMBRAL_SIMILITUD):
+        """
+        Busca una consulta en el índice
+
+        Returns:
+            DataFrame con columnas 'clave' y 'puntuacion', de mayor a menor relevancia.
+            Coincidencia exacta de la consulta suma 1, en el nombre otros 0.5
+            y cada palabra completa encontrada hasta 0.25 en total.
+        """
+        vacio = pd.DataFrame({'clave': self.claves[:0], 'puntuacion': np.array([], dtype=float)})
+        consulta = normalizar_texto(consulta)
+        if not consulta or len(self) == 0:
+            return vacio
+
+        trigramas_consulta = trigramas(consulta, bordes=False)
+
+        if trigramas_consulta:
+            listas = [self._listas[t] for t in trigramas_consulta if t in self._listas]
+            if not listas:
+                return vacio
+            conteo = np.bincount(np.concatenate(listas), minlength=len(self))
+            similitud = conteo / len(trigramas_consulta)
+            candidatos = np.flatnonzero(similitud >= umbral)
+        else:
+            # Consultas de 1-2 letras: búsqueda de subcadena sobre el texto normalizado
+            candidatos = np.flatnonzero(self.textos.str.contains(consulta, regex=False).to_numpy())
+            similitud = np.ones(len(self))
+
+        if len(candidatos) == 0:
+            return vacio
+
+        textos = self.textos.iloc[candidatos]
+        exacto = textos.str.contains(consulta, regex=False).to_numpy()
+        en_nombre = self.nombres.iloc[candidatos].str.contains(consulta, regex=False).to_numpy()
+        # Desempate: palabras completas de la consulta presentes (también las de 1-2 letras)
+        palabras = consulta.split()
+        con_bordes = ' ' + textos + ' '
+        por_palabra = sum(con_bordes.str.contains(f' {p} ', regex=False).to_numpy() for p in palabras) / len(palabras)
+        puntuacion = similitud[candidatos] + exacto + 0.5 * en_nombre + 0.25 * por_palabra
+
+        orden = np.argsort(-puntuacion, kind='stable')
+        if limite:
+            orden = orden[:limite]
+
+        return pd.DataFrame({
+            'clave': self.claves[candidatos[orden]],
+            'puntuacion': puntuacion[orden]
+        })
+
+def construir_indice(df, columna_id, columnas):
+    """Construye el índice de una hoja (ID + columnas de texto concatenadas)"""
+    columnas = [c for c in columnas if c in df.columns]
+    if df.empty or columna_id not in df.columns or not columnas:
+        return IndiceTrigramas([], [], [])
+
+    df = df[df[columna_id].notna()]
+    partes = []
+    for columna in columnas:
+        serie = utils.solo_digitos(df[columna]) if columna == 'Teléfono' else df[columna]
+        partes.append(normalizar_serie(serie))
+
+    textos = partes[0].str.cat(partes[1:], sep=' ') if len(partes) > 1 else partes[0]
+    return IndiceTrigramas(df[columna_id].to_numpy(), textos.tolist(), partes[0].tolist())
+
+# ============================================================================
+# API PARA LAS VISTAS DEL CRM
+# ============================================================================
+
+def indice_hoja(hoja):
+    """Índice de una hoja del CRM, compartido y reconstruido solo si el CRM cambia"""
+    def construir():
+        columna_id, columnas = CAMPOS_BUSQUEDA[hoja]
+        return construir_indice(utils.leer_excel(config.ARCHIVO_CRM, hoja), columna_id, columnas)
+
+    return contexto_datos.cache_por_version(f"busqueda:{hoja}", [config.ARCHIVO_CRM], construir)
+
+def buscar(consulta, hoja, limite=None):
+    """Resultados (clave, puntuacion) de una hoja del CRM ordenados por relevancia"""
+    return indice_hoja(hoja).buscar(consulta, limite=limite)
+
+def filtrar(df, consulta, hoja, columna_id=None):
+    """
+    Filtra un DataFrame a las filas que coinciden con la búsqueda
+
+    Args:
+        df: DataFrame de la vista (puede venir ya filtrado)
+        consulta: Texto escrito por el usuario
+        hoja: Hoja del CRM cuyo índice se usa
+        columna_id: Columna de df con el ID (por defecto la del índice)
+
+    Returns:
+        DataFrame filtrado y ordenado por relevancia
+    """
+    if not consulta:
+        return df
+
+    columna_id = columna_id or CAMPOS_BUSQUEDA[hoja][0]
+    resultados = buscar(consulta, hoja)
+    ranking = pd.Series(np.arange(len(resultados)), index=resultados['clave'])
+    ranking = ranking[~ranking.index.duplicated()]
+
+    posicion = df[columna_id].map(ranking)
+    return df.loc[posicion.sort_values().dropna().index]
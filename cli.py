@@ -0,0 +1,427 @@
+"""
+CLI.PY - Línea de Comandos
+Operaciones por lotes sin Streamlit, sobre los mismos Excel que la app
+(pensado para tareas programadas con cron o el Programador de tareas)
+
+    python -m cli verificar-archivos
+    python -m cli recalcular-costes
+    python -m cli detectar-alertas --salida alertas.json
+    python -m cli importar-precios precios.csv
+    python -m cli importar-leads listado.xlsx --fuente Web
+    python -m cli exportar-informes --pdf --zip informes.zip
+    python -m cli generar-datos --escala grande --datos /tmp/datos_prueba
+    python -m cli medir-rendimiento --escala media --salida rendimiento.json
+
+Códigos de salida: 0 correcto, 1 error (o regresión de rendimiento),
+2 faltan archivos de datos
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import config
+
+SALIDA_OK = 0
+SALIDA_ERROR = 1
+SALIDA_FALTAN_ARCHIVOS = 2
+
+# Candidatas (por orden de preferencia) para las columnas del archivo de precios
+COLUMNAS_ID_PRECIO = ['ID Ingrediente', 'ID']
+COLUMNAS_NOMBRE_PRECIO = ['Nombre Ingrediente', 'Ingrediente', 'Nombre', 'Producto']
+COLUMNAS_PRECIO = ['Precio Mercado Medio', 'Precio Mercado', 'Precio', 'Precio Unitario']
+
+# ============================================================================
+# SALIDA Y ERRORES
+# ============================================================================
+
+_estado = {'salida': sys.stdout}
+
+def mostrar(texto=""):
+    """Escribe en la consola (también con --silencioso, que solo oculta el [DEBUG])"""
+    print(texto, file=_estado['salida'])
+
+class RegistroErrores:
+    """Destino de errores de utils para la consola: los escribe en stderr y los cuenta"""
+
+    def __init__(self):
+        self.mensajes = []
+
+    def __call__(self, mensaje):
+        self.mensajes.append(mensaje)
+        print(f"❌ {mensaje}", file=sys.stderr)
+
+def _a_json(valor):
+    """Tipos de numpy/pandas a JSON (json.dump no los conoce)"""
+    return valor.item() if hasattr(valor, 'item') else str(valor)
+
+def _archivos():
+    return {"CRM": config.ARCHIVO_CRM, "Operaciones": config.ARCHIVO_OPERACIONES,
+            "Proveedores": config.ARCHIVO_PROVEEDORES, "Empresa": config.ARCHIVO_EMPRESA}
+
+def _requiere_archivos():
+    """Código de salida si falta algún Excel (None si están todos)"""
+    faltantes = config.verificar_archivos_excel()
+    for archivo in faltantes:
+        print(f"❌ Falta {archivo}", file=sys.stderr)
+    return SALIDA_FALTAN_ARCHIVOS if faltantes else None
+
+# ============================================================================
+# COMANDOS
+# ============================================================================
+
+def verificar_archivos(args):
+    """Comprueba que existen los cuatro Excel y que se pueden leer"""
+    import utils
+
+    faltan = False
+    for nombre, ruta in _archivos().items():
+        if not os.path.exists(ruta):
+            mostrar(f"❌ {nombre}: no existe ({ruta})")
+            faltan = True
+            continue
+
+        inicio = time.perf_counter()
+        hojas = utils.leer_todas_hojas(ruta)
+        segundos = time.perf_counter() - inicio
+        if not hojas:
+            mostrar(f"❌ {nombre}: no se puede leer ({ruta})")
+            continue
+        filas = sum(len(df) for df in hojas.values())
+        mostrar(f"✅ {nombre}: {len(hojas)} hojas, {filas} filas ({segundos:.1f}s) - {ruta}")
+        if args.detalle:
+            for hoja, df in hojas.items():
+                mostrar(f"     {hoja}: {len(df)} filas, {len(df.columns)} columnas")
+
+    return SALIDA_FALTAN_ARCHIVOS if faltan else SALIDA_OK
+
+def recalcular_costes(args):
+    """Recalcula coste, margen y food cost de todos los platos desde ESCANDALLOS"""
+    import utils
+
+    df_escandallos = utils.leer_excel(config.ARCHIVO_OPERACIONES, "ESCANDALLOS")
+    if df_escandallos.empty:
+        mostrar("⚠️ ESCANDALLOS está vacía: no hay nada que recalcular")
+        return SALIDA_OK
+
+    inicio = time.perf_counter()
+    if not utils.recalcular_costes_platos(df_escandallos):
+        return SALIDA_ERROR
+    mostrar(f"♻️ {df_escandallos['ID Plato'].nunique()} platos recalculados "
+            f"en {time.perf_counter() - inicio:.1f}s")
+    return SALIDA_OK
+
+def detectar_alertas(args):
+    """Alertas de precios altos en compras y de platos con margen bajo"""
+    import pandas as pd
+    import utils
+
+    alertas = {'precios': utils.detectar_alertas_precios(), 'margenes': utils.detectar_alertas_margenes()}
+    mostrar(f"🚨 {len(alertas['precios'])} alertas de precio, {len(alertas['margenes'])} de margen")
+
+    for tipo, lista in alertas.items():
+        if lista and args.limite:
+            mostrar(f"\n{tipo.capitalize()} (primeras {min(args.limite, len(lista))}):")
+            mostrar(pd.DataFrame(lista).drop(columns='tipo').head(args.limite).to_string(index=False))
+
+    if args.salida:
+        if args.salida.lower().endswith('.csv'):
+            pd.DataFrame(alertas['precios'] + alertas['margenes']).to_csv(args.salida, index=False, encoding='utf-8-sig')
+        else:
+            with open(args.salida, 'w', encoding='utf-8') as f:
+                json.dump(alertas, f, ensure_ascii=False, indent=2, default=_a_json)
+        mostrar(f"💾 Alertas guardadas en {args.salida}")
+    return SALIDA_OK
+
+def preparar_precios(df_origen, df_ingredientes):
+    """
+    Traduce un listado de precios (por ID o por nombre de ingrediente) a
+    {ID Ingrediente: precio}
+
+    Returns:
+        tuple: (dict de precios que cambian, DataFrame de filas descartadas con Fila y Motivo)
+    """
+    import pandas as pd
+    from busqueda import normalizar_serie
+    from kpis_mensuales import detectar_columna
+
+    columna_precio = detectar_columna(df_origen, COLUMNAS_PRECIO, contiene='precio')
+    columna_id = detectar_columna(df_origen, COLUMNAS_ID_PRECIO)
+    columna_nombre = detectar_columna(df_origen, COLUMNAS_NOMBRE_PRECIO)
+    if columna_precio is None or (columna_id is None and columna_nombre is None):
+        raise ValueError("El archivo necesita una columna de precio y otra de ID o nombre de ingrediente")
+
+    precios = pd.to_numeric(df_origen[columna_precio].astype(str).str.replace(',', '.'), errors='coerce')
+    ids_maestro = pd.to_numeric(df_ingredientes['ID Ingrediente'], errors='coerce')
+    if columna_id is not None:
+        ids = pd.to_numeric(df_origen[columna_id], errors='coerce')
+        ids = ids.where(ids.isin(ids_maestro))
+    else:
+        por_nombre = dict(zip(normalizar_serie(df_ingredientes['Nombre']), ids_maestro))
+        ids = normalizar_serie(df_origen[columna_nombre]).map(por_nombre)
+
+    actuales = dict(zip(ids_maestro, pd.to_numeric(df_ingredientes['Precio Mercado Medio'], errors='coerce')))
+    motivos = pd.Series('', index=df_origen.index)
+    motivos = motivos.mask(ids.isna(), "Ingrediente no encontrado")
+    motivos = motivos.mask((motivos == '') & ~(precios > 0), "Precio no válido")
+    sin_cambio = (motivos == '') & (ids.map(actuales).round(4) == precios.round(4))
+    motivos = motivos.mask(sin_cambio, "Sin cambio")
+
+    validas = motivos == ''
+    nuevos = dict(zip(ids[validas].astype(int), precios[validas]))
+    descartadas = pd.DataFrame({'Fila': df_origen.index[~validas] + 2, 'Motivo': motivos[~validas].to_numpy()})
+    return nuevos, descartadas
+
+def importar_precios(args):
+    """Actualiza precios de mercado desde un CSV/Excel (con histórico y recálculo de escandallos)"""
+    import importacion
+    import utils
+
+    try:
+        df_origen = importacion.leer_archivo(args.archivo)
+        df_ingredientes = utils.leer_excel(config.ARCHIVO_OPERACIONES, "INGREDIENTES_MAESTRO")
+        nuevos, descartadas = preparar_precios(df_origen, df_ingredientes)
+    except Exception as e:
+        print(f"❌ No se pudo leer el archivo de precios: {e}", file=sys.stderr)
+        return SALIDA_ERROR
+
+    mostrar(f"💶 {len(df_origen)} filas: {len(nuevos)} precios nuevos, {len(descartadas)} descartadas")
+    if not descartadas.empty:
+        mostrar(descartadas.groupby('Motivo').size().to_string())
+    if not nuevos:
+        return SALIDA_OK
+    if args.simular:
+        mostrar("🔎 Simulación: no se ha guardado nada")
+        return SALIDA_OK
+
+    inicio = time.perf_counter()
+    if not utils.actualizar_precios_mercado(nuevos, fuente=args.fuente):
+        return SALIDA_ERROR
+    mostrar(f"✅ {len(nuevos)} precios actualizados y escandallos recalculados "
+            f"en {time.perf_counter() - inicio:.1f}s")
+    return SALIDA_OK
+
+def importar_leads(args):
+    """Importa un listado CSV/Excel de leads con la misma validación que la app"""
+    import importacion
+    import utils
+
+    try:
+        df_origen = importacion.leer_archivo(args.archivo)
+    except Exception as e:
+        print(f"❌ No se pudo leer el archivo: {e}", file=sys.stderr)
+        return SALIDA_ERROR
+
+    mapeo = importacion.sugerir_mapeo(df_origen.columns)
+    if 'Nombre Comercial' not in mapeo:
+        print("❌ No se encuentra la columna de Nombre Comercial", file=sys.stderr)
+        return SALIDA_ERROR
+    mostrar("📋 Columnas: " + ", ".join(f"{origen} → {destino}" for destino, origen in mapeo.items()))
+
+    validos, informe = importacion.preparar_importacion(
+        df_origen, mapeo,
+        {'Tipo Local': args.tipo_local, 'Estado Lead': args.estado,
+         'Fuente Captación': args.fuente, 'Prioridad': args.prioridad},
+        utils.leer_excel(config.ARCHIVO_CRM, "LEADS")
+    )
+    mostrar(f"✅ {len(validos)} filas válidas, ❌ {len(informe)} con errores")
+    if not informe.empty:
+        if args.errores:
+            informe.to_csv(args.errores, index=False, encoding='utf-8-sig')
+            mostrar(f"💾 Informe de errores en {args.errores}")
+        else:
+            mostrar(informe.head(20).to_string(index=False))
+
+    if validos.empty:
+        return SALIDA_OK
+    if args.simular:
+        mostrar("🔎 Simulación: no se ha guardado nada")
+        return SALIDA_OK
+
+    exito, ids = importacion.importar_leads(validos)
+    if not exito:
+        return SALIDA_ERROR
+    mostrar(f"📥 {len(ids)} leads importados (IDs {ids[0]} a {ids[-1]})")
+    return SALIDA_OK
+
+def exportar_informes(args):
+    """Genera el informe mensual de cada cliente (Excel y opcionalmente PDF)"""
+    import informes
+
+    if args.pdf and not informes.pdf_disponible():
+        print("❌ Los PDF requieren matplotlib (pip install matplotlib)", file=sys.stderr)
+        return SALIDA_ERROR
+
+    inicio = time.perf_counter()
+    resultado = informes.generar_informes(
+        args.clientes or None, carpeta=args.carpeta, pdf=args.pdf, procesos=args.procesos,
+        progreso=lambda hechos, total: mostrar(f"   {hechos}/{total} clientes")
+    )
+    if resultado.empty:
+        mostrar("⚠️ No hay clientes para los que generar informes")
+        return SALIDA_OK
+
+    errores = resultado['Error'].notna()
+    mostrar(resultado.drop(columns=['Excel', 'PDF']).to_string(index=False))
+    mostrar(f"📑 {(~errores).sum()} informes en {time.perf_counter() - inicio:.1f}s, {errores.sum()} con errores")
+
+    if args.zip:
+        archivos = resultado['Excel'].dropna().tolist() + resultado['PDF'].dropna().tolist()
+        with open(args.zip, 'wb') as f:
+            f.write(informes.comprimir_informes(archivos))
+        mostrar(f"🗜️ {len(archivos)} archivos en {args.zip}")
+    return SALIDA_ERROR if errores.any() else SALIDA_OK
+
+def generar_datos(args):
+    """Crea los cuatro Excel con datos ficticios a la escala indicada"""
+    import datos_sinteticos
+
+    faltantes = config.verificar_archivos_excel()
+    if not args.sobrescribir and 0 < len(faltantes) < len(_archivos()):
+        mostrar("⚠️ Solo se crean los archivos que faltan; sus IDs no casarán con los existentes")
+    resumen = datos_sinteticos.generar_datos(args.escala, args.semilla, solo_faltantes=not args.sobrescribir,
+                                             **_tamanos(args))
+    mostrar(resumen.to_string(index=False))
+    mostrar(f"🧪 Datos en {config.RUTA_DATOS}")
+    return SALIDA_OK
+
+def medir_rendimiento(args):
+    """Mide lectura, escritura, recálculo y alertas sobre datos sintéticos y guarda un informe JSON"""
+    import rendimiento
+
+    informe = rendimiento.ejecutar(args.escala, args.semilla, args.repeticiones, args.operaciones,
+                                   copiar_de=config.RUTA_DATOS if args.sobre_datos else None, **_tamanos(args))
+    mostrar(rendimiento.tabla_resultados(informe).to_string(index=False))
+    if args.salida:
+        rendimiento.guardar_informe(informe, args.salida)
+        mostrar(f"💾 Informe en {args.salida}")
+
+    if args.comparar:
+        anterior = rendimiento.cargar_informe(args.comparar)
+        if (anterior.get('escala'), anterior.get('tamanos')) != (informe['escala'], informe['tamanos']):
+            mostrar(f"⚠️ El informe anterior es de otra escala ({anterior.get('escala')}): la comparación es orientativa")
+        tabla = rendimiento.comparar(informe, anterior, args.tolerancia / 100)
+        mostrar(f"\nComparación con {args.comparar} (tolerancia {args.tolerancia:g}%):")
+        mostrar(tabla.to_string(index=False))
+        if tabla['regresion'].any():
+            print(f"❌ Regresión en: {', '.join(tabla.loc[tabla['regresion'], 'operacion'])}", file=sys.stderr)
+            return SALIDA_ERROR
+    return SALIDA_OK
+
+def _tamanos(args):
+    """Filas por hoja indicadas con --leads, --escandallos..."""
+    import datos_sinteticos
+    return {clave: getattr(args, clave) for clave in datos_sinteticos.ESCALAS['demo']
+            if getattr(args, clave, None) is not None}
+
+def _argumentos_escala(parser, escala):
+    import datos_sinteticos
+    parser.add_argument("--escala", default=escala, choices=list(datos_sinteticos.ESCALAS))
+    parser.add_argument("--semilla", type=int, default=42, help="Misma semilla, mismos datos")
+    grupo = parser.add_argument_group("filas por hoja (sustituyen a las de la escala)")
+    for clave in datos_sinteticos.ESCALAS['demo']:
+        grupo.add_argument(f"--{clave.replace('_', '-')}", dest=clave, type=int, metavar="N")
+
+# ============================================================================
+# ARGUMENTOS
+# ============================================================================
+
+def crear_parser():
+    """Parser con un subcomando por operación (con alias en inglés)"""
+    parser = argparse.ArgumentParser(prog="python -m cli", description=f"{config.NOMBRE_EMPRESA} - operaciones por lotes")
+    parser.add_argument("--datos", help="Carpeta de los Excel (por defecto la de config.py)")
+    parser.add_argument("-s", "--silencioso", action="store_true", help="Oculta los mensajes [DEBUG]")
+    comandos = parser.add_subparsers(dest="comando", required=True, metavar="COMANDO")
+
+    p = comandos.add_parser("verificar-archivos", aliases=["verify-files"], help=verificar_archivos.__doc__)
+    p.add_argument("--detalle", action="store_true", help="Filas y columnas de cada hoja")
+    p.set_defaults(funcion=verificar_archivos, necesita_archivos=False)
+
+    p = comandos.add_parser("recalcular-costes", aliases=["recalc-costs"], help=recalcular_costes.__doc__)
+    p.set_defaults(funcion=recalcular_costes)
+
+    p = comandos.add_parser("detectar-alertas", aliases=["detect-alerts"], help=detectar_alertas.__doc__)
+    p.add_argument("--salida", help="Guardar las alertas en .json o .csv")
+    p.add_argument("--limite", type=int, default=10, help="Alertas de cada tipo a mostrar (0 = ninguna)")
+    p.set_defaults(funcion=detectar_alertas)
+
+    p = comandos.add_parser("importar-precios", aliases=["import-prices"], help=importar_precios.__doc__)
+    p.add_argument("archivo", help="CSV/Excel con ID Ingrediente o nombre, y Precio")
+    p.add_argument("--fuente", default="Importación", help="Origen de los precios para el histórico")
+    p.add_argument("--simular", action="store_true", help="Solo mostrar qué cambiaría")
+    p.set_defaults(funcion=importar_precios)
+
+    p = comandos.add_parser("importar-leads", aliases=["import-leads"], help=importar_leads.__doc__)
+    p.add_argument("archivo", help="CSV/Excel con una fila de cabeceras")
+    p.add_argument("--tipo-local", default=config.TIPOS_LOCAL[0], choices=config.TIPOS_LOCAL)
+    p.add_argument("--estado", default=config.ESTADOS_LEAD[0], choices=config.ESTADOS_LEAD)
+    p.add_argument("--fuente", default=config.FUENTES_CAPTACION[0], choices=config.FUENTES_CAPTACION)
+    p.add_argument("--prioridad", default=config.PRIORIDADES[1], choices=config.PRIORIDADES)
+    p.add_argument("--errores", help="Guardar el informe de filas con errores en CSV")
+    p.add_argument("--simular", action="store_true", help="Validar sin guardar")
+    p.set_defaults(funcion=importar_leads)
+
+    p = comandos.add_parser("exportar-informes", aliases=["export-reports"], help=exportar_informes.__doc__)
+    p.add_argument("--clientes", type=int, nargs="+", metavar="ID", help="IDs de cliente (por defecto los activos)")
+    p.add_argument("--carpeta", help="Carpeta de salida (por defecto INFORMES/AAAA-MM)")
+    p.add_argument("--pdf", action="store_true", help="Generar también el PDF")
+    p.add_argument("--procesos", type=int, help="Procesos en paralelo (1 = sin pool)")
+    p.add_argument("--zip", help="Guardar además todos los archivos en un ZIP")
+    p.set_defaults(funcion=exportar_informes)
+
+    p = comandos.add_parser("generar-datos", aliases=["generate-data"], help=generar_datos.__doc__)
+    _argumentos_escala(p, 'demo')
+    p.add_argument("--sobrescribir", action="store_true", help="Reemplazar también los Excel que ya existen")
+    p.set_defaults(funcion=generar_datos, necesita_archivos=False)
+
+    p = comandos.add_parser("medir-rendimiento", aliases=["benchmark"], help=medir_rendimiento.__doc__)
+    _argumentos_escala(p, 'pequeña')
+    p.add_argument("--repeticiones", type=int, default=3)
+    p.add_argument("--operaciones", nargs="+", metavar="OPERACION",
+                   help="Solo estas (p. ej. leer_excel:LEADS recalcular_costes_platos)")
+    p.add_argument("--sobre-datos", action="store_true",
+                   help="Medir sobre una copia de los Excel reales en lugar de datos sintéticos")
+    p.add_argument("--salida", help="Guardar el informe JSON")
+    p.add_argument("--comparar", metavar="INFORME", help="Informe JSON anterior con el que comparar")
+    p.add_argument("--tolerancia", type=float, default=25, help="%% de empeoramiento admitido (por defecto 25)")
+    p.set_defaults(funcion=medir_rendimiento, necesita_archivos=False)
+
+    return parser
+
+def main(argv=None):
+    """Punto de entrada: devuelve el código de salida"""
+    args = crear_parser().parse_args(argv)
+
+    # Antes de importar el resto de módulos, que guardan las rutas al cargarse
+    if args.datos:
+        config.usar_ruta_datos(args.datos)
+    if getattr(args, 'necesita_archivos', True):
+        codigo = _requiere_archivos()
+        if codigo is not None:
+            return codigo
+
+    import utils
+    registro = RegistroErrores()
+    anterior = utils.definir_destino_errores(registro)
+    salida_original = sys.stdout
+    _estado['salida'] = salida_original
+    if args.silencioso:
+        sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+
+    try:
+        codigo = args.funcion(args)
+    except Exception as e:
+        print(f"❌ {args.comando}: {e}", file=sys.stderr)
+        codigo = SALIDA_ERROR
+    finally:
+        if sys.stdout is not salida_original:
+            sys.stdout.close()
+            sys.stdout = salida_original
+        utils.definir_destino_errores(anterior)
+
+    # Un error notificado por utils (lectura, escritura...) también es un fallo
+    return SALIDA_ERROR if registro.mensajes and codigo == SALIDA_OK else codigo
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+COHORTES.PY - Análisis de Cohortes de Clientes
+Retención de clientes y de MRR por mes de alta
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import config
+import contexto_datos
+import utils
+
+# ============================================================================
+# CÁLCULO DE COHORTES
+# ============================================================================
+
+def vidas_clientes(df_clientes, mes_actual):
+    """
+    Mes de alta y meses de vida de cada cliente
+
+    Un cliente está activo desde el mes de Fecha Inicio hasta el de Fecha Fin
+    (incluido). Sin Fecha Fin, los de Baja o Pausado ya no cuentan en el mes
+    actual y los Activos siguen vivos.
+
+    Returns:
+        DataFrame con Cohorte (Period), Vida (meses activos) y MRR
+    """
+    if df_clientes.empty or 'Fecha Inicio' not in df_clientes.columns:
+        return pd.DataFrame(columns=['Cohorte', 'Vida', 'MRR'])
+
+    inicio = pd.to_datetime(df_clientes['Fecha Inicio'], errors='coerce').dt.to_period('M')
+    fin = pd.to_datetime(df_clientes['Fecha Fin'], errors='coerce').dt.to_period('M') \
+        if 'Fecha Fin' in df_clientes.columns else pd.Series(pd.NaT, index=df_clientes.index)
+    estado = df_clientes['Estado'] if 'Estado' in df_clientes.columns \
+        else pd.Series('Activo', index=df_clientes.index)
+
+    precio = pd.to_numeric(df_clientes['Precio Mensual'], errors='coerce') \
+        if 'Precio Mensual' in df_clientes.columns else pd.Series(np.nan, index=df_clientes.index)
+    if 'MRR' in df_clientes.columns:
+        precio = precio.where(precio > 0, pd.to_numeric(df_clientes['MRR'], errors='coerce'))
+
+    validos = inicio.notna() & (inicio <= mes_actual)
+    ordinal_inicio = pd.PeriodIndex(inicio[validos], freq='M').asi8
+    ordinal_actual = mes_actual.ordinal
+
+    # Primer mes en el que el cliente ya no está activo
+    salida = np.full(len(ordinal_inicio), ordinal_actual + 1)
+    fin_validos = pd.PeriodIndex(fin[validos], freq='M')
+    con_fin = fin_validos.notna()
+    salida[con_fin] = fin_validos.asi8[con_fin] + 1
+    inactivo_sin_fin = ~con_fin & estado[validos].isin(['Baja', 'Pausado']).to_numpy()
+    salida[inactivo_sin_fin] = ordinal_actual
+
+    vida = np.clip(np.minimum(salida, ordinal_actual + 1) - ordinal_inicio, 0, None)
+
+    return pd.DataFrame({
+        'Cohorte': pd.PeriodIndex(inicio[validos], freq='M'),
+        'Vida': vida,
+        'MRR': precio[validos].fillna(0).to_numpy()
+    })
+
+def calcular_cohortes(df_clientes, mes_actual=None):
+    """
+    Matrices de retención por cohorte mensual de alta
+
+    Para cada cohorte c y edad k (meses desde el alta), cuenta los clientes con
+    vida > k: un histograma de vidas por cohorte acumulado de derecha a
+    izquierda, sin recorrer mes a mes.
+
+    Args:
+        df_clientes: CLIENTES_ACTIVOS (todas las filas, incluidas las bajas)
+        mes_actual: Period mensual de referencia (por defecto el mes en curso)
+
+    Returns:
+        dict con 'tamano' (Series clientes por cohorte), 'retencion' y
+        'retencion_mrr' (DataFrames cohorte × edad, en %, NaN en meses futuros),
+        'clientes' y 'mrr' (valores absolutos)
+    """
+    mes_actual = mes_actual or pd.Period(datetime.now(), freq='M')
+    vidas = vidas_clientes(df_clientes, mes_actual)
+
+    if vidas.empty:
+        vacio = pd.DataFrame()
+        return {'tamano': pd.Series(dtype=int), 'retencion': vacio, 'retencion_mrr': vacio,
+                'clientes': vacio, 'mrr': vacio}
+
+    cohortes = pd.period_range(vidas['Cohorte'].min(), mes_actual, freq='M')
+    fila = pd.PeriodIndex(vidas['Cohorte'], freq='M').asi8 - cohortes[0].ordinal
+    edades = len(cohortes)
+    vida = np.minimum(vidas['Vida'].to_numpy(), edades)
+
+    # Histograma (cohorte, vida) y acumulado inverso: activos[c, k] = nº con vida > k
+    histograma = np.zeros((len(cohortes), edades + 1))
+    histograma_mrr = np.zeros((len(cohortes), edades + 1))
+    np.add.at(histograma, (fila, vida), 1)
+    np.add.at(histograma_mrr, (fila, vida), vidas['MRR'].to_numpy())
+    activos = np.cumsum(histograma[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    activos_mrr = np.cumsum(histograma_mrr[:, ::-1], axis=1)[:, ::-1][:, 1:]
+
+    # Edades que aún no han llegado para cada cohorte
+    edad_maxima = (mes_actual.ordinal - cohortes.asi8)[:, None]
+    futuro = np.arange(edades)[None, :] > edad_maxima
+    activos[futuro] = np.nan
+    activos_mrr[futuro] = np.nan
+
+    etiquetas = cohortes.astype(str)
+    columnas = pd.Index(range(edades), name='Mes')
+    clientes = pd.DataFrame(activos, index=etiquetas, columns=columnas)
+    mrr = pd.DataFrame(activos_mrr, index=etiquetas, columns=columnas)
+
+    tamano = clientes[0]
+    con_altas = tamano > 0
+    clientes, mrr, tamano = clientes[con_altas], mrr[con_altas], tamano[con_altas].astype(int)
+    clientes.index.name = mrr.index.name = tamano.index.name = 'Cohorte'
+
+    mrr_inicial = mrr[0].where(mrr[0] > 0)
+    return {
+        'tamano': tamano,
+        'retencion': clientes.div(tamano, axis=0).mul(100).round(1),
+        'retencion_mrr': mrr.div(mrr_inicial, axis=0).mul(100).round(1),
+        'clientes': clientes,
+        'mrr': mrr
+    }
+
+def retencion_media(matriz, tamano):
+    """Retención media ponderada por tamaño de cohorte para cada edad (ignora meses futuros)"""
+    if matriz.empty:
+        return pd.Series(dtype=float)
+    pesos = matriz.notna().mul(tamano, axis=0)
+    return (matriz.fillna(0).mul(tamano, axis=0).sum() / pesos.sum().replace(0, np.nan)).round(1)
+
+# ============================================================================
+# ACCESO COMPARTIDO
+# ============================================================================
+
+def obtener_cohortes():
+    """Cohortes del CRM, recalculadas solo cuando cambia el archivo (o el mes)"""
+    mes_actual = pd.Period(datetime.now(), freq='M')
+    return contexto_datos.cache_por_version(
+        f"cohortes:{mes_actual}", [config.ARCHIVO_CRM],
+        lambda: calcular_cohortes(utils.leer_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS"), mes_actual)
+    )
@@ -26,10 +26,27 @@ ARCHIVO_OPERACIONES = os.path.join(RUTA_DATOS, "OPERACIONES_ESCANDALLOS.xlsx")
 ARCHIVO_PROVEEDORES = os.path.join(RUTA_DATOS, "PROVEEDORES_MERCADO.xlsx")
 ARCHIVO_EMPRESA = os.path.join(RUTA_DATOS, "EMPRESA_BACKOFFICE.xlsx")
 
+# Snapshot de KPIs del dashboard (se regenera cada vez que cambia el CRM)
+ARCHIVO_SNAPSHOT_KPIS = os.path.join(RUTA_DATOS, "KPIS_SNAPSHOT.json")
+
+# Histórico de precios de mercado (solo se añaden filas, nunca se reescribe)
+ARCHIVO_HISTORICO_PRECIOS = os.path.join(RUTA_DATOS, "HISTORICO_PRECIOS.csv")
+
+# Carpeta de los informes mensuales por cliente (una subcarpeta por mes)
+RUTA_INFORMES = os.path.join(RUTA_DATOS, "INFORMES")
+
 # ============================================================================
 # CONFIGURACIÓN DE LA APLICACIÓN
 # ============================================================================
 
+# Motor para guardar los Excel: "xlsxwriter" (rápido) u "openpyxl"
+MOTOR_ESCRITURA_EXCEL = "xlsxwriter"
+
+# Tareas en segundo plano (recálculo de costes, alertas, KPIs)
+HILOS_PLANIFICADOR = 2
+HORA_RECONSTRUCCION_NOCTURNA = 3  # Hora (0-23) de la reconstrucción completa diaria
+SEGUNDOS_VIGILANCIA_ARCHIVOS = 10  # Cada cuánto se comprueba si cambiaron los Excel
+
 # Nombre de la empresa
 NOMBRE_EMPRESA = "Consultoría HORECA"
 
@@ -59,6 +76,25 @@ TIPOS_PROVEEDOR = ["Mayorista", "Distribuidor", "Productor", "Cash&Carry"]
 # FUNCIONES DE VALIDACIÓN
 # ============================================================================
 
+def usar_ruta_datos(ruta):
+    """
+    Apunta todos los archivos de datos a otra carpeta (línea de comandos,
+    datos de prueba). Debe llamarse antes de importar el resto de módulos,
+    que guardan las rutas al cargarse
+    """
+    global RUTA_DATOS, ARCHIVO_CRM, ARCHIVO_OPERACIONES, ARCHIVO_PROVEEDORES, ARCHIVO_EMPRESA
+    global ARCHIVO_SNAPSHOT_KPIS, ARCHIVO_HISTORICO_PRECIOS, RUTA_INFORMES
+    
+    RUTA_DATOS = ruta
+    ARCHIVO_CRM = os.path.join(RUTA_DATOS, "CRM_CLIENTES.xlsx")
+    ARCHIVO_OPERACIONES = os.path.join(RUTA_DATOS, "OPERACIONES_ESCANDALLOS.xlsx")
+    ARCHIVO_PROVEEDORES = os.path.join(RUTA_DATOS, "PROVEEDORES_MERCADO.xlsx")
+    ARCHIVO_EMPRESA = os.path.join(RUTA_DATOS, "EMPRESA_BACKOFFICE.xlsx")
+    ARCHIVO_SNAPSHOT_KPIS = os.path.join(RUTA_DATOS, "KPIS_SNAPSHOT.json")
+    ARCHIVO_HISTORICO_PRECIOS = os.path.join(RUTA_DATOS, "HISTORICO_PRECIOS.csv")
+    RUTA_INFORMES = os.path.join(RUTA_DATOS, "INFORMES")
+    return RUTA_DATOS
+
 def verificar_archivos_excel():
     """Verifica que todos los archivos Excel existen"""
     archivos = [
@@ -109,6 +145,7 @@ MENSAJE_PRIMERA_VEZ = """
    - Crea la carpeta manualmente
    - Copia los 4 archivos Excel
    - Reinicia esta aplicación
+   - O, para probar, genera datos de ejemplo abajo (o `python -m cli generar-datos`)
 
 4. **¡Listo para empezar!**
 """
@@ -0,0 +1,166 @@
+"""
+CONTEXTO_DATOS.PY - Contexto de Datos por Ejecución
+Memoiza las lecturas de hojas y los índices derivados durante un rerun
+"""
+
+import threading
+import utils
+
+# Cada sesión de Streamlit ejecuta su script en su propio hilo
+_local = threading.local()
+
+# ============================================================================
+# CONTEXTO DE DATOS
+# ============================================================================
+
+class ContextoDatos:
+    """
+    Caché de hojas e índices válida durante una ejecución del script
+
+    Cada hoja se lee como mucho una vez por rerun (mientras el archivo no
+    cambie). Se devuelven copias para que quien modifique un DataFrame no
+    afecte al resto de vistas.
+    """
+
+    def __init__(self):
+        self._hojas = {}
+        self._indices = {}
+        self.lecturas = 0
+        self.lecturas_evitadas = 0
+        self.indices_construidos = 0
+        self.indices_reutilizados = 0
+
+    def leer(self, archivo, hoja, lector):
+        """
+        Devuelve la hoja desde el contexto o la lee con `lector`
+
+        Args:
+            archivo: Ruta del archivo Excel
+            hoja: Nombre de la hoja
+            lector: Función (archivo, hoja) -> DataFrame usada si no está en caché
+        """
+        clave = (archivo, hoja)
+        version = utils.version_archivo(archivo)
+        guardado = self._hojas.get(clave)
+
+        if guardado is not None and guardado[0] == version:
+            self.lecturas_evitadas += 1
+            return guardado[1].copy()
+
+        df = lector(archivo, hoja)
+        self.lecturas += 1
+        self._hojas[clave] = (version, df)
+        return df.copy()
+
+    def hojas_en_memoria(self, archivo):
+        """Hojas de un archivo ya leídas en este rerun (y aún vigentes)"""
+        version = utils.version_archivo(archivo)
+        return {
+            hoja: df
+            for (ruta, hoja), (v, df) in self._hojas.items()
+            if ruta == archivo and v == version
+        }
+
+    def indice(self, nombre, archivos, constructor):
+        """
+        Índice derivado (listas de opciones, mapas ID -> fila...) memoizado
+
+        Args:
+            nombre: Identificador del índice
+            archivos: Archivos de los que depende (se reconstruye si cambian)
+            constructor: Función sin argumentos que construye el índice
+        """
+        versiones = tuple(utils.version_archivo(a) for a in archivos)
+        guardado = self._indices.get(nombre)
+
+        if guardado is not None and guardado[0] == versiones:
+            self.indices_reutilizados += 1
+            return guardado[1]
+
+        valor = constructor()
+        self.indices_construidos += 1
+        self._indices[nombre] = (versiones, valor)
+        return valor
+
+    def registrar(self, archivo, hojas):
+        """
+        Guarda hojas que ya están en memoria con la versión actual del archivo
+        (tras una escritura, las hojas que no cambiaron siguen siendo válidas)
+        """
+        version = utils.version_archivo(archivo)
+        for hoja, df in hojas.items():
+            self._hojas[(archivo, hoja)] = (version, df)
+
+    def invalidar(self, archivo):
+        """Olvida las hojas e índices de un archivo tras escribir en él"""
+        self._hojas = {c: v for c, v in self._hojas.items() if c[0] != archivo}
+        self._indices = {}
+
+    def estadisticas(self):
+        """Contadores de instrumentación del rerun"""
+        return {
+            'lecturas': self.lecturas,
+            'lecturas_evitadas': self.lecturas_evitadas,
+            'indices_construidos': self.indices_construidos,
+            'indices_reutilizados': self.indices_reutilizados
+        }
+
+# ============================================================================
+# CONTEXTO ACTIVO
+# ============================================================================
+
+def iniciar_contexto():
+    """Crea un contexto nuevo para esta ejecución y lo deja activo"""
+    _local.contexto = ContextoDatos()
+    return _local.contexto
+
+def contexto_actual():
+    """Contexto activo en este hilo, o None fuera de una ejecución de la app"""
+    return getattr(_local, 'contexto', None)
+
+def finalizar_contexto():
+    """Desactiva el contexto al terminar la ejecución"""
+    contexto = contexto_actual()
+    _local.contexto = None
+    return contexto
+
+# ============================================================================
+# CACHÉ ENTRE EJECUCIONES (POR VERSIÓN DE DATOS)
+# ============================================================================
+
+_cache_versiones = {}
+_cache_lock = threading.Lock()
+
+def cache_por_version(nombre, archivos, constructor):
+    """
+    Valor derivado compartido entre reruns y sesiones (índices, agregados...)
+    Solo se reconstruye cuando cambia alguno de los archivos de los que depende
+
+    Args:
+        nombre: Identificador del valor (incluye los parámetros si los hay)
+        archivos: Archivos de los que depende
+        constructor: Función sin argumentos que calcula el valor
+
+    Si alguna lectura falla mientras se construye (p. ej. el Excel está abierto),
+    el valor se devuelve pero no se guarda: se reintenta en la siguiente llamada.
+    """
+    versiones = tuple(utils.version_archivo(a) for a in archivos)
+
+    with _cache_lock:
+        guardado = _cache_versiones.get(nombre)
+    if guardado is not None and guardado[0] == versiones:
+        return guardado[1]
+
+    fallidas = utils.lecturas_fallidas()
+    valor = constructor()
+    if utils.lecturas_fallidas() != fallidas:
+        print(f"[DEBUG] ⚠️ {nombre}: lectura fallida, no se guarda en caché")
+        return valor
+    with _cache_lock:
+        _cache_versiones[nombre] = (versiones, valor)
+    return valor
+
+def limpiar_cache():
+    """Vacía la caché entre ejecuciones (botón 🔄 Refrescar Datos)"""
+    with _cache_lock:
+        _cache_versiones.clear()
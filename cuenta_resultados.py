@@ -0,0 +1,258 @@
+"""
+CUENTA_RESULTADOS.PY - Cuenta de Resultados
+Ingresos, gastos por categoría, margen y tesorería por mes, trimestre o año
+a partir de FACTURACION y GASTOS
+"""
+
+import numpy as np
+import pandas as pd
+import config
+import contexto_datos
+import utils
+from kpis_mensuales import detectar_columna, COLUMNAS_FECHA_FACTURA, COLUMNAS_IMPORTE_FACTURA
+
+# Agrupación temporal -> frecuencia de pandas
+PERIODOS = {'Mes': 'M', 'Trimestre': 'Q', 'Año': 'Y'}
+
+# Candidatas (por orden de preferencia) para localizar columnas
+COLUMNAS_TOTAL_FACTURA = ['Total', 'Total Factura', 'Importe Total']
+COLUMNAS_FECHA_COBRO = ['Fecha Cobro', 'Fecha Pago']
+COLUMNAS_CLIENTE = ['Nombre Cliente', 'Cliente']
+COLUMNAS_SERVICIO = ['Tipo Servicio', 'Servicio', 'Servicio Contratado', 'Concepto']
+COLUMNAS_FECHA_GASTO = ['Fecha', 'Fecha Gasto', 'Fecha Factura']
+COLUMNAS_IMPORTE_GASTO = ['Importe', 'Base Imponible', 'Total']
+COLUMNAS_CATEGORIA_GASTO = ['Categoría', 'Categoria', 'Tipo']
+
+# Estados de factura o gasto que todavía no han movido caja
+ESTADOS_PENDIENTES = ['Pendiente', 'Vencida', 'Impagada', 'Emitida']
+
+# ============================================================================
+# NORMALIZACIÓN DE HOJAS
+# ============================================================================
+
+def _texto(df, columna, defecto):
+    if columna is None:
+        return pd.Series(defecto, index=df.index)
+    return df[columna].fillna(defecto).astype(str).str.strip().replace('', defecto)
+
+def _importe(df, columna):
+    if columna is None:
+        return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[columna], errors='coerce').fillna(0.0)
+
+def _liquidado(df):
+    """True en las filas que ya han movido caja (sin columna Estado se asume que sí)"""
+    columna = detectar_columna(df, ['Estado', 'Estado Pago', 'Estado Cobro'])
+    if columna is None:
+        return pd.Series(True, index=df.index)
+    return ~df[columna].astype(str).str.strip().isin(ESTADOS_PENDIENTES)
+
+def normalizar_facturas(df):
+    """
+    FACTURACION con columnas detectadas por nombre
+
+    Returns:
+        DataFrame con Mes, Mes Cobro, Cliente, Servicio, Ingresos (base
+        imponible), Total (importe con impuestos) y Cobrado (bool)
+    """
+    columnas = ['Mes', 'Mes Cobro', 'Cliente', 'Servicio', 'Ingresos', 'Total', 'Cobrado']
+    columna_fecha = detectar_columna(df, COLUMNAS_FECHA_FACTURA, contiene='fecha')
+    columna_importe = detectar_columna(df, COLUMNAS_IMPORTE_FACTURA)
+    if df.empty or columna_fecha is None or columna_importe is None:
+        return pd.DataFrame(columns=columnas)
+
+    fecha = pd.to_datetime(df[columna_fecha], errors='coerce')
+    columna_cobro = detectar_columna(df, COLUMNAS_FECHA_COBRO)
+    fecha_cobro = pd.to_datetime(df[columna_cobro], errors='coerce').fillna(fecha) if columna_cobro else fecha
+    ingresos = _importe(df, columna_importe)
+    total = _importe(df, detectar_columna(df, COLUMNAS_TOTAL_FACTURA))
+
+    facturas = pd.DataFrame({
+        'Mes': fecha.dt.to_period('M'),
+        'Mes Cobro': fecha_cobro.dt.to_period('M'),
+        'Cliente': _texto(df, detectar_columna(df, COLUMNAS_CLIENTE), 'Sin cliente'),
+        'Servicio': _texto(df, detectar_columna(df, COLUMNAS_SERVICIO), 'Sin tipo'),
+        'Ingresos': ingresos,
+        'Total': total.where(total != 0, ingresos),
+        'Cobrado': _liquidado(df)
+    })
+    return facturas[facturas['Mes'].notna()]
+
+def normalizar_gastos(df):
+    """
+    GASTOS con columnas detectadas por nombre
+
+    Returns:
+        DataFrame con Mes, Categoría, Gastos y Pagado (bool)
+    """
+    columna_fecha = detectar_columna(df, COLUMNAS_FECHA_GASTO, contiene='fecha')
+    columna_importe = detectar_columna(df, COLUMNAS_IMPORTE_GASTO)
+    if df.empty or columna_fecha is None or columna_importe is None:
+        return pd.DataFrame(columns=['Mes', 'Categoría', 'Gastos', 'Pagado'])
+
+    gastos = pd.DataFrame({
+        'Mes': pd.to_datetime(df[columna_fecha], errors='coerce').dt.to_period('M'),
+        'Categoría': _texto(df, detectar_columna(df, COLUMNAS_CATEGORIA_GASTO), 'Sin categoría'),
+        'Gastos': _importe(df, columna_importe),
+        'Pagado': _liquidado(df)
+    })
+    return gastos[gastos['Mes'].notna()]
+
+# ============================================================================
+# CUENTA DE RESULTADOS
+# ============================================================================
+
+class CuentaResultados:
+    """
+    Agregados mensuales de ingresos y gastos listos para consultar
+
+    Al construirse reduce las hojas a cubos mensuales (mes × cliente ×
+    servicio para ingresos, mes × categoría para gastos); las consultas por
+    trimestre o año solo reagrupan esos cubos, sin volver a las facturas.
+    """
+
+    def __init__(self, df_facturas, df_gastos):
+        facturas = normalizar_facturas(df_facturas)
+        gastos = normalizar_gastos(df_gastos)
+
+        cobrado = facturas['Total'].where(facturas['Cobrado'].astype(bool), 0.0)
+        self._ingresos = facturas.assign(Cobrado=cobrado, Pendiente=facturas['Total'] - cobrado) \
+            .groupby(['Mes', 'Cliente', 'Servicio'])[['Ingresos', 'Cobrado', 'Pendiente']].sum()
+        # La caja se mueve en el mes de cobro, no en el de emisión
+        self._cobros = facturas.assign(Cobrado=cobrado) \
+            .groupby(['Mes Cobro', 'Cliente', 'Servicio'])['Cobrado'].sum()
+        self._cobros.index = self._cobros.index.set_names('Mes', level=0)
+
+        pagado = gastos['Gastos'].where(gastos['Pagado'].astype(bool), 0.0)
+        self._gastos = gastos.assign(Pagado=pagado).groupby(['Mes', 'Categoría'])[['Gastos', 'Pagado']].sum()
+
+        meses = self._ingresos.index.get_level_values('Mes').append([
+            self._cobros.index.get_level_values('Mes'), self._gastos.index.get_level_values('Mes')])
+        self.meses = pd.period_range(meses.min(), meses.max(), freq='M') if len(meses) else \
+            pd.PeriodIndex([], freq='M')
+
+    def clientes(self):
+        """Clientes con facturas, por orden alfabético"""
+        return sorted(self._ingresos.index.get_level_values('Cliente').unique())
+
+    def servicios(self):
+        """Tipos de servicio facturados, por orden alfabético"""
+        return sorted(self._ingresos.index.get_level_values('Servicio').unique())
+
+    def _filtrar(self, serie, cliente=None, servicio=None):
+        if cliente is not None:
+            serie = serie[serie.index.get_level_values('Cliente') == cliente]
+        if servicio is not None:
+            serie = serie[serie.index.get_level_values('Servicio') == servicio]
+        return serie
+
+    def _por_periodo(self, serie, periodo):
+        """Suma una serie (o DataFrame) indexada por Mes (primer nivel) en el periodo pedido, sin huecos"""
+        frecuencia = PERIODOS[periodo]
+        periodos = pd.period_range(self.meses.min(), self.meses.max(), freq=frecuencia) if len(self.meses) \
+            else pd.PeriodIndex([], freq=frecuencia)
+        if serie.empty:
+            return serie.groupby(level=0).sum().reindex(periodos, fill_value=0)
+        claves = pd.PeriodIndex(serie.index.get_level_values(0), freq='M').asfreq(frecuencia)
+        return serie.groupby(claves).sum().reindex(periodos, fill_value=0)
+
+    def resumen(self, periodo='Mes', cliente=None, servicio=None):
+        """
+        Cuenta de resultados por periodo
+
+        Args:
+            periodo: 'Mes', 'Trimestre' o 'Año'
+            cliente: Restringe los ingresos a un cliente
+            servicio: Restringe los ingresos a un tipo de servicio
+
+        Returns:
+            DataFrame por periodo con Ingresos, Gastos, Margen, Margen %,
+            Cobros, Pagos, Flujo de Caja y Caja Acumulada. Con cliente o
+            servicio solo hay ingresos y cobros (los gastos no se imputan a
+            clientes).
+        """
+        ingresos = self._filtrar(self._ingresos, cliente, servicio)
+        cobros = self._filtrar(self._cobros, cliente, servicio)
+        resumen = pd.DataFrame({
+            'Ingresos': self._por_periodo(ingresos['Ingresos'], periodo),
+            'Cobros': self._por_periodo(cobros, periodo)
+        })
+
+        if cliente is None and servicio is None:
+            resumen['Gastos'] = self._por_periodo(self._gastos['Gastos'], periodo)
+            resumen['Margen'] = resumen['Ingresos'] - resumen['Gastos']
+            resumen['Margen %'] = (resumen['Margen'] / resumen['Ingresos'].where(resumen['Ingresos'] != 0)
+                                   * 100).round(1)
+            resumen['Pagos'] = self._por_periodo(self._gastos['Pagado'], periodo)
+            resumen['Flujo de Caja'] = resumen['Cobros'] - resumen['Pagos']
+            resumen['Caja Acumulada'] = resumen['Flujo de Caja'].cumsum()
+            resumen = resumen[['Ingresos', 'Gastos', 'Margen', 'Margen %', 'Cobros', 'Pagos',
+                               'Flujo de Caja', 'Caja Acumulada']]
+
+        resumen.index = resumen.index.astype(str)
+        resumen.index.name = periodo
+        return resumen.round(2)
+
+    def gastos_por_categoria(self, periodo='Mes'):
+        """Gastos por periodo (filas) y categoría (columnas)"""
+        if self._gastos.empty:
+            return pd.DataFrame()
+        tabla = self._por_periodo(self._gastos['Gastos'].unstack('Categoría', fill_value=0), periodo)
+        tabla.index = tabla.index.astype(str)
+        tabla.index.name = periodo
+        return tabla.round(2)
+
+    def ingresos_por(self, dimension, periodo='Mes', cliente=None, servicio=None):
+        """
+        Ingresos por periodo (filas) y cliente o tipo de servicio (columnas)
+
+        Args:
+            dimension: 'Cliente' o 'Servicio'
+        """
+        ingresos = self._filtrar(self._ingresos['Ingresos'], cliente, servicio)
+        if ingresos.empty:
+            return pd.DataFrame()
+        tabla = ingresos.groupby(level=['Mes', dimension]).sum().unstack(dimension, fill_value=0)
+        tabla = self._por_periodo(tabla, periodo)
+        tabla = tabla[tabla.sum().sort_values(ascending=False).index]
+        tabla.index = tabla.index.astype(str)
+        tabla.index.name = periodo
+        return tabla.round(2)
+
+    def ranking(self, dimension, desde=None, cliente=None, servicio=None):
+        """
+        Ingresos totales por cliente o servicio (desde un mes, incluido) con su peso sobre el total
+
+        Returns:
+            DataFrame con la dimensión, Ingresos, % del Total y Pendiente de Cobro
+        """
+        datos = self._filtrar(self._ingresos, cliente, servicio)
+        if desde is not None:
+            datos = datos[datos.index.get_level_values('Mes') >= pd.Period(desde, freq='M')]
+        if datos.empty:
+            return pd.DataFrame(columns=[dimension, 'Ingresos', '% del Total', 'Pendiente de Cobro'])
+
+        tabla = datos.groupby(level=dimension)[['Ingresos', 'Pendiente']].sum()
+        total = tabla['Ingresos'].sum()
+        tabla['% del Total'] = (tabla['Ingresos'] / total * 100).round(1) if total else np.nan
+        tabla = tabla.rename(columns={'Pendiente': 'Pendiente de Cobro'})
+        tabla = tabla.sort_values('Ingresos', ascending=False).reset_index()
+        return tabla[[dimension, 'Ingresos', '% del Total', 'Pendiente de Cobro']].round(2)
+
+    def pendiente_cobro(self, cliente=None, servicio=None):
+        """Importe (con impuestos) facturado y todavía no cobrado"""
+        return round(float(self._filtrar(self._ingresos['Pendiente'], cliente, servicio).sum()), 2)
+
+# ============================================================================
+# ACCESO COMPARTIDO
+# ============================================================================
+
+def obtener_cuenta_resultados():
+    """Cuenta de resultados, recalculada solo cuando cambia EMPRESA_BACKOFFICE"""
+    def construir():
+        cuenta = CuentaResultados(utils.leer_excel(config.ARCHIVO_EMPRESA, "FACTURACION"),
+                                  utils.leer_excel(config.ARCHIVO_EMPRESA, "GASTOS"))
+        print(f"[DEBUG] 📒 Cuenta de resultados calculada ({len(cuenta.meses)} meses)")
+        return cuenta
+
+    return contexto_datos.cache_por_version("cuenta_resultados", [config.ARCHIVO_EMPRESA], construir)
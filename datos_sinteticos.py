@@ -0,0 +1,537 @@
+"""
+DATOS_SINTETICOS.PY - Generador de Datos de Prueba
+Crea los cuatro Excel (CRM, OPERACIONES, PROVEEDORES, EMPRESA) con datos
+ficticios coherentes entre sí, a la escala que se pida
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import config
+import utils
+from busqueda import normalizar_serie
+
+# Número de filas por hoja en cada escala
+ESCALAS = {
+    'demo': {'leads': 200, 'clientes': 40, 'interacciones': 400, 'servicios': 120, 'proveedores': 8,
+             'ingredientes': 80, 'platos': 400, 'escandallos': 2400, 'precios_cliente': 600,
+             'compras': 600, 'lineas_compra': 3000, 'facturas': 500, 'gastos': 300},
+    'pequeña': {'leads': 1000, 'clientes': 200, 'interacciones': 2000, 'servicios': 600, 'proveedores': 15,
+                'ingredientes': 200, 'platos': 2000, 'escandallos': 15000, 'precios_cliente': 3000,
+                'compras': 3000, 'lineas_compra': 15000, 'facturas': 2500, 'gastos': 1000},
+    'media': {'leads': 3000, 'clientes': 600, 'interacciones': 8000, 'servicios': 2000, 'proveedores': 30,
+              'ingredientes': 400, 'platos': 10000, 'escandallos': 80000, 'precios_cliente': 9000,
+              'compras': 10000, 'lineas_compra': 60000, 'facturas': 8000, 'gastos': 3000},
+    'grande': {'leads': 10000, 'clientes': 2000, 'interacciones': 30000, 'servicios': 6000, 'proveedores': 60,
+               'ingredientes': 1000, 'platos': 50000, 'escandallos': 500000, 'precios_cliente': 30000,
+               'compras': 40000, 'lineas_compra': 250000, 'facturas': 30000, 'gastos': 10000}
+}
+
+DIAS_HISTORIA = 730  # Antigüedad máxima de fechas generadas (2 años)
+
+# ============================================================================
+# VOCABULARIO
+# ============================================================================
+
+CIUDADES = {'Madrid': '28', 'Barcelona': '08', 'Valencia': '46', 'Sevilla': '41', 'Málaga': '29',
+            'Bilbao': '48', 'Zaragoza': '50', 'Granada': '18', 'Córdoba': '14', 'Cádiz': '11',
+            'Alicante': '03', 'Valladolid': '47'}
+NOMBRES_LOCAL = ['El Olivo', 'La Parra', 'El Rincón', 'La Taberna', 'Casa Pepe', 'La Bodeguilla', 'El Puerto',
+                 'La Plaza', 'El Mesón', 'Los Arcos', 'La Esquina', 'El Patio', 'La Lonja', 'El Faro',
+                 'La Huerta', 'El Molino', 'La Fragua', 'Sal y Limón', 'El Tintero', 'La Alacena',
+                 'Casa Lola', 'El Capricho', 'La Brasa', 'El Fogón', 'La Marisma', 'El Andén']
+NOMBRES_PERSONA = ['María', 'José', 'Carmen', 'Antonio', 'Lucía', 'Manuel', 'Laura', 'Francisco', 'Ana',
+                   'David', 'Marta', 'Javier', 'Elena', 'Pablo', 'Rocío', 'Sergio', 'Cristina', 'Alberto']
+APELLIDOS = ['García', 'Fernández', 'González', 'Rodríguez', 'López', 'Martínez', 'Sánchez', 'Pérez',
+             'Gómez', 'Martín', 'Jiménez', 'Ruiz', 'Hernández', 'Díaz', 'Moreno', 'Muñoz', 'Romero', 'Navarro']
+COMERCIALES = ['Fernando', 'Lucía', 'Álvaro', 'Marta']
+
+INGREDIENTES_BASE = {
+    'Carne': (['Solomillo de ternera', 'Presa ibérica', 'Pollo de corral', 'Secreto ibérico', 'Cordero lechal',
+               'Carrillada', 'Lomo de cerdo', 'Chuletón de vaca'], 'KG', (6, 45)),
+    'Pescado': (['Merluza', 'Bacalao', 'Dorada', 'Lubina', 'Pulpo', 'Gamba roja', 'Atún rojo', 'Calamar',
+                 'Boquerón', 'Rape'], 'KG', (6, 60)),
+    'Verdura': (['Tomate', 'Cebolla', 'Pimiento rojo', 'Patata', 'Calabacín', 'Berenjena', 'Ajo', 'Lechuga',
+                 'Espárrago', 'Alcachofa'], 'KG', (0.8, 9)),
+    'Lácteo': (['Leche entera', 'Nata', 'Mantequilla', 'Queso manchego', 'Queso de cabra', 'Yogur natural'],
+               'KG', (1, 22)),
+    'Aceite': (['Aceite de oliva virgen extra', 'Aceite de girasol', 'Aceite de oliva suave'], 'L', (2, 12)),
+    'Especias': (['Pimentón de la Vera', 'Azafrán', 'Comino', 'Orégano', 'Pimienta negra', 'Sal en escamas'],
+                 'KG', (3, 90)),
+    'Otros': (['Harina', 'Huevos', 'Arroz bomba', 'Azúcar', 'Pan', 'Vino blanco', 'Garbanzos'], 'KG', (0.8, 8))
+}
+VARIANTES_INGREDIENTE = ['', 'ecológico', 'extra', 'de temporada', 'congelado', 'premium', 'nacional']
+
+PLATOS_BASE = {
+    'Entrante': ['Ensalada de la casa', 'Salmorejo', 'Croquetas caseras', 'Gazpacho', 'Carpaccio'],
+    'Principal': ['Arroz meloso', 'Merluza a la bilbaína', 'Carrillada al vino tinto', 'Lubina a la sal',
+                  'Presa a la brasa', 'Pulpo a la gallega'],
+    'Postre': ['Tarta de queso', 'Torrija', 'Flan casero', 'Coulant de chocolate'],
+    'Bebida': ['Sangría', 'Limonada casera', 'Tinto de verano'],
+    'Tapa': ['Patatas bravas', 'Boquerones en vinagre', 'Ensaladilla rusa', 'Gambas al ajillo'],
+    'Menú': ['Menú del día', 'Menú degustación', 'Menú infantil']
+}
+
+TIPOS_INTERACCION = ['Visita', 'Llamada', 'Email', 'Reunión', 'WhatsApp']
+RESULTADOS_INTERACCION = ['Positivo', 'Neutro', 'Negativo']
+TIPOS_SERVICIO = ['Escandallo', 'Auditoría', 'Formación', 'Diseño de Carta', 'Consultoría']
+CATEGORIAS_GASTO = ['Software', 'Desplazamientos', 'Marketing', 'Formación', 'Gestoría', 'Material']
+CLASIFICACIONES_PLATO = ['Estrella', 'Caballo', 'Puzzle', 'Perro']
+PRECIO_SERVICIO = {'Básico': 150, 'Premium': 450, 'Cuota Mensual': 300}
+
+# ============================================================================
+# AUXILIARES
+# ============================================================================
+
+def _elegir(rng, opciones, n, p=None):
+    return np.asarray(opciones, dtype=object)[rng.choice(len(opciones), size=n, p=p)]
+
+def _fechas(rng, n, hoy, dias_atras=DIAS_HISTORIA, dias_adelante=0):
+    """Fechas al azar entre hoy - dias_atras y hoy + dias_adelante (datetime64[D])"""
+    dias = rng.integers(-dias_atras, dias_adelante + 1, size=n)
+    return (np.datetime64(hoy.date(), 'D') + dias).astype('datetime64[ns]')
+
+def _telefonos(rng, n, fijo=False):
+    inicio = np.where(rng.random(n) < 0.8, 6, 7) if not fijo else np.full(n, 9)
+    return pd.Series(inicio.astype(str)) + pd.Series(rng.integers(10**7, 10**8, size=n).astype(str))
+
+def _texto_slug(serie):
+    """'Casa Pepe Málaga' -> 'casapepemalaga' (para emails)"""
+    return normalizar_serie(pd.Series(serie)).str.replace(' ', '', regex=False)
+
+def _repartir(rng, padres, n, minimo_uno=True):
+    """
+    Asigna n hijos a los padres (p. ej. líneas a platos) de forma desigual,
+    con al menos un hijo por padre si hay suficientes
+
+    Returns:
+        Array ordenado con el padre de cada hijo
+    """
+    padres = np.asarray(padres)
+    if minimo_uno and n >= len(padres):
+        resto = rng.choice(padres, size=n - len(padres), p=_pesos(rng, len(padres)))
+        return np.sort(np.concatenate([padres, resto]))
+    return np.sort(rng.choice(padres, size=n, p=_pesos(rng, len(padres))))
+
+def _pesos(rng, n):
+    """Pesos de una distribución sesgada (unos pocos padres concentran más hijos)"""
+    pesos = rng.gamma(1.5, size=n)
+    return pesos / pesos.sum()
+
+# ============================================================================
+# CRM
+# ============================================================================
+
+def _nombres_locales(rng, n):
+    tipos = _elegir(rng, config.TIPOS_LOCAL, n)
+    return tipos, pd.Series(tipos) + ' ' + pd.Series(_elegir(rng, NOMBRES_LOCAL, n))
+
+def generar_leads(rng, n, hoy):
+    tipos, nombres = _nombres_locales(rng, n)
+    ciudades = _elegir(rng, list(CIUDADES), n)
+    con_accion = rng.random(n) < 0.3
+    fechas_accion = pd.Series(_fechas(rng, n, hoy, 15, 30)).where(con_accion)
+    return pd.DataFrame({
+        'ID': np.arange(1, n + 1),
+        'Nombre Comercial': nombres,
+        'Tipo Local': tipos,
+        'Ciudad': ciudades,
+        'CP': [CIUDADES[c] + f"{x:03d}" for c, x in zip(ciudades, rng.integers(1, 100, size=n))],
+        'Teléfono': _telefonos(rng, n),
+        'Email': _texto_slug(nombres) + np.arange(1, n + 1).astype(str) + '@gmail.com',
+        'Nombre Contacto': pd.Series(_elegir(rng, NOMBRES_PERSONA, n)) + ' ' + _elegir(rng, APELLIDOS, n),
+        'Estado Lead': _elegir(rng, config.ESTADOS_LEAD, n, p=[0.35, 0.2, 0.12, 0.1, 0.08, 0.12, 0.03]),
+        'Fuente Captación': _elegir(rng, config.FUENTES_CAPTACION, n),
+        'Fecha Contacto': _fechas(rng, n, hoy),
+        'Prioridad': _elegir(rng, config.PRIORIDADES, n, p=[0.25, 0.5, 0.25]),
+        'Próxima Acción': np.where(con_accion, _elegir(rng, ['Llamar', 'Visitar', 'Enviar propuesta'], n), ''),
+        'Fecha Próxima Acción': fechas_accion,
+        'Comercial Asignado': _elegir(rng, COMERCIALES, n),
+        'Facturación Estimada': rng.integers(5, 80, size=n) * 10000,
+        'Nº Empleados': rng.integers(2, 40, size=n),
+        'URL Google Maps': '',
+        'Rating Google': np.round(rng.uniform(3.0, 5.0, size=n), 1),
+        'Nº Reseñas': rng.integers(0, 2500, size=n),
+        'Notas': ''
+    })
+
+def generar_clientes(rng, n, hoy):
+    tipos, nombres = _nombres_locales(rng, n)
+    ciudades = _elegir(rng, list(CIUDADES), n)
+    inicio = pd.Series(_fechas(rng, n, hoy, DIAS_HISTORIA + 365))
+    estado = _elegir(rng, ['Activo', 'Pausado', 'Baja'], n, p=[0.75, 0.1, 0.15])
+    fin = (inicio + pd.to_timedelta(rng.integers(60, 500, size=n), unit='D')).clip(upper=pd.Timestamp(hoy.date()))
+    servicio = _elegir(rng, config.SERVICIOS, n)
+    precio = pd.Series(servicio).map(PRECIO_SERVICIO).to_numpy()
+    return pd.DataFrame({
+        'ID': np.arange(1, n + 1),
+        'Nombre Comercial': nombres,
+        'CIF': pd.Series(_elegir(rng, list('ABE'), n)) + pd.Series(rng.integers(10**7, 10**8, size=n).astype(str)),
+        'Razón Social': nombres + ' S.L.',
+        'Tipo Local': tipos,
+        'Dirección': 'Calle ' + pd.Series(_elegir(rng, APELLIDOS, n)) + ', ' + rng.integers(1, 120, size=n).astype(str),
+        'Ciudad': ciudades,
+        'CP': [CIUDADES[c] + f"{x:03d}" for c, x in zip(ciudades, rng.integers(1, 100, size=n))],
+        'Teléfono': _telefonos(rng, n, fijo=True),
+        'Email': 'info@' + _texto_slug(nombres) + np.arange(1, n + 1).astype(str) + '.es',
+        'Nombre Contacto': pd.Series(_elegir(rng, NOMBRES_PERSONA, n)) + ' ' + _elegir(rng, APELLIDOS, n),
+        'Servicio Contratado': servicio,
+        'Precio Mensual': precio,
+        'Fecha Inicio': inicio,
+        'Fecha Fin': fin.where(estado == 'Baja'),
+        'Estado': estado,
+        'MRR': np.where(estado == 'Activo', precio, 0),
+        'Último Servicio': pd.Series(_fechas(rng, n, hoy, 180)),
+        'Satisfacción (1-5)': rng.integers(2, 6, size=n),
+        'Notas': ''
+    })
+
+def generar_interacciones(rng, n, df_clientes, hoy):
+    clientes = df_clientes.sample(n, replace=True, random_state=rng).reset_index(drop=True)
+    horas = pd.to_timedelta(rng.integers(9 * 60, 20 * 60, size=n), unit='min')
+    con_accion = rng.random(n) < 0.2
+    return pd.DataFrame({
+        'ID Interacción': np.arange(1, n + 1),
+        'ID Cliente': clientes['ID'],
+        'Nombre Cliente': clientes['Nombre Comercial'],
+        'Fecha': pd.Series(_fechas(rng, n, hoy)) + horas,
+        'Tipo': _elegir(rng, TIPOS_INTERACCION, n),
+        'Resultado': _elegir(rng, RESULTADOS_INTERACCION, n, p=[0.5, 0.35, 0.15]),
+        'Descripción': _elegir(rng, ['Revisión de escandallos', 'Seguimiento mensual', 'Propuesta de carta',
+                                     'Incidencia con proveedor', 'Formación de cocina'], n),
+        'Próxima Acción': np.where(con_accion, _elegir(rng, ['Llamar', 'Visitar', 'Enviar informe'], n), None),
+        'Fecha Próxima Acción': pd.Series(_fechas(rng, n, hoy, 10, 30)).where(con_accion),
+        'Responsable': _elegir(rng, COMERCIALES, n)
+    })
+
+def generar_servicios(rng, n, df_clientes, hoy):
+    clientes = df_clientes.sample(n, replace=True, random_state=rng).reset_index(drop=True)
+    solicitud = pd.Series(_fechas(rng, n, hoy))
+    estado = _elegir(rng, ['Entregado', 'En curso', 'Pendiente'], n, p=[0.75, 0.15, 0.1])
+    entrega = solicitud + pd.to_timedelta(rng.integers(3, 45, size=n), unit='D')
+    return pd.DataFrame({
+        'ID Servicio': np.arange(1, n + 1),
+        'ID Cliente': clientes['ID'],
+        'Nombre Cliente': clientes['Nombre Comercial'],
+        'Tipo Servicio': _elegir(rng, TIPOS_SERVICIO, n),
+        'Fecha Solicitud': solicitud,
+        'Fecha Entrega': entrega.where(estado == 'Entregado'),
+        'Precio': rng.integers(2, 20, size=n) * 50,
+        'Estado': estado,
+        'Ahorro Generado': np.where(estado == 'Entregado', rng.integers(0, 60, size=n) * 50, 0),
+        'Notas': ''
+    })
+
+# ============================================================================
+# PROVEEDORES Y OPERACIONES
+# ============================================================================
+
+def generar_proveedores(rng, n):
+    nombres = pd.Series(_elegir(rng, ['Distribuciones', 'Hermanos', 'Comercial', 'Frutas', 'Pescados',
+                                      'Cárnicas', 'Mercados', 'Congelados'], n)) + ' ' + _elegir(rng, APELLIDOS, n)
+    repetidos = nombres.duplicated()
+    nombres[repetidos] = nombres[repetidos] + ' ' + (nombres.index[repetidos] + 1).astype(str)
+    ciudades = _elegir(rng, list(CIUDADES), n)
+    return pd.DataFrame({
+        'ID Proveedor': np.arange(1, n + 1),
+        'Nombre': nombres,
+        'Tipo': _elegir(rng, config.TIPOS_PROVEEDOR, n),
+        'Ciudad': ciudades,
+        'Teléfono': _telefonos(rng, n, fijo=True),
+        'Email': 'pedidos@' + _texto_slug(nombres) + '.es',
+        'Notas': ''
+    })
+
+def generar_ingredientes(rng, n, hoy):
+    filas = []
+    for categoria, (bases, unidad, (minimo, maximo)) in INGREDIENTES_BASE.items():
+        for base in bases:
+            for variante in VARIANTES_INGREDIENTE:
+                filas.append((f"{base} {variante}".strip(), categoria, unidad, minimo, maximo))
+    # Cada vuelta recorre todas las combinaciones; a partir de la segunda se numeran
+    vueltas = -(-n // len(filas))
+    indices = np.concatenate([rng.permutation(len(filas)) for _ in range(vueltas)])[:n]
+    vuelta = np.arange(n) // len(filas)
+    seleccion = [filas[i] for i in indices]
+    nombres = [f"{s[0]} ({v + 1})" if v else s[0] for s, v in zip(seleccion, vuelta)]
+    minimo = np.array([s[3] for s in seleccion])
+    maximo = np.array([s[4] for s in seleccion])
+    return pd.DataFrame({
+        'ID Ingrediente': np.arange(1, n + 1),
+        'Nombre': nombres,
+        'Categoría': [s[1] for s in seleccion],
+        'Unidad Compra': [s[2] for s in seleccion],
+        'Precio Mercado Medio': np.round(rng.uniform(minimo, maximo), 2),
+        'Var % Semana': 0,
+        'Var % Mes': 0,
+        'Última Actualización': _fechas(rng, n, hoy, 60),
+        'Estacionalidad': _elegir(rng, ['', '', 'Primavera', 'Verano', 'Otoño', 'Invierno'], n),
+        'Notas': ''
+    })
+
+def generar_carta_y_escandallos(rng, n_platos, n_lineas, df_clientes, df_ingredientes, df_proveedores, hoy):
+    """Platos repartidos entre clientes y sus escandallos; el coste de cada plato sale de sus líneas"""
+    id_cliente = _repartir(rng, df_clientes['ID'].to_numpy(), n_platos)
+    nombres_cliente = df_clientes.set_index('ID')['Nombre Comercial']
+    categoria = _elegir(rng, config.CATEGORIAS_PLATO, n_platos, p=[0.2, 0.3, 0.15, 0.1, 0.2, 0.05])
+    base = [PLATOS_BASE[c][i % len(PLATOS_BASE[c])] for c, i in zip(categoria, rng.integers(0, 100, size=n_platos))]
+    id_plato = np.arange(1, n_platos + 1)
+
+    # Escandallos
+    plato_linea = _repartir(rng, id_plato, n_lineas)
+    ingredientes = df_ingredientes.sample(n_lineas, replace=True, random_state=rng).reset_index(drop=True)
+    por_unidad = ingredientes['Unidad Compra'].map({'KG': 0.25, 'L': 0.05}).fillna(1.0).to_numpy()
+    cantidad = np.round(rng.uniform(0.1, 1.0, size=n_lineas) * por_unidad, 3)
+    coste_unitario = ingredientes['Precio Mercado Medio'].to_numpy()
+    coste_linea = np.round(cantidad * coste_unitario, 4)
+    coste_plato = pd.Series(coste_linea).groupby(plato_linea).sum().reindex(id_plato, fill_value=0.0).to_numpy()
+    nombre_plato = pd.Series(base) + ' ' + id_plato.astype(str)
+
+    df_escandallos = pd.DataFrame({
+        'ID Escandallo': np.arange(1, n_lineas + 1),
+        'ID Plato': plato_linea,
+        'Nombre Plato': nombre_plato.to_numpy()[plato_linea - 1],
+        'ID Ingrediente': ingredientes['ID Ingrediente'],
+        'Nombre Ingrediente': ingredientes['Nombre'],
+        'Cantidad': cantidad,
+        'Unidad': ingredientes['Unidad Compra'],
+        'Coste Unitario': coste_unitario,
+        'Coste Total': coste_linea,
+        '% del Plato': np.round(coste_linea / np.maximum(coste_plato[plato_linea - 1], 1e-9) * 100, 1),
+        'Proveedor Actual': _elegir(rng, df_proveedores['Nombre'].tolist(), n_lineas),
+        'Última Actualización': _fechas(rng, n_lineas, hoy, 90)
+    })
+
+    # Precio de venta con un food cost objetivo entre 22% y 45% (algunos platos quedan con margen bajo)
+    objetivo = rng.uniform(0.22, 0.45, size=n_platos)
+    precio_venta = np.maximum(np.round(coste_plato / objetivo * 2) / 2, 1.5)
+    margen = precio_venta - coste_plato
+    df_carta = pd.DataFrame({
+        'ID Plato': id_plato,
+        'ID Cliente': id_cliente,
+        'Nombre Cliente': nombres_cliente.reindex(id_cliente).to_numpy(),
+        'Nombre Plato': nombre_plato,
+        'Categoría': categoria,
+        'Precio Venta': precio_venta,
+        'Coste Total': np.round(coste_plato, 4),
+        'Margen €': np.round(margen, 2),
+        'Margen %': np.round(margen / precio_venta * 100, 1),
+        'Food Cost %': np.round(coste_plato / precio_venta * 100, 1),
+        'Ventas/Mes': rng.integers(0, 400, size=n_platos),
+        'Clasificación': _elegir(rng, CLASIFICACIONES_PLATO, n_platos),
+        'Precio Recomendado': np.round(coste_plato * 3, 2),
+        'Activo': _elegir(rng, ['Sí', 'No'], n_platos, p=[0.9, 0.1]),
+        'Notas': ''
+    })
+    return df_carta, df_escandallos
+
+def _sobreprecio(rng, n):
+    """Factor sobre el precio de mercado: casi todo cerca de 1, con una cola de compras caras (~10%)"""
+    return np.clip(rng.lognormal(0.02, 0.1, size=n), 0.7, 1.8)
+
+def generar_precios_cliente(rng, n, df_clientes, df_ingredientes, df_proveedores, hoy):
+    """Precios acordados por cliente (un par cliente-ingrediente como mucho una vez)"""
+    pares = pd.DataFrame({
+        'ID Cliente': rng.choice(df_clientes['ID'].to_numpy(), size=int(n * 1.2) + 10),
+        'ID Ingrediente': rng.choice(df_ingredientes['ID Ingrediente'].to_numpy(), size=int(n * 1.2) + 10)
+    }).drop_duplicates().head(n).sort_values(['ID Cliente', 'ID Ingrediente']).reset_index(drop=True)
+    ingredientes = df_ingredientes.set_index('ID Ingrediente').reindex(pares['ID Ingrediente'])
+    mercado = ingredientes['Precio Mercado Medio'].to_numpy()
+    precio = np.round(mercado * _sobreprecio(rng, len(pares)), 2)
+    return pd.DataFrame({
+        'ID Precio': np.arange(1, len(pares) + 1),
+        'ID Cliente': pares['ID Cliente'],
+        'Nombre Cliente': df_clientes.set_index('ID')['Nombre Comercial'].reindex(pares['ID Cliente']).to_numpy(),
+        'ID Ingrediente': pares['ID Ingrediente'],
+        'Nombre Ingrediente': ingredientes['Nombre'].to_numpy(),
+        'Precio Cliente': precio,
+        'Unidad': ingredientes['Unidad Compra'].to_numpy(),
+        'Precio Mercado Referencia': mercado,
+        'Desviación %': np.round((precio / mercado - 1) * 100, 1),
+        'Última Actualización': _fechas(rng, len(pares), hoy, 120),
+        'Proveedor': _elegir(rng, df_proveedores['Nombre'].tolist(), len(pares)),
+        'Notas': ''
+    })
+
+def generar_compras(rng, n_compras, n_lineas, df_clientes, df_ingredientes, df_proveedores, hoy):
+    """Cabeceras de compra y sus líneas, con precios alrededor del de mercado"""
+    clientes = df_clientes.sample(n_compras, replace=True, random_state=rng).reset_index(drop=True)
+    id_compra = np.arange(1, n_compras + 1)
+    compra_linea = _repartir(rng, id_compra, n_lineas)
+    ingredientes = df_ingredientes.sample(n_lineas, replace=True, random_state=rng).reset_index(drop=True)
+    cantidad = rng.integers(1, 25, size=n_lineas)
+    precio = np.round(ingredientes['Precio Mercado Medio'].to_numpy() * _sobreprecio(rng, n_lineas), 2)
+    total_linea = np.round(cantidad * precio, 2)
+
+    df_lineas = pd.DataFrame({
+        'ID Línea': np.arange(1, n_lineas + 1),
+        'ID Compra': compra_linea,
+        'ID Ingrediente': ingredientes['ID Ingrediente'],
+        'Nombre Ingrediente': ingredientes['Nombre'],
+        'Cantidad': cantidad,
+        'Unidad': ingredientes['Unidad Compra'],
+        'Precio Unitario': precio,
+        'Total Línea': total_linea
+    })
+    df_compras = pd.DataFrame({
+        'ID Compra': id_compra,
+        'ID Cliente': clientes['ID'],
+        'Nombre Cliente': clientes['Nombre Comercial'],
+        'Fecha': _fechas(rng, n_compras, hoy, 365),
+        'Proveedor': _elegir(rng, df_proveedores['Nombre'].tolist(), n_compras),
+        'Nº Factura': 'FP-' + pd.Series(id_compra).astype(str).str.zfill(6),
+        'Total': pd.Series(total_linea).groupby(compra_linea).sum().reindex(id_compra, fill_value=0.0).round(2).to_numpy(),
+        'Notas': ''
+    })
+    return df_compras, df_lineas
+
+# ============================================================================
+# EMPRESA
+# ============================================================================
+
+def generar_facturas(rng, n, df_clientes, hoy):
+    clientes = df_clientes.sample(n, replace=True, random_state=rng).reset_index(drop=True)
+    fecha = pd.Series(_fechas(rng, n, hoy)).sort_values(ignore_index=True)
+    concepto = np.where(rng.random(n) < 0.6, 'Cuota Mensual', _elegir(rng, TIPOS_SERVICIO, n))
+    base = np.where(concepto == 'Cuota Mensual', clientes['Precio Mensual'].replace(0, 150).to_numpy(),
+                    rng.integers(2, 30, size=n) * 50).astype(float)
+    antiguedad = (pd.Timestamp(hoy.date()) - fecha).dt.days.to_numpy()
+    estado = np.where(rng.random(n) < np.clip(antiguedad / 60, 0.1, 0.97), 'Cobrada',
+                      np.where(antiguedad > 30, 'Vencida', 'Pendiente'))
+    cobro = (fecha + pd.to_timedelta(rng.integers(0, 45, size=n), unit='D')).clip(upper=pd.Timestamp(hoy.date()))
+    return pd.DataFrame({
+        'ID Factura': np.arange(1, n + 1),
+        'Nº Factura': fecha.dt.strftime('%Y') + '-' + pd.Series(np.arange(1, n + 1)).astype(str).str.zfill(5),
+        'Fecha': fecha,
+        'ID Cliente': clientes['ID'],
+        'Nombre Cliente': clientes['Nombre Comercial'],
+        'Concepto': concepto,
+        'Base Imponible': base,
+        'IVA': np.round(base * 0.21, 2),
+        'Total': np.round(base * 1.21, 2),
+        'Estado': estado,
+        'Fecha Cobro': cobro.where(estado == 'Cobrada')
+    })
+
+def generar_gastos(rng, n, df_proveedores, hoy):
+    categoria = _elegir(rng, CATEGORIAS_GASTO, n)
+    return pd.DataFrame({
+        'ID Gasto': np.arange(1, n + 1),
+        'Fecha': pd.Series(_fechas(rng, n, hoy)).sort_values(ignore_index=True),
+        'Categoría': categoria,
+        'Concepto': pd.Series(categoria) + ' ' + rng.integers(1, 13, size=n).astype(str),
+        'Importe': np.round(rng.gamma(2.0, 60.0, size=n), 2),
+        'Proveedor': _elegir(rng, df_proveedores['Nombre'].tolist() + ['Gestoría López', 'Renfe', 'Google'], n),
+        'Estado': _elegir(rng, ['Pagado', 'Pendiente'], n, p=[0.9, 0.1])
+    })
+
+def generar_kpis_manuales(df_clientes, df_facturas, hoy):
+    """Hoja KPIS_MENSUALES (histórico manual) coherente con clientes y facturas"""
+    meses = pd.period_range(end=pd.Period(hoy, freq='M'), periods=DIAS_HISTORIA // 30, freq='M')
+    inicio = pd.to_datetime(df_clientes['Fecha Inicio']).dt.to_period('M')
+    fin = pd.to_datetime(df_clientes['Fecha Fin']).dt.to_period('M')
+    ingresos = df_facturas.groupby(pd.to_datetime(df_facturas['Fecha']).dt.to_period('M'))['Base Imponible'].sum()
+    filas = []
+    for mes in meses:
+        activos = (inicio <= mes) & (fin.isna() | (fin > mes))
+        filas.append({'Mes': str(mes), 'MRR': float(df_clientes.loc[activos, 'Precio Mensual'].sum()),
+                      'Clientes Activos': int(activos.sum()), 'Facturación': float(ingresos.get(mes, 0.0))})
+    return pd.DataFrame(filas)
+
+# ============================================================================
+# GENERACIÓN DE LOS LIBROS
+# ============================================================================
+
+def generar_libros(escala='demo', semilla=42, hoy=None, **tamanos):
+    """
+    Hojas de los cuatro libros en memoria
+
+    Args:
+        escala: Clave de ESCALAS
+        semilla: Semilla aleatoria (mismos datos con la misma semilla)
+        hoy: Fecha de referencia (por defecto ahora)
+        **tamanos: Filas de hojas concretas, sustituyen a las de la escala (p. ej. escandallos=100000)
+
+    Returns:
+        Dict {ruta del archivo: {hoja: DataFrame}}
+    """
+    if escala not in ESCALAS:
+        raise ValueError(f"Escala desconocida: {escala} (opciones: {', '.join(ESCALAS)})")
+    n = dict(ESCALAS[escala], **{k: int(v) for k, v in tamanos.items() if v is not None})
+    rng = np.random.default_rng(semilla)
+    hoy = hoy or datetime.now()
+
+    df_clientes = generar_clientes(rng, n['clientes'], hoy)
+    df_proveedores = generar_proveedores(rng, n['proveedores'])
+    df_ingredientes = generar_ingredientes(rng, n['ingredientes'], hoy)
+    df_carta, df_escandallos = generar_carta_y_escandallos(rng, n['platos'], n['escandallos'], df_clientes,
+                                                           df_ingredientes, df_proveedores, hoy)
+    df_compras, df_lineas = generar_compras(rng, n['compras'], n['lineas_compra'], df_clientes,
+                                            df_ingredientes, df_proveedores, hoy)
+    df_facturas = generar_facturas(rng, n['facturas'], df_clientes, hoy)
+
+    return {
+        config.ARCHIVO_CRM: {
+            'LEADS': generar_leads(rng, n['leads'], hoy),
+            'CLIENTES_ACTIVOS': df_clientes,
+            'INTERACCIONES': generar_interacciones(rng, n['interacciones'], df_clientes, hoy),
+            'SERVICIOS': generar_servicios(rng, n['servicios'], df_clientes, hoy)
+        },
+        config.ARCHIVO_OPERACIONES: {
+            'CARTA_CLIENTES': df_carta,
+            'ESCANDALLOS': df_escandallos,
+            'INGREDIENTES_MAESTRO': df_ingredientes,
+            'PRECIOS_POR_CLIENTE': generar_precios_cliente(rng, n['precios_cliente'], df_clientes,
+                                                           df_ingredientes, df_proveedores, hoy),
+            'COMPRAS_CLIENTE': df_compras,
+            'LINEAS_COMPRA': df_lineas
+        },
+        config.ARCHIVO_PROVEEDORES: {
+            'PROVEEDORES': df_proveedores
+        },
+        config.ARCHIVO_EMPRESA: {
+            'KPIS_MENSUALES': generar_kpis_manuales(df_clientes, df_facturas, hoy),
+            'FACTURACION': df_facturas,
+            'GASTOS': generar_gastos(rng, n['gastos'], df_proveedores, hoy)
+        }
+    }
+
+def generar_datos(escala='demo', semilla=42, solo_faltantes=True, **tamanos):
+    """
+    Escribe los cuatro Excel de prueba en la carpeta de datos de config
+
+    Args:
+        escala: Clave de ESCALAS
+        semilla: Semilla aleatoria
+        solo_faltantes: No sobrescribir los archivos que ya existen
+        **tamanos: Filas de hojas concretas (ver generar_libros)
+
+    Returns:
+        DataFrame con Archivo, Hojas, Filas, Segundos y Estado ('Creado' / 'Ya existía')
+    """
+    os.makedirs(config.RUTA_DATOS, exist_ok=True)
+    archivos = [config.ARCHIVO_CRM, config.ARCHIVO_OPERACIONES, config.ARCHIVO_PROVEEDORES, config.ARCHIVO_EMPRESA]
+    existentes = {a for a in archivos if solo_faltantes and os.path.exists(a)}
+    libros = {}
+    if len(existentes) < len(archivos):
+        inicio = time.perf_counter()
+        libros = generar_libros(escala, semilla, **tamanos)
+        print(f"[DEBUG] 🧪 Datos sintéticos ({escala}) generados en {time.perf_counter() - inicio:.1f}s")
+
+    resumen = []
+    for archivo in archivos:
+        if archivo in existentes:
+            resumen.append({'Archivo': os.path.basename(archivo), 'Hojas': None, 'Filas': None,
+                            'Segundos': 0.0, 'Estado': 'Ya existía'})
+            continue
+        hojas = libros[archivo]
+        filas = sum(len(df) for df in hojas.values())
+        inicio = time.perf_counter()
+        motor = utils.escribir_libro(archivo, hojas)
+        segundos = round(time.perf_counter() - inicio, 2)
+        print(f"[DEBUG] 💾 {os.path.basename(archivo)}: {filas} filas en {segundos}s ({motor})")
+        resumen.append({'Archivo': os.path.basename(archivo), 'Hojas': len(hojas), 'Filas': filas,
+                        'Segundos': segundos, 'Estado': 'Creado'})
+    return pd.DataFrame(resumen).astype({'Hojas': 'Int64', 'Filas': 'Int64'})
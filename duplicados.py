@@ -0,0 +1,273 @@
+"""
+DUPLICADOS.PY - Detección de Duplicados
+Agrupa leads y clientes que son el mismo local aunque se escriban distinto
+"""
+
+from difflib import SequenceMatcher
+from itertools import combinations
+import numpy as np
+import pandas as pd
+import config
+import contexto_datos
+import utils
+from busqueda import normalizar_serie
+
+# ============================================================================
+# CONFIGURACIÓN
+# ============================================================================
+
+# Similitud mínima de nombre (0-1) según la clave que comparten dos registros.
+# Compartir CIF basta; compartir teléfono o CP exige además un nombre parecido.
+# El mismo nombre solo cuenta dentro de la misma ciudad y si CP y teléfono,
+# cuando ambos los tienen, no dicen que son locales distintos.
+UMBRAL_NOMBRE = {
+    'cif': 0.0,
+    'telefono': 0.6,
+    'nombre_ciudad': 1.0,
+    'cp': 0.85
+}
+
+# Claves que, si ambos registros las tienen y difieren, descartan un par por nombre
+_CLAVES_CONTRADICTORIAS = ['cp', 'telefono']
+
+# Bloques mayores se comparan por vecindad ordenada (sin todos los pares)
+TAMANO_MAXIMO_BLOQUE = 200
+VENTANA_VECINOS = 10
+
+# Palabras que no distinguen un local de otro
+_FORMAS_JURIDICAS = {'s', 'l', 'sl', 'slu', 'sa', 'sc', 'scp', 'cb', 'sll', 'sociedad', 'limitada'}
+_PALABRAS_GENERICAS = {t.lower() for t in config.TIPOS_LOCAL} | {
+    'el', 'la', 'los', 'las', 'de', 'del', 'y', 'restaurant', 'cafe', 'cafeteria'
+}
+
+# ============================================================================
+# NORMALIZACIÓN DE CLAVES
+# ============================================================================
+
+def _nombre_clave(nombre):
+    """'BAR PEPE S.L.' -> 'pepe' (sin forma jurídica ni palabras genéricas)"""
+    palabras = [p for p in nombre.split() if p not in _FORMAS_JURIDICAS]
+    distintivas = [p for p in palabras if p not in _PALABRAS_GENERICAS]
+    return ' '.join(sorted(distintivas or palabras))
+
+def _columna(df, nombre):
+    return df[nombre] if nombre in df.columns else pd.Series('', index=df.index)
+
+def preparar_registros(df, fuente):
+    """
+    Extrae las claves normalizadas de una hoja (LEADS o CLIENTES_ACTIVOS)
+
+    Args:
+        df: DataFrame de la hoja
+        fuente: Etiqueta del origen ('Lead' o 'Cliente')
+
+    Returns:
+        DataFrame con Fuente, ID, Nombre Comercial y las claves nombre/nombre_ciudad/cp/telefono/cif
+    """
+    if df.empty or 'ID' not in df.columns:
+        return pd.DataFrame(columns=['Fuente', 'ID', 'Nombre Comercial', 'nombre', 'nombre_ciudad',
+                                     'cp', 'telefono', 'cif'])
+
+    nombre_original = _columna(df, 'Nombre Comercial').fillna('').astype(str)
+    _, telefono = utils.validar_telefonos(_columna(df, 'Teléfono'))
+    _, cp = utils.validar_cps(_columna(df, 'CP'))
+    _, cif = utils.validar_cifs(_columna(df, 'CIF'))
+    telefono = telefono.str[-9:]
+    nombre = normalizar_serie(nombre_original).map(_nombre_clave)
+    ciudad = normalizar_serie(_columna(df, 'Ciudad'))
+
+    registros = pd.DataFrame({
+        'Fuente': fuente,
+        'ID': df['ID'].to_numpy(),
+        'Nombre Comercial': nombre_original.to_numpy(),
+        'nombre': nombre.to_numpy(),
+        'nombre_ciudad': (nombre + '|' + ciudad).where((nombre != '') & (ciudad != ''), '').to_numpy(),
+        'cp': cp.where(cp.str.len() == 5, '').to_numpy(),
+        'telefono': telefono.where(telefono.str.len() == 9, '').to_numpy(),
+        'cif': cif.where(cif.str.len() >= 8, '').to_numpy()
+    })
+    return registros
+
+def similitud_nombre(a, b):
+    """Similitud 0-1 entre dos nombres ya normalizados con _nombre_clave"""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    # "Pepe 1" y "Pepe 2" son locales distintos de una misma cadena
+    numeros_a = {p for p in a.split() if p.isdigit()}
+    numeros_b = {p for p in b.split() if p.isdigit()}
+    if numeros_a and numeros_b and numeros_a != numeros_b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+# ============================================================================
+# MOTOR DE DETECCIÓN
+# ============================================================================
+
+def _pares_bloque(posiciones, nombres):
+    """Pares candidatos de un bloque (todos, o vecinos por nombre si es grande)"""
+    if len(posiciones) <= TAMANO_MAXIMO_BLOQUE:
+        return combinations(posiciones, 2)
+
+    ordenadas = posiciones[np.argsort(nombres[posiciones], kind='stable')]
+    return (
+        (ordenadas[i], ordenadas[j])
+        for i in range(len(ordenadas))
+        for j in range(i + 1, min(i + 1 + VENTANA_VECINOS, len(ordenadas)))
+    )
+
+def buscar_pares(registros):
+    """
+    Pares de registros duplicados
+
+    Solo se comparan registros que comparten CP, teléfono, CIF o nombre
+    normalizado y ciudad, así el coste crece con el tamaño de los bloques y no con
+    el cuadrado del total.
+
+    Args:
+        registros: DataFrame de preparar_registros (índice 0..n-1)
+
+    Returns:
+        DataFrame con posiciones a/b, la clave compartida y la similitud del nombre
+    """
+    nombres = registros['nombre'].to_numpy(dtype=object)
+    contradictorias = [registros[c].to_numpy(dtype=object) for c in _CLAVES_CONTRADICTORIAS]
+    pares = {}
+
+    # Las claves más fiables primero: un par queda con la primera que lo detecta
+    for clave, umbral in UMBRAL_NOMBRE.items():
+        con_valor = registros[registros[clave] != '']
+        for posiciones in con_valor.groupby(clave).indices.values():
+            if len(posiciones) < 2:
+                continue
+            posiciones = con_valor.index.to_numpy()[posiciones]
+            for a, b in _pares_bloque(posiciones, nombres):
+                par = (min(a, b), max(a, b))
+                if par in pares:
+                    continue
+                if clave == 'nombre_ciudad' and any(v[a] and v[b] and v[a] != v[b] for v in contradictorias):
+                    continue
+                similitud = similitud_nombre(nombres[a], nombres[b])
+                if similitud >= umbral:
+                    pares[par] = (clave, similitud)
+
+    return pd.DataFrame(
+        [(a, b, clave, similitud) for (a, b), (clave, similitud) in pares.items()],
+        columns=['a', 'b', 'clave', 'similitud']
+    )
+
+def agrupar_pares(pares, total):
+    """Une los pares en grupos (union-find); devuelve el grupo de cada registro"""
+    padre = np.arange(total)
+
+    def raiz(x):
+        while padre[x] != x:
+            padre[x] = padre[padre[x]]
+            x = padre[x]
+        return x
+
+    for a, b in zip(pares['a'], pares['b']):
+        ra, rb = raiz(a), raiz(b)
+        if ra != rb:
+            padre[max(ra, rb)] = min(ra, rb)
+
+    return np.array([raiz(x) for x in range(total)])
+
+def detectar_duplicados(df_leads, df_clientes):
+    """
+    Grupos de posibles duplicados entre leads y clientes
+
+    Se omiten los grupos formados solo por un lead ya convertido y su cliente.
+
+    Returns:
+        DataFrame con Grupo, Fuente, ID, Nombre Comercial, CP, Teléfono, CIF y Motivo
+    """
+    registros = pd.concat([
+        preparar_registros(df_leads, 'Lead'),
+        preparar_registros(df_clientes, 'Cliente')
+    ], ignore_index=True)
+    columnas = ['Grupo', 'Fuente', 'ID', 'Nombre Comercial', 'CP', 'Teléfono', 'CIF', 'Motivo']
+
+    pares = buscar_pares(registros)
+    if pares.empty:
+        return pd.DataFrame(columns=columnas)
+
+    registros['Grupo'] = agrupar_pares(pares, len(registros))
+    motivos = pd.concat([
+        pares[['a', 'clave']].rename(columns={'a': 'pos'}),
+        pares[['b', 'clave']].rename(columns={'b': 'pos'})
+    ]).groupby('pos')['clave'].agg(lambda c: ', '.join(sorted(set(c))))
+    registros['Motivo'] = motivos.reindex(registros.index).fillna('')
+
+    # Estado del lead para descartar conversiones ya hechas
+    convertidos = set()
+    if not df_leads.empty and 'Estado Lead' in df_leads.columns:
+        convertidos = set(df_leads.loc[df_leads['Estado Lead'] == 'Cliente', 'ID'])
+
+    tamanos = registros['Grupo'].value_counts()
+    grupos = registros[registros['Grupo'].map(tamanos) > 1]
+
+    def conversion_esperada(grupo):
+        leads = grupo[grupo['Fuente'] == 'Lead']
+        return (len(grupo) == 2 and len(leads) == 1
+                and leads['ID'].iloc[0] in convertidos)
+
+    grupos = grupos.groupby('Grupo').filter(lambda g: not conversion_esperada(g))
+    if grupos.empty:
+        return pd.DataFrame(columns=columnas)
+
+    # Numerar grupos 1..n por orden de aparición
+    grupos = grupos.assign(Grupo=pd.factorize(grupos['Grupo'])[0] + 1).sort_values('Grupo', kind='stable')
+    return grupos.rename(columns={'cp': 'CP', 'telefono': 'Teléfono', 'cif': 'CIF'})[columnas]
+
+# ============================================================================
+# USO DESDE EL CRM
+# ============================================================================
+
+def coincidencias_lote(df_nuevos, df_existentes, fuente_existentes='Cliente'):
+    """
+    Compara un lote de registros nuevos con los existentes y entre sí (una sola pasada)
+
+    Args:
+        df_nuevos: Filas a dar de alta (leads a convertir, filas importadas...)
+        df_existentes: Hoja con la que no se deben duplicar
+        fuente_existentes: Etiqueta de df_existentes ('Cliente' o 'Lead')
+
+    Returns:
+        DataFrame alineado con df_nuevos con 'ID Existente' (registro ya dado de
+        alta) y 'Posición Previa' (fila anterior del lote), vacíos si no hay duplicado
+    """
+    existentes = preparar_registros(df_existentes, fuente_existentes)
+    nuevos = preparar_registros(df_nuevos.assign(ID=np.arange(len(df_nuevos))), 'Nuevo')
+
+    resultado = pd.DataFrame({
+        'ID Existente': pd.Series([None] * len(df_nuevos), dtype=object),
+        'Posición Previa': pd.Series([None] * len(df_nuevos), dtype=object)
+    })
+    resultado.index = df_nuevos.index
+
+    registros = pd.concat([existentes, nuevos], ignore_index=True)
+    pares = buscar_pares(registros)
+    n_existentes = len(existentes)
+
+    for a, b in zip(pares['a'], pares['b']):
+        if b < n_existentes:
+            continue  # duplicados ya existentes: los muestra el informe de duplicados
+        posicion = b - n_existentes
+        if a < n_existentes:
+            resultado.iat[posicion, 0] = registros.at[a, 'ID']
+        elif resultado.iat[posicion, 1] is None:
+            resultado.iat[posicion, 1] = a - n_existentes
+
+    return resultado
+
+def duplicados_crm():
+    """Informe de duplicados de LEADS + CLIENTES_ACTIVOS, recalculado solo si cambia el CRM"""
+    return contexto_datos.cache_por_version(
+        "duplicados:informe", [config.ARCHIVO_CRM],
+        lambda: detectar_duplicados(
+            utils.leer_excel(config.ARCHIVO_CRM, "LEADS"),
+            utils.leer_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS")
+        )
+    )
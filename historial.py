@@ -0,0 +1,135 @@
+"""
+HISTORIAL.PY - Historial de Interacciones por Cliente
+Índice de INTERACCIONES ordenado por cliente y fecha para líneas de tiempo
+"""
+
+import numpy as np
+import pandas as pd
+import config
+import contexto_datos
+import utils
+
+# ============================================================================
+# ÍNDICE POR CLIENTE Y FECHA
+# ============================================================================
+
+class IndiceInteracciones:
+    """
+    INTERACCIONES ordenadas una sola vez por (ID Cliente, Fecha)
+
+    Las interacciones de cada cliente quedan contiguas, así una consulta
+    solo toca su tramo: los rangos de fechas se resuelven con búsqueda
+    binaria y nunca se recorre ni se ordena la tabla completa.
+    """
+
+    def __init__(self, df):
+        if df.empty or 'ID Cliente' not in df.columns:
+            df = pd.DataFrame(columns=['ID Cliente', 'Nombre Cliente', 'Fecha'])
+
+        fechas = pd.to_datetime(df['Fecha'], errors='coerce') if 'Fecha' in df.columns \
+            else pd.Series(pd.NaT, index=df.index)
+        ids = pd.to_numeric(df['ID Cliente'], errors='coerce')
+        validos = ids.notna().to_numpy()
+
+        df = df[validos]
+        ids = ids[validos].astype('int64').to_numpy()
+        fechas_ns = fechas[validos].to_numpy(dtype='datetime64[ns]').astype('int64')  # NaT = mínimo
+
+        orden = np.lexsort((fechas_ns, ids))
+        self._df = df.iloc[orden].reset_index(drop=True)
+        self._df['Fecha'] = fechas[validos].iloc[orden].to_numpy()
+        self._ids = ids[orden]
+        self._fechas = fechas_ns[orden]
+
+        # Tramo [inicio, fin) de cada cliente
+        unicos, inicios = np.unique(self._ids, return_index=True)
+        finales = np.append(inicios[1:], len(self._ids))
+        self._tramos = {int(i): (int(a), int(b)) for i, a, b in zip(unicos, inicios, finales)}
+
+    def __len__(self):
+        return len(self._df)
+
+    def clientes(self):
+        """
+        Clientes/leads con interacciones, el más reciente primero
+
+        Returns:
+            DataFrame con ID Cliente, Nombre Cliente, Interacciones y Última
+        """
+        if not self._tramos:
+            return pd.DataFrame(columns=['ID Cliente', 'Nombre Cliente', 'Interacciones', 'Última'])
+
+        finales = np.array([fin - 1 for _, fin in self._tramos.values()])
+        resumen = pd.DataFrame({
+            'ID Cliente': list(self._tramos.keys()),
+            'Nombre Cliente': self._df['Nombre Cliente'].to_numpy()[finales] if 'Nombre Cliente' in self._df.columns else '',
+            'Interacciones': [fin - inicio for inicio, fin in self._tramos.values()],
+            'Última': self._df['Fecha'].to_numpy()[finales]
+        })
+        return resumen.sort_values('Última', ascending=False, kind='stable').reset_index(drop=True)
+
+    def _tramo(self, id_cliente, desde=None, hasta=None):
+        """Posiciones [inicio, fin) del cliente, acotadas por fecha con búsqueda binaria"""
+        inicio, fin = self._tramos.get(int(id_cliente), (0, 0))
+        if inicio == fin:
+            return inicio, fin
+
+        fechas = self._fechas[inicio:fin]
+        if desde is not None:
+            inicio += int(np.searchsorted(fechas, pd.Timestamp(desde).value, side='left'))
+        if hasta is not None:
+            # hasta incluye el día completo
+            limite = (pd.Timestamp(hasta) + pd.Timedelta(days=1)).value
+            fin = inicio + int(np.searchsorted(self._fechas[inicio:fin], limite, side='left'))
+        return inicio, max(inicio, fin)
+
+    def linea_tiempo(self, id_cliente, desde=None, hasta=None, tipos=None, resultados=None, ultimas=None):
+        """
+        Interacciones de un cliente, la más reciente primero
+
+        Args:
+            id_cliente: ID Cliente de la interacción
+            desde, hasta: Fechas límite (inclusive), opcionales
+            tipos: Lista de tipos a incluir (Visita, Llamada...)
+            resultados: Lista de resultados a incluir (Positivo, Negativo...)
+            ultimas: Devolver solo las N más recientes
+
+        Returns:
+            DataFrame con las interacciones
+        """
+        inicio, fin = self._tramo(id_cliente, desde, hasta)
+        tramo = self._df.iloc[inicio:fin]
+
+        if tipos and 'Tipo' in tramo.columns:
+            tramo = tramo[tramo['Tipo'].isin(tipos)]
+        if resultados and 'Resultado' in tramo.columns:
+            tramo = tramo[tramo['Resultado'].isin(resultados)]
+
+        tramo = tramo.iloc[::-1]
+        if ultimas:
+            tramo = tramo.head(ultimas)
+        return tramo
+
+    def resumen_cliente(self, id_cliente):
+        """Totales del cliente: nº interacciones, primera/última fecha y reparto por tipo y resultado"""
+        inicio, fin = self._tramo(id_cliente)
+        tramo = self._df.iloc[inicio:fin]
+
+        return {
+            'total': len(tramo),
+            'primera': tramo['Fecha'].min() if len(tramo) else None,
+            'ultima': tramo['Fecha'].max() if len(tramo) else None,
+            'por_tipo': tramo['Tipo'].value_counts().to_dict() if 'Tipo' in tramo.columns else {},
+            'por_resultado': tramo['Resultado'].value_counts().to_dict() if 'Resultado' in tramo.columns else {}
+        }
+
+# ============================================================================
+# ACCESO COMPARTIDO
+# ============================================================================
+
+def indice_interacciones():
+    """Índice de INTERACCIONES, reconstruido solo cuando cambia el CRM"""
+    return contexto_datos.cache_por_version(
+        "historial:interacciones", [config.ARCHIVO_CRM],
+        lambda: IndiceInteracciones(utils.leer_excel(config.ARCHIVO_CRM, "INTERACCIONES"))
+    )
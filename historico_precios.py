@@ -0,0 +1,270 @@
+"""
+HISTORICO_PRECIOS.PY - Histórico de Precios de Mercado
+Serie temporal de solo-añadir (ingrediente, fecha, precio, fuente) con
+consultas a fecha y por ventana, y variaciones semanal/mensual
+"""
+
+import os
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import config
+import contexto_datos
+
+COLUMNAS = ['ID Ingrediente', 'Fecha', 'Precio', 'Fuente']
+
+# Separación (en días) para las variaciones del maestro
+DIAS_SEMANA = 7
+DIAS_MES = 30
+
+# Clave ordenable (ingrediente, día) en un solo int64: id * _FACTOR + día
+_FACTOR = 1 << 20
+
+_lock_escritura = threading.Lock()
+
+# ============================================================================
+# ALMACÉN (CSV DE SOLO AÑADIR)
+# ============================================================================
+
+def observaciones(ids, precios, fuente, fecha=None):
+    """Filas del histórico para unos precios (sin registrarlas; descarta IDs y precios no válidos)"""
+    nuevas = pd.DataFrame({
+        'ID Ingrediente': pd.to_numeric(pd.Series(list(ids)), errors='coerce'),
+        'Fecha': pd.to_datetime(fecha if fecha is not None else datetime.now()),
+        'Precio': pd.to_numeric(pd.Series(list(precios)), errors='coerce'),
+        'Fuente': fuente
+    })
+    nuevas = nuevas[nuevas['ID Ingrediente'].notna() & (nuevas['Precio'] > 0)]
+    nuevas['ID Ingrediente'] = nuevas['ID Ingrediente'].astype('int64')
+    return nuevas
+
+def registrar_precios(ids, precios, fuente, fecha=None):
+    """
+    Añade observaciones al histórico (nunca modifica las existentes)
+
+    Args:
+        ids: IDs de ingrediente
+        precios: Precio de cada ID (misma longitud)
+        fuente: Origen del precio ('Manual', 'Maestro', 'Importación'...)
+        fecha: Momento de la observación (por defecto ahora)
+
+    Returns:
+        Número de filas añadidas
+    """
+    nuevas = observaciones(ids, precios, fuente, fecha)
+    if nuevas.empty:
+        return 0
+
+    try:
+        with _lock_escritura:
+            existe = os.path.exists(config.ARCHIVO_HISTORICO_PRECIOS)
+            nuevas.to_csv(config.ARCHIVO_HISTORICO_PRECIOS, mode='a', header=not existe,
+                          index=False, date_format='%Y-%m-%d %H:%M:%S')
+    except Exception as e:
+        print(f"[DEBUG] ❌ No se pudo escribir el histórico de precios: {e}")
+        return 0
+
+    print(f"[DEBUG] 📈 Histórico de precios: {len(nuevas)} precios añadidos ({fuente})")
+    return len(nuevas)
+
+def registrar_precio(id_ingrediente, precio, fuente='Manual', fecha=None):
+    """Añade un único precio al histórico"""
+    return registrar_precios([id_ingrediente], [precio], fuente, fecha)
+
+def leer_historico():
+    """Histórico completo en el orden en que se registró (vacío si no existe)"""
+    if not os.path.exists(config.ARCHIVO_HISTORICO_PRECIOS):
+        return pd.DataFrame(columns=COLUMNAS)
+    df = pd.read_csv(config.ARCHIVO_HISTORICO_PRECIOS, dtype={'Fuente': str})
+    df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
+    return df
+
+# ============================================================================
+# CONSULTAS
+# ============================================================================
+
+class HistoricoPrecios:
+    """
+    Histórico en columnas (numpy) ordenado por (ingrediente, día)
+
+    Cada ingrediente ocupa un tramo contiguo; las consultas a fecha de todos
+    los ingredientes se resuelven con un único searchsorted sobre la clave
+    combinada (ingrediente, día). Dentro de un mismo día prevalece el último
+    precio registrado.
+    """
+
+    def __init__(self, df):
+        df = df.reindex(columns=COLUMNAS)
+        ids = pd.to_numeric(df['ID Ingrediente'], errors='coerce')
+        precios = pd.to_numeric(df['Precio'], errors='coerce')
+        fechas = pd.to_datetime(df['Fecha'], errors='coerce')
+        validos = (ids.notna() & precios.notna() & fechas.notna()).to_numpy()
+
+        ids = ids[validos].astype('int64').to_numpy()
+        fechas = fechas[validos].to_numpy(dtype='datetime64[ns]')
+        dias = fechas.astype('datetime64[D]').astype('int64')
+        orden = np.lexsort((np.arange(len(ids)), dias, ids))  # estable: respeta el orden de registro
+
+        self.ids = ids[orden]
+        self.fechas = fechas[orden]
+        self.precios = precios[validos].to_numpy(dtype=float)[orden]
+        self.fuentes = df['Fuente'][validos].to_numpy(dtype=object)[orden]
+        self._clave = self.ids * _FACTOR + dias[orden]
+
+        unicos, inicios = np.unique(self.ids, return_index=True)
+        finales = np.append(inicios[1:], len(self.ids))
+        self._tramos = {int(i): (int(a), int(b)) for i, a, b in zip(unicos, inicios, finales)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def ingredientes(self):
+        """IDs de ingrediente con histórico"""
+        return list(self._tramos)
+
+    def precio_a_fecha(self, fecha=None, ids=None):
+        """
+        Último precio conocido en una fecha (incluida) para cada ingrediente
+
+        Args:
+            fecha: Fecha de consulta (por defecto hoy)
+            ids: IDs a consultar (por defecto todos los del histórico)
+
+        Returns:
+            Series ID Ingrediente -> precio (NaN si no había precio aún)
+        """
+        ids = np.asarray(self.ingredientes() if ids is None else list(ids), dtype='int64')
+        dia = np.datetime64(pd.Timestamp(fecha if fecha is not None else datetime.now()).date(), 'D').astype('int64')
+
+        posiciones = np.searchsorted(self._clave, ids * _FACTOR + dia, side='right') - 1
+        encontrados = posiciones >= 0
+        encontrados[encontrados] = self.ids[posiciones[encontrados]] == ids[encontrados]
+
+        resultado = np.full(len(ids), np.nan)
+        resultado[encontrados] = self.precios[posiciones[encontrados]]
+        return pd.Series(resultado, index=pd.Index(ids, name='ID Ingrediente'))
+
+    def precios_en(self, ids, fechas):
+        """
+        Precio de mercado vigente para cada par (ingrediente, fecha)
+
+        Args:
+            ids: IDs de ingrediente
+            fechas: Fecha de cada ID (misma longitud)
+
+        Returns:
+            numpy array con el precio (NaN si no había precio en esa fecha)
+        """
+        ids = np.asarray(ids, dtype='int64')
+        fechas = pd.to_datetime(pd.Series(fechas), errors='coerce')
+        validas = fechas.notna().to_numpy()
+        dias = fechas.fillna(pd.Timestamp(0)).to_numpy(dtype='datetime64[D]').astype('int64')
+
+        posiciones = np.searchsorted(self._clave, ids * _FACTOR + dias, side='right') - 1
+        encontrados = (posiciones >= 0) & validas
+        encontrados[encontrados] = self.ids[posiciones[encontrados]] == ids[encontrados]
+
+        resultado = np.full(len(ids), np.nan)
+        resultado[encontrados] = self.precios[posiciones[encontrados]]
+        return resultado
+
+    def ventana(self, id_ingrediente, desde=None, hasta=None):
+        """
+        Precios de un ingrediente entre dos fechas (incluidas), del más antiguo al más reciente
+
+        Returns:
+            DataFrame con Fecha, Precio y Fuente
+        """
+        inicio, fin = self._tramos.get(int(id_ingrediente), (0, 0))
+        if inicio < fin:
+            clave = self._clave[inicio:fin]
+            base = int(id_ingrediente) * _FACTOR
+            if desde is not None:
+                dia = np.datetime64(pd.Timestamp(desde).date(), 'D').astype('int64')
+                inicio += int(np.searchsorted(clave, base + dia, side='left'))
+            if hasta is not None:
+                dia = np.datetime64(pd.Timestamp(hasta).date(), 'D').astype('int64')
+                fin = inicio + int(np.searchsorted(self._clave[inicio:fin], base + dia, side='right'))
+
+        tramo = slice(inicio, max(inicio, fin))
+        return pd.DataFrame({'Fecha': self.fechas[tramo], 'Precio': self.precios[tramo],
+                             'Fuente': self.fuentes[tramo]})
+
+    def variaciones(self, fecha=None, ids=None):
+        """
+        Variación semanal y mensual de todos los ingredientes a la vez
+
+        Returns:
+            DataFrame por ID Ingrediente con Precio, Var % Semana y Var % Mes
+            (NaN si no hay precio de referencia tan antiguo)
+        """
+        fecha = pd.Timestamp(fecha if fecha is not None else datetime.now())
+        actual = self.precio_a_fecha(fecha, ids)
+        semana = self.precio_a_fecha(fecha - pd.Timedelta(days=DIAS_SEMANA), actual.index)
+        mes = self.precio_a_fecha(fecha - pd.Timedelta(days=DIAS_MES), actual.index)
+
+        return pd.DataFrame({
+            'Precio': actual,
+            'Var % Semana': ((actual / semana - 1) * 100).round(1),
+            'Var % Mes': ((actual / mes - 1) * 100).round(1)
+        })
+
+# ============================================================================
+# ACCESO COMPARTIDO
+# ============================================================================
+
+def historico():
+    """Histórico de precios, recargado solo cuando se añaden filas"""
+    return contexto_datos.cache_por_version(
+        "historico_precios", [config.ARCHIVO_HISTORICO_PRECIOS],
+        lambda: HistoricoPrecios(leer_historico())
+    )
+
+def sembrar_desde_maestro(df_ingredientes):
+    """
+    Registra el precio actual del maestro de los ingredientes que aún no
+    tienen histórico (con su fecha de Última Actualización), para que el
+    primer cambio de precio tenga referencia
+
+    Returns:
+        Número de ingredientes sembrados
+    """
+    if df_ingredientes.empty or 'ID Ingrediente' not in df_ingredientes.columns:
+        return 0
+
+    ids = pd.to_numeric(df_ingredientes['ID Ingrediente'], errors='coerce')
+    pendientes = df_ingredientes[ids.notna() & ~ids.isin(historico().ingredientes())]
+    if pendientes.empty:
+        return 0
+
+    fechas = pd.to_datetime(pendientes.get('Última Actualización'), errors='coerce') \
+        if 'Última Actualización' in pendientes.columns else pd.Series(pd.NaT, index=pendientes.index)
+    fechas = fechas.fillna(pd.Timestamp(datetime.now()))
+
+    # Una escritura por fecha distinta (normalmente unas pocas)
+    total = 0
+    for fecha, grupo in pendientes.groupby(fechas):
+        total += registrar_precios(grupo['ID Ingrediente'], grupo['Precio Mercado Medio'], 'Maestro', fecha)
+    return total
+
+def aplicar_variaciones(df_ingredientes, fecha=None, pendientes=None):
+    """
+    INGREDIENTES_MAESTRO con Var % Semana y Var % Mes calculadas desde el histórico (0 si no hay referencia)
+
+    Args:
+        pendientes: Observaciones aún no registradas que se tienen en cuenta
+            (ver observaciones), para calcular antes de guardar el maestro
+    """
+    if df_ingredientes.empty or 'ID Ingrediente' not in df_ingredientes.columns:
+        return df_ingredientes
+
+    df = df_ingredientes.copy()
+    if pendientes is not None and not pendientes.empty:
+        variaciones = HistoricoPrecios(pd.concat([leer_historico(), pendientes], ignore_index=True)).variaciones(fecha)
+    else:
+        variaciones = historico().variaciones(fecha)
+    ids = pd.to_numeric(df['ID Ingrediente'], errors='coerce')
+    for columna in ['Var % Semana', 'Var % Mes']:
+        df[columna] = ids.map(variaciones[columna]).fillna(0).to_numpy()
+    return df
@@ -0,0 +1,223 @@
+"""
+IMPORTACION.PY - Importación Masiva de Leads
+Carga listados CSV/Excel en LEADS con validación y un único guardado
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import config
+import utils
+import duplicados
+from busqueda import normalizar_texto
+
+# ============================================================================
+# ESQUEMA DE LEADS
+# ============================================================================
+
+# Columnas de la hoja LEADS (mismo orden que el formulario de nuevo lead)
+COLUMNAS_LEADS = [
+    'ID', 'Nombre Comercial', 'Tipo Local', 'Ciudad', 'CP', 'Teléfono', 'Email',
+    'Nombre Contacto', 'Estado Lead', 'Fuente Captación', 'Fecha Contacto', 'Prioridad',
+    'Próxima Acción', 'Fecha Próxima Acción', 'Comercial Asignado', 'Facturación Estimada',
+    'Nº Empleados', 'URL Google Maps', 'Rating Google', 'Nº Reseñas', 'Notas'
+]
+
+# Columnas que se pueden rellenar desde el archivo
+COLUMNAS_IMPORTABLES = [
+    'Nombre Comercial', 'Tipo Local', 'Ciudad', 'CP', 'Teléfono', 'Email', 'CIF',
+    'Nombre Contacto', 'Estado Lead', 'Fuente Captación', 'Prioridad', 'Comercial Asignado',
+    'URL Google Maps', 'Rating Google', 'Nº Reseñas', 'Notas'
+]
+
+# Cabeceras habituales en los listados (normalizadas) -> columna de LEADS
+SINONIMOS = {
+    'nombre': 'Nombre Comercial', 'nombre comercial': 'Nombre Comercial', 'empresa': 'Nombre Comercial',
+    'local': 'Nombre Comercial', 'establecimiento': 'Nombre Comercial', 'negocio': 'Nombre Comercial',
+    'tipo': 'Tipo Local', 'tipo local': 'Tipo Local', 'categoria': 'Tipo Local',
+    'ciudad': 'Ciudad', 'localidad': 'Ciudad', 'poblacion': 'Ciudad', 'municipio': 'Ciudad',
+    'cp': 'CP', 'codigo postal': 'CP', 'c p': 'CP',
+    'telefono': 'Teléfono', 'tel': 'Teléfono', 'tlf': 'Teléfono', 'movil': 'Teléfono', 'phone': 'Teléfono',
+    'email': 'Email', 'e mail': 'Email', 'correo': 'Email', 'correo electronico': 'Email', 'mail': 'Email',
+    'cif': 'CIF', 'nif': 'CIF',
+    'contacto': 'Nombre Contacto', 'nombre contacto': 'Nombre Contacto', 'persona de contacto': 'Nombre Contacto',
+    'estado': 'Estado Lead', 'estado lead': 'Estado Lead',
+    'fuente': 'Fuente Captación', 'fuente captacion': 'Fuente Captación', 'origen': 'Fuente Captación',
+    'prioridad': 'Prioridad',
+    'comercial': 'Comercial Asignado', 'comercial asignado': 'Comercial Asignado',
+    'url google maps': 'URL Google Maps', 'google maps': 'URL Google Maps', 'maps': 'URL Google Maps',
+    'rating': 'Rating Google', 'rating google': 'Rating Google', 'valoracion': 'Rating Google',
+    'resenas': 'Nº Reseñas', 'n resenas': 'Nº Reseñas', 'reviews': 'Nº Reseñas',
+    'notas': 'Notas', 'observaciones': 'Notas', 'comentarios': 'Notas'
+}
+
+# ============================================================================
+# LECTURA Y MAPEO
+# ============================================================================
+
+def leer_archivo(archivo, nombre=None):
+    """
+    Lee un listado CSV o Excel como texto (sin convertir teléfonos a número)
+
+    Args:
+        archivo: Ruta o archivo subido con st.file_uploader
+        nombre: Nombre del archivo (por defecto archivo.name o la propia ruta)
+    """
+    nombre = (nombre or getattr(archivo, 'name', str(archivo))).lower()
+
+    if nombre.endswith('.csv'):
+        df = pd.read_csv(archivo, dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+    else:
+        df = pd.read_excel(archivo, dtype=str)
+
+    df.columns = [str(c).strip() for c in df.columns]
+    return df.dropna(how='all')
+
+def sugerir_mapeo(columnas_origen):
+    """
+    Propone a qué columna de LEADS corresponde cada cabecera del archivo
+
+    Returns:
+        Dict {columna de LEADS: columna del archivo}
+    """
+    mapeo = {}
+    for columna in columnas_origen:
+        destino = SINONIMOS.get(normalizar_texto(columna))
+        if destino and destino not in mapeo:
+            mapeo[destino] = columna
+    return mapeo
+
+# ============================================================================
+# VALIDACIÓN
+# ============================================================================
+
+def _texto(serie):
+    """Columna como texto sin espacios sobrantes ('' si falta)"""
+    return serie.fillna('').astype(str).str.strip()
+
+def preparar_importacion(df_origen, mapeo, valores_por_defecto=None, df_leads=None):
+    """
+    Construye las filas de LEADS a partir del archivo y las valida por columnas
+
+    Args:
+        df_origen: DataFrame leído con leer_archivo
+        mapeo: Dict {columna de LEADS: columna del archivo}
+        valores_por_defecto: Dict {columna de LEADS: valor} para lo que no venga en el archivo
+        df_leads: LEADS actual, para detectar duplicados
+
+    Returns:
+        tuple: (DataFrame de leads válidos sin ID, DataFrame de errores con Fila y Errores)
+    """
+    valores_por_defecto = valores_por_defecto or {}
+    filas_archivo = df_origen.index + 2  # +2: cabecera y numeración desde 1 en el archivo
+    df_origen = df_origen.reset_index(drop=True)
+
+    nuevos = pd.DataFrame(index=df_origen.index)
+    for columna in COLUMNAS_IMPORTABLES:
+        if mapeo.get(columna) in df_origen.columns:
+            nuevos[columna] = _texto(df_origen[mapeo[columna]])
+        else:
+            nuevos[columna] = ''
+        if columna in valores_por_defecto:
+            nuevos[columna] = nuevos[columna].mask(nuevos[columna] == '', valores_por_defecto[columna])
+
+    # Normalización y validación de formato (una pasada por columna)
+    email_valido, nuevos['Email'] = utils.validar_emails(nuevos['Email'])
+    telefono_valido, nuevos['Teléfono'] = utils.validar_telefonos(nuevos['Teléfono'])
+    cif_valido, nuevos['CIF'] = utils.validar_cifs(nuevos['CIF'])
+    cp_valido, nuevos['CP'] = utils.validar_cps(nuevos['CP'])
+
+    # Cada regla es una máscara sobre la columna completa
+    reglas = [
+        (nuevos['Nombre Comercial'] == '', "Falta Nombre Comercial"),
+        ((nuevos['Email'] != '') & ~email_valido, "Email no válido"),
+        ((nuevos['Teléfono'] != '') & ~telefono_valido, "Teléfono no válido"),
+        ((nuevos['CIF'] != '') & ~cif_valido, "CIF no válido"),
+        ((nuevos['CP'] != '') & ~cp_valido, "CP no válido"),
+        (~nuevos['Tipo Local'].isin(config.TIPOS_LOCAL + ['']), "Tipo Local desconocido"),
+        (~nuevos['Estado Lead'].isin(config.ESTADOS_LEAD + ['']), "Estado desconocido"),
+        (~nuevos['Fuente Captación'].isin(config.FUENTES_CAPTACION + ['']), "Fuente desconocida"),
+        (~nuevos['Prioridad'].isin(config.PRIORIDADES + ['']), "Prioridad desconocida")
+    ]
+
+    errores = pd.Series('', index=nuevos.index)
+    for mascara, mensaje in reglas:
+        errores = errores.mask(mascara, errores + mensaje + '; ')
+
+    # Duplicados frente a LEADS y dentro del propio archivo (se conserva la primera fila)
+    errores = errores + _duplicados(nuevos, df_leads, filas_archivo)
+    errores = errores.str.rstrip('; ')
+
+    con_error = (errores != '').to_numpy()
+    validos = nuevos[~con_error].copy()
+    informe = pd.DataFrame({
+        'Fila': filas_archivo[con_error],
+        'Nombre Comercial': nuevos['Nombre Comercial'].to_numpy()[con_error],
+        'Errores': errores.to_numpy()[con_error]
+    })
+
+    return validos, informe
+
+def _duplicados(nuevos, df_leads, filas_archivo):
+    """Mensaje de duplicado por fila nueva ('' si no lo es)"""
+    coincidencias = duplicados.coincidencias_lote(
+        nuevos, df_leads if df_leads is not None else pd.DataFrame(), 'Lead')
+
+    mensajes = pd.Series('', index=nuevos.index)
+    for posicion, (id_existente, previa) in enumerate(coincidencias.itertuples(index=False)):
+        if id_existente is not None:
+            mensajes.iat[posicion] = f"Duplicado de Lead #{id_existente}; "
+        elif previa is not None:
+            mensajes.iat[posicion] = f"Duplicado de la fila {filas_archivo[previa]}; "
+
+    return mensajes
+
+# ============================================================================
+# GUARDADO
+# ============================================================================
+
+def importar_leads(df_validos):
+    """
+    Añade los leads validados a LEADS con una sola escritura
+
+    Los IDs se asignan en bloque contiguo a continuación del máximo actual.
+
+    Returns:
+        tuple: (bool éxito, list de IDs asignados)
+    """
+    if df_validos.empty:
+        return False, []
+
+    # IDs y escritura sobre la misma lectura de LEADS. Si no se puede leer la
+    # hoja se aborta: escribir solo las filas nuevas borraría los leads existentes
+    with utils.lock_escritura(config.ARCHIVO_CRM):
+        try:
+            df_leads = utils._leer_hoja(config.ARCHIVO_CRM, "LEADS")
+        except Exception as e:
+            utils.notificar_error(f"No se pudo leer LEADS, importación cancelada: {str(e)}")
+            return False, []
+        primer_id = utils.siguiente_id(df_leads)
+        ids = list(range(primer_id, primer_id + len(df_validos)))
+
+        nuevos = df_validos.reset_index(drop=True).copy()
+        nuevos['ID'] = ids
+        nuevos['Fecha Contacto'] = datetime.now().date()
+        for columna in ['Rating Google', 'Nº Reseñas']:
+            nuevos[columna] = pd.to_numeric(nuevos[columna].str.replace(',', '.'), errors='coerce').fillna(0)
+        for columna in ['Facturación Estimada', 'Nº Empleados']:
+            nuevos[columna] = 0
+
+        # Mismas columnas que la hoja (y las que ya tenga de más, vacías)
+        columnas = list(df_leads.columns) if not df_leads.empty else list(COLUMNAS_LEADS)
+        columnas += [c for c in COLUMNAS_LEADS if c not in columnas]
+        columnas += [c for c in COLUMNAS_IMPORTABLES if c not in columnas and (nuevos[c] != '').any()]
+        nuevos = nuevos.reindex(columns=columnas)
+        nuevos = nuevos.replace('', np.nan)
+
+        print(f"[DEBUG] Importando {len(nuevos)} leads (IDs {ids[0]}-{ids[-1]})")
+        df_final = pd.concat([df_leads, nuevos], ignore_index=True)
+        guardado = utils.escribir_excel(config.ARCHIVO_CRM, "LEADS", df_final)
+
+    if guardado:
+        return True, ids
+    return False, []
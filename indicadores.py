@@ -0,0 +1,258 @@
+"""
+INDICADORES.PY - Snapshot de KPIs del Dashboard
+Cálculo y persistencia de los indicadores del CRM por versión de datos
+"""
+
+import json
+import os
+import pandas as pd
+from datetime import datetime
+import config
+import utils
+
+# ============================================================================
+# CÁLCULO DEL SNAPSHOT
+# ============================================================================
+
+def _acciones_pendientes(df, columna_cliente, columna_responsable, origen, columna_prioridad=None):
+    """Extrae las próximas acciones programadas de LEADS o INTERACCIONES"""
+    if df.empty or 'Fecha Próxima Acción' not in df.columns or 'Próxima Acción' not in df.columns:
+        return []
+
+    fechas = pd.to_datetime(df['Fecha Próxima Acción'], errors='coerce')
+    mascara = fechas.notna() & df['Próxima Acción'].notna()
+
+    acciones = []
+    for idx in df.index[mascara]:
+        row = df.loc[idx]
+        acciones.append({
+            'Fecha': fechas[idx].strftime('%Y-%m-%d'),
+            'Cliente': row.get(columna_cliente, 'N/A'),
+            'Acción': row.get('Próxima Acción', 'N/A'),
+            'Responsable': row.get(columna_responsable, 'N/A'),
+            'Origen': origen,
+            'Prioridad': row.get(columna_prioridad, 'Media') if columna_prioridad else 'Media'
+        })
+    return acciones
+
+def calcular_snapshot_crm(hojas):
+    """
+    Calcula los KPIs del dashboard a partir de las hojas del CRM
+
+    Args:
+        hojas: Dict {nombre_hoja: DataFrame} de CRM_CLIENTES
+
+    Returns:
+        Dict con el snapshot (serializable a JSON)
+    """
+    df_leads = hojas.get("LEADS", pd.DataFrame())
+    df_clientes_todos = hojas.get("CLIENTES_ACTIVOS", pd.DataFrame())
+    df_servicios = hojas.get("SERVICIOS", pd.DataFrame())
+    df_interacciones = hojas.get("INTERACCIONES", pd.DataFrame())
+
+    if 'Estado' in df_clientes_todos.columns:
+        df_clientes = df_clientes_todos[df_clientes_todos['Estado'] == 'Activo']
+        pausados = int((df_clientes_todos['Estado'] == 'Pausado').sum())
+        bajas = int((df_clientes_todos['Estado'] == 'Baja').sum())
+    else:
+        df_clientes = df_clientes_todos
+        pausados = 0
+        bajas = 0
+
+    mrr = 0.0
+    if not df_clientes.empty and 'MRR' in df_clientes.columns:
+        mrr = float(pd.to_numeric(df_clientes['MRR'], errors='coerce').sum())
+
+    satisfaccion = None
+    if not df_clientes.empty and 'Satisfacción (1-5)' in df_clientes.columns:
+        media = pd.to_numeric(df_clientes['Satisfacción (1-5)'], errors='coerce').mean()
+        satisfaccion = float(media) if pd.notna(media) else None
+
+    total_leads = len(df_leads)
+    leads_por_estado = {}
+    leads_convertidos = 0
+    if not df_leads.empty and 'Estado Lead' in df_leads.columns:
+        leads_por_estado = {str(k): int(v) for k, v in df_leads['Estado Lead'].value_counts().items()}
+        leads_convertidos = leads_por_estado.get('Cliente', 0)
+
+    tasa_conversion = (leads_convertidos / total_leads) * 100 if total_leads > 0 else 0.0
+
+    # Servicios por año-mes y tipo
+    servicios_por_mes = rollup_servicios(df_servicios)
+
+    # Próximas acciones de LEADS e INTERACCIONES
+    acciones = _acciones_pendientes(df_leads, 'Nombre Comercial', 'Comercial Asignado', 'Lead', 'Prioridad')
+    acciones += _acciones_pendientes(df_interacciones, 'Nombre Cliente', 'Responsable', 'Interacción')
+    acciones.sort(key=lambda x: x['Fecha'])
+
+    return {
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'total_leads': total_leads,
+        'clientes_activos': len(df_clientes),
+        'pausados': pausados,
+        'bajas': bajas,
+        'mrr': mrr,
+        'arr': mrr * 12,
+        'leads_convertidos': leads_convertidos,
+        'tasa_conversion': tasa_conversion,
+        'satisfaccion': satisfaccion,
+        'leads_por_estado': leads_por_estado,
+        'servicios_por_mes': servicios_por_mes,
+        'acciones_pendientes': acciones
+    }
+
+# ============================================================================
+# ROLLUP DE SERVICIOS (AÑO-MES × TIPO)
+# ============================================================================
+# {"YYYY-MM": {tipo: nº servicios}}. Las claves "YYYY-MM" ordenan igual como
+# texto que como fecha, así un periodo es un rango de claves.
+
+def rollup_servicios(df_servicios):
+    """Cuenta los servicios por mes de solicitud (año incluido) y tipo"""
+    rollup = {}
+    if df_servicios.empty or 'Fecha Solicitud' not in df_servicios.columns or 'Tipo Servicio' not in df_servicios.columns:
+        return rollup
+
+    fechas = pd.to_datetime(df_servicios['Fecha Solicitud'], errors='coerce')
+    validos = df_servicios.assign(_mes=fechas.dt.strftime('%Y-%m'))[fechas.notna()]
+    for (mes, tipo), n in validos.groupby(['_mes', 'Tipo Servicio']).size().items():
+        rollup.setdefault(mes, {})[str(tipo)] = int(n)
+    return rollup
+
+def sumar_rollups(base, extra):
+    """Suma dos rollups sin modificar los originales"""
+    resultado = {mes: dict(tipos) for mes, tipos in base.items()}
+    for mes, tipos in extra.items():
+        destino = resultado.setdefault(mes, {})
+        for tipo, n in tipos.items():
+            destino[tipo] = destino.get(tipo, 0) + n
+    return resultado
+
+def servicios_en_periodo(rollup, desde, hasta):
+    """
+    Servicios por tipo entre dos meses (ambos incluidos)
+
+    Args:
+        rollup: Dict {"YYYY-MM": {tipo: n}}
+        desde, hasta: Fechas o textos "YYYY-MM"
+
+    Returns:
+        Dict {tipo: n}
+    """
+    desde, hasta = _clave_mes(desde), _clave_mes(hasta)
+    totales = {}
+    for mes in sorted(rollup):
+        if mes < desde:
+            continue
+        if mes > hasta:
+            break
+        for tipo, n in rollup[mes].items():
+            totales[tipo] = totales.get(tipo, 0) + n
+    return totales
+
+def _clave_mes(fecha):
+    return fecha if isinstance(fecha, str) else fecha.strftime('%Y-%m')
+
+# ============================================================================
+# PERSISTENCIA DEL SNAPSHOT
+# ============================================================================
+
+def guardar_snapshot_crm(snapshot, version):
+    """Guarda el snapshot junto a los datos, asociado a la versión del CRM"""
+    try:
+        snapshot = dict(snapshot, version=version)
+        temporal = config.ARCHIVO_SNAPSHOT_KPIS + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, default=str)
+        os.replace(temporal, config.ARCHIVO_SNAPSHOT_KPIS)
+        return True
+    except Exception as e:
+        print(f"[DEBUG] ❌ No se pudo guardar el snapshot de KPIs: {e}")
+        return False
+
+def cargar_snapshot_crm(version=None):
+    """
+    Carga el snapshot guardado si corresponde a la versión actual del CRM
+
+    Returns:
+        Dict con el snapshot, o None si no existe o está desactualizado
+    """
+    if version is None:
+        version = utils.version_archivo(config.ARCHIVO_CRM)
+
+    snapshot = _leer_snapshot()
+    if snapshot is None or snapshot.get('version') != version:
+        return None
+    return snapshot
+
+def ultimo_snapshot_crm():
+    """
+    Último snapshot guardado, sea o no de la versión actual del CRM (no lee el Excel)
+
+    Returns:
+        tuple: (dict o None si no hay ninguno, bool vigente)
+    """
+    snapshot = _leer_snapshot()
+    if snapshot is None:
+        return None, False
+    return snapshot, snapshot.get('version') == utils.version_archivo(config.ARCHIVO_CRM)
+
+def _leer_snapshot():
+    try:
+        with open(config.ARCHIVO_SNAPSHOT_KPIS, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def actualizar_snapshot_crm(hojas, hoja_modificada=None, version_anterior=None, filas_agregadas=None):
+    """
+    Recalcula y guarda el snapshot tras un cambio en el CRM
+    Se llama desde utils.escribir_excel con las hojas que ya tiene en memoria
+
+    El rollup de servicios se mantiene de forma incremental a partir del
+    snapshot anterior: se reutiliza si no cambió SERVICIOS y, si solo se
+    añadieron filas, se suman únicamente esas.
+
+    Args:
+        hojas: Dict {nombre_hoja: DataFrame} de CRM_CLIENTES tras la escritura
+        hoja_modificada: Hoja que se acaba de escribir
+        version_anterior: Versión del CRM antes de escribir
+        filas_agregadas: DataFrame con las filas añadidas (si fue un alta)
+    """
+    anterior = cargar_snapshot_crm(version_anterior) if version_anterior else None
+
+    if anterior is not None and hoja_modificada != "SERVICIOS":
+        rollup = anterior['servicios_por_mes']
+    elif anterior is not None and filas_agregadas is not None:
+        rollup = sumar_rollups(anterior['servicios_por_mes'], rollup_servicios(filas_agregadas))
+    else:
+        rollup = None
+
+    if rollup is not None:
+        hojas = dict(hojas, SERVICIOS=pd.DataFrame())
+    snapshot = calcular_snapshot_crm(hojas)
+    if rollup is not None:
+        snapshot['servicios_por_mes'] = rollup
+
+    guardar_snapshot_crm(snapshot, utils.version_archivo(config.ARCHIVO_CRM))
+    return snapshot
+
+def obtener_snapshot_crm():
+    """
+    Devuelve el snapshot de KPIs del CRM
+    Solo lee CRM_CLIENTES si el snapshot no existe o está desactualizado
+    (por ejemplo, si el Excel se editó fuera de la app)
+    """
+    version = utils.version_archivo(config.ARCHIVO_CRM)
+    snapshot = cargar_snapshot_crm(version)
+
+    if snapshot is None:
+        print("[DEBUG] ♻️ Snapshot de KPIs desactualizado, recalculando desde CRM_CLIENTES")
+        hojas = utils.leer_todas_hojas(config.ARCHIVO_CRM)
+        snapshot = calcular_snapshot_crm(hojas)
+        # Si la lectura falló, un snapshot a cero no se guarda (se reintenta la próxima vez)
+        if hojas:
+            guardar_snapshot_crm(snapshot, version)
+        snapshot['version'] = version
+
+    return snapshot
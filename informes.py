@@ -0,0 +1,346 @@
+"""
+INFORMES.PY - Informes Mensuales por Cliente
+Genera en paralelo el pack de revisión de cada cliente activo (Excel y,
+opcionalmente, PDF): carta con márgenes, escandallos, desviaciones de precio
+y alertas
+"""
+
+import io
+import os
+import re
+import time
+import zipfile
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import config
+import utils
+
+# Hojas de OPERACIONES que necesita el informe (se leen una sola vez para todos los clientes)
+HOJAS_OPERACIONES = ['CARTA_CLIENTES', 'ESCANDALLOS', 'PRECIOS_POR_CLIENTE', 'COMPRAS_CLIENTE',
+                     'LINEAS_COMPRA', 'INGREDIENTES_MAESTRO']
+
+# Filas por sección que caben en una página del PDF
+FILAS_PDF = 35
+
+# Formato numérico de las columnas conocidas en el Excel
+FORMATOS_COLUMNA = {
+    'Precio Venta': '#,##0.00 €', 'Coste Total': '#,##0.00 €', 'Margen €': '#,##0.00 €',
+    'Coste Unitario': '#,##0.0000 €', 'Precio Cliente': '#,##0.00 €', 'Precio Mercado': '#,##0.00 €',
+    'Ahorro Potencial': '#,##0.00 €', 'Margen %': '0.0"%"', 'Food Cost %': '0.0"%"',
+    'Desviación %': '+0.0"%";-0.0"%"', '% del Plato': '0.0"%"', 'Cantidad': '0.000'
+}
+
+# ============================================================================
+# SECCIONES DEL INFORME
+# ============================================================================
+
+def _columnas(df, columnas):
+    return df[[c for c in columnas if c in df.columns]]
+
+def seccion_carta(df_carta):
+    """Platos del cliente con margen y food cost (los activos primero, por margen ascendente)"""
+    if df_carta.empty:
+        return pd.DataFrame()
+    carta = _columnas(df_carta, ['ID Plato', 'Nombre Plato', 'Categoría', 'Precio Venta', 'Coste Total', 'Margen €',
+                                 'Margen %', 'Food Cost %', 'Ventas/Mes', 'Clasificación', 'Activo'])
+    orden = ['Activo', 'Margen %'] if {'Activo', 'Margen %'} <= set(carta.columns) else []
+    return carta.sort_values(orden, ascending=[False, True]) if orden else carta
+
+def seccion_escandallos(df_esc):
+    """Ingredientes de cada plato con su peso en el coste del plato"""
+    if df_esc.empty:
+        return pd.DataFrame()
+    esc = df_esc.copy()
+    if {'ID Plato', 'Coste Total'} <= set(esc.columns):
+        coste = pd.to_numeric(esc['Coste Total'], errors='coerce')
+        total_plato = coste.groupby(esc['ID Plato']).transform('sum')
+        esc['% del Plato'] = (coste / total_plato.where(total_plato > 0) * 100).round(1)
+    esc = _columnas(esc, ['Nombre Plato', 'Nombre Ingrediente', 'Cantidad', 'Unidad', 'Coste Unitario',
+                          'Coste Total', '% del Plato', 'Proveedor Actual'])
+    if {'Nombre Plato', '% del Plato'} <= set(esc.columns):
+        esc = esc.sort_values(['Nombre Plato', '% del Plato'], ascending=[True, False])
+    return esc
+
+def seccion_desviaciones(df_precios, precios_mercado):
+    """Precio acordado de cada ingrediente frente al precio de mercado actual"""
+    if df_precios.empty or 'ID Ingrediente' not in df_precios.columns:
+        return pd.DataFrame()
+    ids = pd.to_numeric(df_precios['ID Ingrediente'], errors='coerce')
+    precio = pd.to_numeric(df_precios.get('Precio Cliente'), errors='coerce')
+    mercado = ids.map(precios_mercado)
+    if 'Precio Mercado Referencia' in df_precios.columns:
+        mercado = mercado.fillna(pd.to_numeric(df_precios['Precio Mercado Referencia'], errors='coerce'))
+
+    desviaciones = _columnas(df_precios, ['Nombre Ingrediente', 'Proveedor', 'Unidad']).assign(**{
+        'Precio Cliente': precio,
+        'Precio Mercado': mercado,
+        'Desviación %': ((precio / mercado.where(mercado > 0) - 1) * 100).round(1)
+    })
+    return desviaciones.sort_values('Desviación %', ascending=False, na_position='last')
+
+def seccion_alertas(df_carta, df_lineas, precios_mercado):
+    """
+    Alertas del cliente: margen bajo, food cost alto y compras muy por encima de mercado
+
+    Returns:
+        DataFrame con Tipo, Detalle, Valor y Ahorro Potencial
+    """
+    alertas = []
+
+    if not df_carta.empty and 'Margen %' in df_carta.columns:
+        activos = df_carta[df_carta['Activo'] == 'Sí'] if 'Activo' in df_carta.columns else df_carta
+        margen = pd.to_numeric(activos['Margen %'], errors='coerce')
+        bajo = activos[margen < config.UMBRAL_MARGEN_MINIMO]
+        alertas.append(pd.DataFrame({
+            'Tipo': 'Margen bajo', 'Detalle': bajo.get('Nombre Plato'),
+            'Valor': margen[bajo.index].round(1), 'Ahorro Potencial': np.nan
+        }))
+        if 'Food Cost %' in activos.columns:
+            food_cost = pd.to_numeric(activos['Food Cost %'], errors='coerce')
+            alto = activos[food_cost > config.UMBRAL_FOOD_COST_MAXIMO]
+            alertas.append(pd.DataFrame({
+                'Tipo': 'Food cost alto', 'Detalle': alto.get('Nombre Plato'),
+                'Valor': food_cost[alto.index].round(1), 'Ahorro Potencial': np.nan
+            }))
+
+    if not df_lineas.empty and {'ID Ingrediente', 'Precio Unitario', 'Cantidad'} <= set(df_lineas.columns):
+        mercado = pd.to_numeric(df_lineas['ID Ingrediente'], errors='coerce').map(precios_mercado)
+        pagado = pd.to_numeric(df_lineas['Precio Unitario'], errors='coerce')
+        cantidad = pd.to_numeric(df_lineas['Cantidad'], errors='coerce').fillna(0)
+        desviacion = (pagado / mercado.where(mercado > 0) - 1) * 100
+        caras = desviacion > config.UMBRAL_DESVIACION_PRECIO
+        if caras.any():
+            nombre = df_lineas['Nombre Ingrediente'] if 'Nombre Ingrediente' in df_lineas.columns else df_lineas['ID Ingrediente']
+            por_ingrediente = pd.DataFrame({
+                'Detalle': nombre[caras], 'Valor': desviacion[caras],
+                'Ahorro Potencial': ((pagado - mercado) * cantidad)[caras]
+            }).groupby('Detalle').agg({'Valor': 'mean', 'Ahorro Potencial': 'sum'}).reset_index()
+            alertas.append(por_ingrediente.assign(Tipo='Precio alto en compras', Valor=por_ingrediente['Valor'].round(1)))
+
+    alertas = [a for a in alertas if not a.empty]
+    if not alertas:
+        return pd.DataFrame(columns=['Tipo', 'Detalle', 'Valor', 'Ahorro Potencial'])
+    return pd.concat(alertas, ignore_index=True)[['Tipo', 'Detalle', 'Valor', 'Ahorro Potencial']].round(2)
+
+def seccion_resumen(carta, desviaciones, alertas):
+    """Indicadores principales del cliente (Indicador, Valor)"""
+    activos = carta[carta['Activo'] == 'Sí'] if 'Activo' in carta.columns else carta
+    media = lambda columna: round(float(pd.to_numeric(activos[columna], errors='coerce').mean()), 1) \
+        if columna in activos.columns and not activos.empty else np.nan
+    filas = [
+        ('Platos activos', len(activos)),
+        ('Margen medio %', media('Margen %')),
+        ('Food cost medio %', media('Food Cost %')),
+        ('Platos con margen bajo', int((alertas['Tipo'] == 'Margen bajo').sum())),
+        ('Ingredientes por encima de mercado',
+         int((desviaciones['Desviación %'] > config.UMBRAL_DESVIACION_PRECIO).sum()) if not desviaciones.empty else 0),
+        ('Ahorro potencial en compras (€)', round(float(alertas['Ahorro Potencial'].sum()), 2))
+    ]
+    return pd.DataFrame(filas, columns=['Indicador', 'Valor'])
+
+# ============================================================================
+# ESCRITURA (EXCEL Y PDF)
+# ============================================================================
+
+def escribir_excel_informe(ruta, titulo, secciones):
+    """Libro del informe con una hoja por sección (xlsxwriter en modo constant_memory)"""
+    hojas = {nombre: df if not df.empty else pd.DataFrame({'Sin datos': []}) for nombre, df in secciones.items()}
+    utils.escribir_libro_xlsxwriter(ruta, hojas, FORMATOS_COLUMNA,
+                                    {'title': titulo, 'company': config.NOMBRE_EMPRESA})
+
+def escribir_pdf_informe(ruta, titulo, secciones):
+    """PDF con una página por sección (las primeras FILAS_PDF filas de cada una)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    with PdfPages(ruta) as pdf:
+        for nombre, df in secciones.items():
+            figura, eje = plt.subplots(figsize=(11.69, 8.27))  # A4 apaisado
+            eje.axis('off')
+            eje.set_title(f"{titulo} · {nombre}", loc='left', fontsize=14, color=config.COLOR_PRIMARIO)
+            if df.empty:
+                eje.text(0, 0.9, "Sin datos", fontsize=11)
+            else:
+                visibles = df.head(FILAS_PDF)
+                celdas = visibles.round(2).astype(str).replace({'nan': '', 'NaT': '', 'None': ''})
+                tabla = eje.table(cellText=celdas.to_numpy(), colLabels=list(visibles.columns),
+                                  loc='upper left', cellLoc='left')
+                tabla.auto_set_font_size(False)
+                tabla.set_fontsize(7)
+                for (fila, _), celda in tabla.get_celld().items():
+                    if fila == 0:
+                        celda.set_facecolor(config.COLOR_PRIMARIO)
+                        celda.set_text_props(color='white', weight='bold')
+                if len(df) > FILAS_PDF:
+                    eje.text(0, 0.02, f"… y {len(df) - FILAS_PDF} filas más (ver Excel)", fontsize=8,
+                             transform=eje.transAxes)
+            pdf.savefig(figura)
+            plt.close(figura)
+
+# ============================================================================
+# GENERACIÓN EN PARALELO
+# ============================================================================
+
+def _nombre_archivo(id_cliente, nombre):
+    limpio = re.sub(r'[^\w\-]+', '_', str(nombre), flags=re.UNICODE).strip('_')[:40]
+    return f"{int(id_cliente):04d}_{limpio or 'cliente'}"
+
+def _generar_informe(tarea):
+    """
+    Informe de un cliente (se ejecuta en un proceso del pool)
+
+    Args:
+        tarea: Dict con id, nombre, hojas (solo las filas del cliente),
+            precios_mercado, carpeta, periodo y pdf
+
+    Returns:
+        Dict con el resultado para la tabla de resumen
+    """
+    inicio = time.perf_counter()
+    hojas = tarea['hojas']
+    resultado = {'ID Cliente': tarea['id'], 'Cliente': tarea['nombre'], 'Excel': None, 'PDF': None,
+                 'Alertas': 0, 'Error': None}
+    try:
+        carta = seccion_carta(hojas['CARTA_CLIENTES'])
+        desviaciones = seccion_desviaciones(hojas['PRECIOS_POR_CLIENTE'], tarea['precios_mercado'])
+        alertas = seccion_alertas(hojas['CARTA_CLIENTES'], hojas['LINEAS_COMPRA'], tarea['precios_mercado'])
+        secciones = {
+            'Resumen': seccion_resumen(carta, desviaciones, alertas),
+            'Carta': carta,
+            'Escandallos': seccion_escandallos(hojas['ESCANDALLOS']),
+            'Desviaciones Precio': desviaciones,
+            'Alertas': alertas
+        }
+        titulo = f"{tarea['nombre']} - Revisión {tarea['periodo']}"
+        base = os.path.join(tarea['carpeta'], _nombre_archivo(tarea['id'], tarea['nombre']))
+
+        escribir_excel_informe(base + '.xlsx', titulo, secciones)
+        resultado.update(Excel=base + '.xlsx', Alertas=len(alertas))
+        if tarea['pdf']:
+            escribir_pdf_informe(base + '.pdf', titulo, secciones)
+            resultado['PDF'] = base + '.pdf'
+    except Exception as e:
+        resultado['Error'] = str(e)
+    resultado['Segundos'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+def pdf_disponible():
+    """True si matplotlib está instalado (necesario para los PDF)"""
+    return importlib.util.find_spec('matplotlib') is not None
+
+def particionar_por_cliente(hojas, ids):
+    """
+    Reparte las hojas de OPERACIONES por ID Cliente en una sola pasada
+
+    ESCANDALLOS se asigna por el cliente de su plato y LINEAS_COMPRA por el
+    de su compra.
+
+    Returns:
+        Dict id -> {hoja: DataFrame con solo las filas del cliente}
+    """
+    vacias = {hoja: hojas.get(hoja, pd.DataFrame()).iloc[0:0] for hoja in HOJAS_OPERACIONES}
+    claves = {}
+
+    for hoja in ['CARTA_CLIENTES', 'PRECIOS_POR_CLIENTE', 'COMPRAS_CLIENTE']:
+        df = hojas.get(hoja, pd.DataFrame())
+        if 'ID Cliente' in df.columns:
+            claves[hoja] = pd.to_numeric(df['ID Cliente'], errors='coerce')
+
+    carta, compras = hojas.get('CARTA_CLIENTES', pd.DataFrame()), hojas.get('COMPRAS_CLIENTE', pd.DataFrame())
+    esc, lineas = hojas.get('ESCANDALLOS', pd.DataFrame()), hojas.get('LINEAS_COMPRA', pd.DataFrame())
+    if 'CARTA_CLIENTES' in claves and 'ID Plato' in esc.columns and 'ID Plato' in carta.columns:
+        claves['ESCANDALLOS'] = esc['ID Plato'].map(claves['CARTA_CLIENTES'].groupby(carta['ID Plato']).first())
+    if 'COMPRAS_CLIENTE' in claves and 'ID Compra' in lineas.columns and 'ID Compra' in compras.columns:
+        claves['LINEAS_COMPRA'] = lineas['ID Compra'].map(claves['COMPRAS_CLIENTE'].groupby(compras['ID Compra']).first())
+
+    particiones = {int(i): dict(vacias) for i in ids}
+    for hoja, clave in claves.items():
+        df = hojas[hoja]
+        for id_cliente, filas in df[clave.isin(list(particiones))].groupby(clave):
+            particiones[int(id_cliente)][hoja] = filas
+    return particiones
+
+def generar_informes(ids=None, carpeta=None, pdf=False, procesos=None, progreso=None):
+    """
+    Genera el informe de cada cliente en un pool de procesos
+
+    OPERACIONES se lee una sola vez y se reparte por ID Cliente; cada proceso
+    recibe solo las filas de su cliente.
+
+    Args:
+        ids: IDs de cliente (por defecto todos los activos)
+        carpeta: Carpeta de salida (por defecto INFORMES/AAAA-MM en la carpeta de datos)
+        pdf: Generar también el PDF (requiere matplotlib)
+        procesos: Número de procesos (por defecto uno por CPU; 1 = sin pool)
+        progreso: Función opcional (hechos, total) llamada al terminar cada cliente
+
+    Returns:
+        DataFrame con ID Cliente, Cliente, Excel, PDF, Alertas, Error y Segundos
+    """
+    periodo = datetime.now().strftime('%Y-%m')
+    carpeta = carpeta or os.path.join(config.RUTA_INFORMES, periodo)
+    os.makedirs(carpeta, exist_ok=True)
+
+    df_clientes = utils.leer_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS")
+    if df_clientes.empty:
+        return pd.DataFrame()
+    if ids is None:
+        df_clientes = df_clientes[df_clientes['Estado'] == 'Activo'] if 'Estado' in df_clientes.columns else df_clientes
+    else:
+        df_clientes = df_clientes[df_clientes['ID'].isin(list(ids))]
+    nombres = dict(zip(df_clientes['ID'].astype(int), df_clientes['Nombre Comercial']))
+    if not nombres:
+        return pd.DataFrame()
+
+    hojas = utils.leer_todas_hojas(config.ARCHIVO_OPERACIONES)
+    maestro = hojas.get('INGREDIENTES_MAESTRO', pd.DataFrame())
+    precios_mercado = pd.Series(pd.to_numeric(maestro['Precio Mercado Medio'], errors='coerce').to_numpy(),
+                                index=pd.to_numeric(maestro['ID Ingrediente'], errors='coerce')) \
+        if {'ID Ingrediente', 'Precio Mercado Medio'} <= set(maestro.columns) else pd.Series(dtype=float)
+    precios_mercado = precios_mercado[~precios_mercado.index.duplicated()]
+
+    pdf = pdf and pdf_disponible()
+    tareas = [{'id': i, 'nombre': nombres[i], 'hojas': particion, 'precios_mercado': precios_mercado,
+               'carpeta': carpeta, 'periodo': periodo, 'pdf': pdf}
+              for i, particion in particionar_por_cliente(hojas, nombres).items()]
+
+    inicio = time.perf_counter()
+    procesos = procesos or min(os.cpu_count() or 1, len(tareas))
+    resultados = []
+    if procesos > 1 and len(tareas) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                for resultado in pool.map(_generar_informe, tareas, chunksize=max(1, len(tareas) // (procesos * 4))):
+                    resultados.append(resultado)
+                    if progreso:
+                        progreso(len(resultados), len(tareas))
+        except Exception as e:
+            # Sin procesos disponibles (entornos restringidos): se sigue en este proceso
+            print(f"[DEBUG] ⚠️ Informes: pool de procesos no disponible ({e}), generando en serie")
+            hechos = {r['ID Cliente'] for r in resultados}
+            tareas = [t for t in tareas if t['id'] not in hechos]
+            procesos = 1
+    if procesos <= 1 or len(tareas) <= 1:
+        total = len(resultados) + len(tareas)
+        for tarea in tareas:
+            resultados.append(_generar_informe(tarea))
+            if progreso:
+                progreso(len(resultados), total)
+
+    print(f"[DEBUG] 📑 Informes: {len(resultados)} clientes en {time.perf_counter() - inicio:.1f}s "
+          f"({procesos} procesos) -> {carpeta}")
+    return pd.DataFrame(resultados)
+
+def comprimir_informes(rutas):
+    """ZIP en memoria con los archivos indicados (para descargarlos de una vez)"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_informes:
+        for ruta in rutas:
+            if ruta and os.path.exists(ruta):
+                zip_informes.write(ruta, os.path.basename(ruta))
+    return buffer.getvalue()
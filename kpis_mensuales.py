@@ -0,0 +1,257 @@
+"""
+KPIS_MENSUALES.PY - Motor de KPIs Mensuales
+Deriva MRR, altas/bajas, servicios y facturación por mes a partir de los datos
+"""
+
+import threading
+import pandas as pd
+from datetime import datetime
+import config
+import utils
+
+# Métricas por mes que se acumulan a partir de los eventos de cada hoja
+METRICAS_EVENTO = ['MRR Nuevo', 'MRR Perdido', 'Altas', 'Bajas', 'Servicios', 'Ingresos Servicios', 'Facturación']
+
+# Candidatas (por orden de preferencia) para localizar columnas en FACTURACION
+COLUMNAS_FECHA_FACTURA = ['Fecha', 'Fecha Factura', 'Fecha Emisión']
+COLUMNAS_IMPORTE_FACTURA = ['Base Imponible', 'Importe', 'Subtotal', 'Total']
+
+# ============================================================================
+# DETECCIÓN DE COLUMNAS
+# ============================================================================
+
+def detectar_columna(df, candidatas, contiene=None):
+    """
+    Primera columna de df que coincide con las candidatas (sin distinguir mayúsculas)
+
+    Args:
+        df: DataFrame
+        candidatas: Nombres preferidos, por orden
+        contiene: Texto alternativo a buscar dentro del nombre (p. ej. 'fecha')
+
+    Returns:
+        Nombre de la columna o None
+    """
+    por_minusculas = {str(c).strip().lower(): c for c in df.columns}
+    for candidata in candidatas:
+        if candidata.lower() in por_minusculas:
+            return por_minusculas[candidata.lower()]
+    if contiene:
+        for columna in df.columns:
+            if contiene.lower() in str(columna).lower():
+                return columna
+    return None
+
+# ============================================================================
+# EVENTOS POR HOJA
+# ============================================================================
+# Cada hoja se traduce a eventos (huella de la fila, mes, métrica, valor).
+# La huella permite saber qué filas han cambiado entre dos versiones.
+
+def _mes(fechas):
+    return pd.to_datetime(fechas, errors='coerce').dt.to_period('M')
+
+def _eventos(huellas, meses, metrica, valores):
+    eventos = pd.DataFrame({'huella': huellas, 'mes': pd.PeriodIndex(meses, freq='M'),
+                            'metrica': metrica, 'valor': valores})
+    return eventos[eventos['mes'].notna()]
+
+def eventos_clientes(df, mes_actual):
+    """
+    Altas y bajas de MRR desde CLIENTES_ACTIVOS
+
+    Un cliente cuenta desde el mes de Fecha Inicio hasta el de Fecha Fin.
+    Sin Fecha Fin, los clientes de Baja o Pausados dejan de contar en el mes actual.
+    """
+    if df.empty or 'Fecha Inicio' not in df.columns:
+        return _eventos([], pd.PeriodIndex([], freq='M'), '', [])
+
+    huellas = utils.huellas_filas(df)
+    precio = pd.to_numeric(df.get('Precio Mensual'), errors='coerce') if 'Precio Mensual' in df.columns \
+        else pd.Series(0.0, index=df.index)
+    if 'MRR' in df.columns:
+        precio = precio.where(precio > 0, pd.to_numeric(df['MRR'], errors='coerce'))
+    precio = precio.fillna(0).to_numpy()
+
+    inicio = _mes(df['Fecha Inicio'])
+    fin = _mes(df['Fecha Fin']) if 'Fecha Fin' in df.columns else pd.Series(pd.NaT, index=df.index)
+    estado = df['Estado'] if 'Estado' in df.columns else pd.Series('Activo', index=df.index)
+    sin_fin_inactivo = fin.isna() & estado.isin(['Baja', 'Pausado'])
+    # Mes en el que deja de contar
+    salida = (fin + 1).where(fin.notna(), pd.Series(mes_actual, index=df.index).where(sin_fin_inactivo))
+
+    return pd.concat([
+        _eventos(huellas, inicio.to_numpy(), 'MRR Nuevo', precio),
+        _eventos(huellas, inicio.to_numpy(), 'Altas', 1),
+        _eventos(huellas, salida.to_numpy(), 'MRR Perdido', precio),
+        _eventos(huellas, salida.to_numpy(), 'Bajas', 1)
+    ], ignore_index=True)
+
+def eventos_servicios(df):
+    """Servicios realizados e ingresos por mes desde SERVICIOS (fecha de entrega o de solicitud)"""
+    if df.empty:
+        return _eventos([], pd.PeriodIndex([], freq='M'), '', [])
+
+    huellas = utils.huellas_filas(df)
+    fecha = pd.to_datetime(df['Fecha Solicitud'], errors='coerce') if 'Fecha Solicitud' in df.columns \
+        else pd.Series(pd.NaT, index=df.index)
+    if 'Fecha Entrega' in df.columns:
+        fecha = pd.to_datetime(df['Fecha Entrega'], errors='coerce').fillna(fecha)
+    mes = fecha.dt.to_period('M').to_numpy()
+    precio = pd.to_numeric(df['Precio'], errors='coerce').fillna(0).to_numpy() if 'Precio' in df.columns else 0
+
+    return pd.concat([
+        _eventos(huellas, mes, 'Servicios', 1),
+        _eventos(huellas, mes, 'Ingresos Servicios', precio)
+    ], ignore_index=True)
+
+def eventos_facturacion(df):
+    """Importe facturado por mes desde FACTURACION (columnas detectadas por nombre)"""
+    columna_fecha = detectar_columna(df, COLUMNAS_FECHA_FACTURA, contiene='fecha')
+    columna_importe = detectar_columna(df, COLUMNAS_IMPORTE_FACTURA)
+    if df.empty or columna_fecha is None or columna_importe is None:
+        return _eventos([], pd.PeriodIndex([], freq='M'), '', [])
+
+    huellas = utils.huellas_filas(df)
+    importe = pd.to_numeric(df[columna_importe], errors='coerce').fillna(0).to_numpy()
+    return _eventos(huellas, _mes(df[columna_fecha]).to_numpy(), 'Facturación', importe)
+
+# ============================================================================
+# CUBO INCREMENTAL
+# ============================================================================
+
+class CuboKPIs:
+    """
+    Agregados mensuales por métrica mantenidos de forma incremental
+
+    Al cambiar una hoja solo se aplican los eventos de las filas añadidas o
+    eliminadas (comparando huellas), así solo se tocan los meses afectados.
+    """
+
+    def __init__(self, mes_actual):
+        self.mes_actual = mes_actual
+        self._eventos = {}
+        self._agregados = pd.DataFrame(columns=METRICAS_EVENTO, dtype=float)
+        self.meses_recalculados = []
+
+    def actualizar(self, fuente, eventos):
+        """Sustituye los eventos de una fuente aplicando solo la diferencia"""
+        anteriores = self._eventos.get(fuente, eventos.iloc[0:0])
+        nuevos = eventos[~eventos['huella'].isin(anteriores['huella'])]
+        eliminados = anteriores[~anteriores['huella'].isin(eventos['huella'])]
+
+        delta = pd.concat([nuevos, eliminados.assign(valor=-eliminados['valor'])])
+        if not delta.empty:
+            por_mes = delta.pivot_table(index='mes', columns='metrica', values='valor', aggfunc='sum')
+            self._agregados = self._agregados.add(por_mes, fill_value=0).reindex(columns=METRICAS_EVENTO)
+            self.meses_recalculados = sorted(por_mes.index.astype(str))
+        else:
+            self.meses_recalculados = []
+
+        self._eventos[fuente] = eventos
+
+    def tabla(self):
+        """
+        KPIs por mes, desde el primer mes con datos hasta el actual
+
+        Returns:
+            DataFrame indexado por mes (Period) con MRR, MRR Nuevo, MRR Perdido,
+            Clientes Activos, Altas, Bajas, Servicios, Ingresos Servicios,
+            Facturación y Churn MRR %
+        """
+        if self._agregados.empty:
+            return pd.DataFrame(columns=['MRR', 'Clientes Activos'] + METRICAS_EVENTO + ['Churn MRR %'])
+
+        primero = min(self._agregados.index.min(), self.mes_actual)
+        meses = pd.period_range(primero, self.mes_actual, freq='M')
+        cubo = self._agregados.reindex(meses).fillna(0)
+
+        cubo.insert(0, 'MRR', (cubo['MRR Nuevo'] - cubo['MRR Perdido']).cumsum())
+        cubo.insert(1, 'Clientes Activos', (cubo['Altas'] - cubo['Bajas']).cumsum().astype(int))
+        mrr_anterior = cubo['MRR'].shift(1)
+        cubo['Churn MRR %'] = (cubo['MRR Perdido'] / mrr_anterior.where(mrr_anterior > 0) * 100).fillna(0).round(1)
+        cubo.index.name = 'Mes'
+        return cubo
+
+# ============================================================================
+# ACCESO COMPARTIDO
+# ============================================================================
+
+# 'publicada': (tabla, versiones, mes) del último cálculo terminado; se lee sin el lock
+_estado = {'cubo': None, 'versiones': {}, 'tabla': None, 'publicada': None}
+_lock = threading.Lock()
+
+# Fuente -> (archivo, hoja)
+_FUENTES = {
+    'clientes': (config.ARCHIVO_CRM, "CLIENTES_ACTIVOS"),
+    'servicios': (config.ARCHIVO_CRM, "SERVICIOS"),
+    'facturacion': (config.ARCHIVO_EMPRESA, "FACTURACION")
+}
+
+def _calcular_eventos(fuente, df, mes_actual):
+    if fuente == 'clientes':
+        return eventos_clientes(df, mes_actual)
+    if fuente == 'servicios':
+        return eventos_servicios(df)
+    return eventos_facturacion(df)
+
+def obtener_kpis_mensuales():
+    """
+    Cubo de KPIs mensuales, actualizado solo con lo que ha cambiado
+
+    Solo se leen las hojas cuyo archivo cambió desde la última llamada; al
+    cambiar de mes se reconstruye desde cero.
+    """
+    mes_actual = pd.Period(datetime.now(), freq='M')
+
+    with _lock:
+        cubo = _estado['cubo']
+        if cubo is None or cubo.mes_actual != mes_actual:
+            cubo = CuboKPIs(mes_actual)
+            _estado.update(cubo=cubo, versiones={}, tabla=None)
+
+        cambios = False
+        for fuente, (archivo, hoja) in _FUENTES.items():
+            version = utils.version_archivo(archivo)
+            if _estado['versiones'].get(fuente) == version:
+                continue
+            try:
+                # Lectura que lanza: con una hoja vacía se perderían todos sus eventos
+                df = utils._leer_hoja(archivo, hoja)
+            except Exception as e:
+                # Sin apuntar la versión: se reintenta en la siguiente llamada
+                print(f"[DEBUG] ❌ KPIs mensuales: no se pudo leer {hoja}: {e}")
+                continue
+            cubo.actualizar(fuente, _calcular_eventos(fuente, df, mes_actual))
+            _estado['versiones'][fuente] = version
+            cambios = True
+            meses = cubo.meses_recalculados
+            detalle = ', '.join(meses) if len(meses) <= 6 else f"{meses[0]} … {meses[-1]}"
+            print(f"[DEBUG] 📈 KPIs mensuales: {hoja} actualizada, {len(meses)} meses recalculados ({detalle})")
+
+        if cambios or _estado['tabla'] is None:
+            _estado['tabla'] = cubo.tabla()
+            _estado['publicada'] = (_estado['tabla'], dict(_estado['versiones']), mes_actual)
+
+        return _estado['tabla'].copy()
+
+def ultima_tabla():
+    """
+    Último cubo calculado, sin leer ninguna hoja ni esperar a un cálculo en curso
+
+    Returns:
+        tuple: (DataFrame o None si aún no se ha calculado, bool al día con los archivos)
+    """
+    publicada = _estado['publicada']
+    if publicada is None:
+        return None, False
+
+    tabla, versiones, mes = publicada
+    vigente = mes == pd.Period(datetime.now(), freq='M') and all(
+        versiones.get(fuente) == utils.version_archivo(archivo) for fuente, (archivo, _) in _FUENTES.items())
+    return tabla.copy(), vigente
+
+def limpiar_cache():
+    """Olvida el cubo (se reconstruye en la siguiente consulta)"""
+    with _lock:
+        _estado.update(cubo=None, versiones={}, tabla=None, publicada=None)
@@ -5,10 +5,28 @@ Sistema de Gestión Integral - Consultoría HORECA
 
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 from datetime import datetime
 import time
+import os
 import config
 import utils
+import indicadores
+import contexto_datos
+import busqueda
+import duplicados
+import importacion
+import historial
+import kpis_mensuales
+import cohortes
+import proveedores
+import historico_precios
+import optimizador
+import analisis_compras
+import cuenta_resultados
+import informes
+import planificador
+import datos_sinteticos
 
 # ============================================================================
 # CONFIGURACIÓN DE LA PÁGINA
@@ -77,10 +95,33 @@ def verificar_sistema():
         st.markdown(config.MENSAJE_PRIMERA_VEZ.format(ruta=config.RUTA_DATOS))
         for archivo in archivos_faltantes:
             st.write(f"❌ {archivo}")
+        mostrar_generar_datos()
         st.stop()
     
     return True
 
+def mostrar_generar_datos():
+    """Ofrece crear los Excel que faltan con datos ficticios para probar la app"""
+    st.markdown("---")
+    st.subheader("🧪 Generar datos de ejemplo")
+    st.warning("Los datos son ficticios. Solo se crean los archivos que faltan; los existentes no se tocan.")
+
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        escala = st.selectbox("Tamaño", list(datos_sinteticos.ESCALAS), key="generar_escala",
+                              format_func=lambda e: f"{e} ({datos_sinteticos.ESCALAS[e]['leads']:,} leads, "
+                                                    f"{datos_sinteticos.ESCALAS[e]['platos']:,} platos)")
+    with col2:
+        st.write("")
+        generar = st.button("🧪 Generar datos", key="generar_datos", use_container_width=True)
+
+    if generar:
+        with st.spinner("Generando datos..."):
+            resumen = datos_sinteticos.generar_datos(escala)
+        st.success(f"✅ {(resumen['Estado'] == 'Creado').sum()} archivos creados en {config.RUTA_DATOS}")
+        time.sleep(1)
+        st.rerun()
+
 # ============================================================================
 # SIDEBAR - NAVEGACIÓN
 # ============================================================================
@@ -117,10 +158,136 @@ def mostrar_sidebar():
         # Botón de refresco
         if st.button("🔄 Refrescar Datos", use_container_width=True):
             st.cache_data.clear()
+            st.cache_resource.clear()
+            contexto_datos.limpiar_cache()
+            kpis_mensuales.limpiar_cache()
+            analisis_compras.limpiar_cache()
             st.rerun()
     
     return modulo
 
+# ============================================================================
+# COMPONENTES COMUNES
+# ============================================================================
+
+def selector_vista(opciones, key):
+    """
+    Navegación en pestañas que solo ejecuta la vista activa
+    
+    st.tabs ejecuta el contenido de todas las pestañas en cada rerun;
+    con este selector solo se cargan los datos y widgets de la vista visible.
+    
+    Args:
+        opciones: Lista con los nombres de las pestañas
+        key: Clave de session_state donde se recuerda la pestaña activa
+    
+    Returns:
+        Nombre de la pestaña seleccionada
+    """
+    vista = st.radio(
+        "Vista",
+        opciones,
+        horizontal=True,
+        label_visibility="collapsed",
+        key=key
+    )
+    st.markdown("---")
+    return vista
+
+def tabla_paginada(df, key, column_config=None, tamanos_pagina=(25, 50, 100), filtro=True):
+    """
+    Tabla con filtro, orden y paginación en el servidor
+    
+    Solo se envía al navegador la página visible, así que el coste de
+    renderizar no depende del número total de filas.
+    
+    Args:
+        df: DataFrame (ya filtrado) a mostrar
+        key: Prefijo único para las claves de los widgets
+        column_config: column_config para st.dataframe
+        tamanos_pagina: Opciones de filas por página
+        filtro: Mostrar un cuadro de texto para filtrar filas (desactivar si
+            la vista ya tiene su propio buscador)
+    
+    Returns:
+        DataFrame con las filas de la página mostrada
+    """
+    total_filas = len(df)
+    
+    if filtro:
+        texto = st.text_input("🔎 Filtrar", key=f"{key}_filtro", placeholder="Texto en cualquier columna...")
+        df = utils.filtrar_texto_df(df, texto)
+    
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    
+    with col1:
+        orden = st.selectbox("Ordenar por", ["(sin orden)"] + list(df.columns), key=f"{key}_orden")
+    
+    with col2:
+        st.write("")
+        descendente = st.checkbox("Descendente", key=f"{key}_desc")
+    
+    with col3:
+        tamano = st.selectbox("Filas por página", tamanos_pagina, key=f"{key}_tamano")
+    
+    total_paginas = max(1, -(-len(df) // tamano))
+    
+    # Si los filtros reducen las páginas, no quedarse fuera de rango
+    # (la página vive solo en session_state: el widget no recibe 'value')
+    clave_pagina = f"{key}_pagina"
+    if clave_pagina not in st.session_state:
+        st.session_state[clave_pagina] = 1
+    elif st.session_state[clave_pagina] > total_paginas:
+        st.session_state[clave_pagina] = total_paginas
+    
+    with col4:
+        pagina = st.number_input("Página", min_value=1, max_value=total_paginas, step=1, key=clave_pagina)
+    
+    if orden != "(sin orden)":
+        df = utils.ordenar_df(df, orden, ascendente=not descendente)
+    
+    df_pagina, _ = utils.paginar_df(df, pagina, tamano)
+    
+    st.dataframe(
+        df_pagina,
+        use_container_width=True,
+        hide_index=True,
+        column_config=column_config
+    )
+    
+    if not df.empty:
+        inicio = (pagina - 1) * tamano + 1
+        filtradas = f" (filtradas de {total_filas})" if len(df) < total_filas else ""
+        st.caption(f"Página {pagina} de {total_paginas} · filas {inicio}–{inicio + len(df_pagina) - 1} de {len(df)}{filtradas}")
+    elif total_filas:
+        st.caption(f"Ninguna de las {total_filas} filas coincide con el filtro")
+    
+    return df_pagina
+
+def selector_edicion(df_pagina, key, etiqueta="✏️ Cliente a editar"):
+    """
+    Selector único para abrir el panel de edición de una fila de la página
+    (sustituye a un botón de editar por fila)
+    
+    Returns:
+        ID seleccionado si se pulsa 'Editar', None en otro caso
+    """
+    if df_pagina.empty:
+        return None
+    
+    # Cast a Int64 para que los IDs leídos como float no salgan como '12.0'
+    opciones = (pd.to_numeric(df_pagina['ID'], errors='coerce').astype('Int64').astype(str) + " - " + df_pagina['Nombre Comercial'].astype(str)).tolist()
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        seleccion = st.selectbox(etiqueta, opciones, key=f"{key}_seleccion")
+    with col2:
+        st.write("")
+        st.write("")
+        if st.button("✏️ Editar", use_container_width=True, key=f"{key}_editar"):
+            return int(float(seleccion.split(" - ")[0]))
+    return None
+
 # ============================================================================
 # MÓDULO: DASHBOARD
 # ============================================================================
@@ -129,36 +296,29 @@ def modulo_dashboard():
     """Dashboard principal con resumen ejecutivo"""
     st.markdown('<h1 class="main-header">🏠 Dashboard Ejecutivo</h1>', unsafe_allow_html=True)
     
-    # Cargar datos
-    df_leads = utils.leer_excel(config.ARCHIVO_CRM, "LEADS")
-    df_clientes_todos = utils.leer_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS")
-    df_servicios = utils.leer_excel(config.ARCHIVO_CRM, "SERVICIOS")
-    df_kpis = utils.leer_excel(config.ARCHIVO_EMPRESA, "KPIS_MENSUALES")
-    
-    # FILTRAR solo clientes ACTIVOS (igual que en CRM)
-    if 'Estado' in df_clientes_todos.columns:
-        df_clientes = df_clientes_todos[df_clientes_todos['Estado'] == 'Activo'].copy()
-    else:
-        df_clientes = df_clientes_todos.copy()
+    # Snapshot de KPIs (precalculado por versión del CRM, no requiere leer el Excel).
+    # Si está desactualizado se muestra el último y se recalcula en segundo plano
+    snapshot, snapshot_vigente = planificador.snapshot_dashboard()
+    if snapshot is None:
+        snapshot = indicadores.calcular_snapshot_crm({})
+        st.caption("⏳ Calculando los indicadores del CRM en segundo plano...")
+    elif not snapshot_vigente:
+        st.caption("⏳ Indicadores desactualizados: recalculando en segundo plano con los últimos cambios...")
     
     # Fila 1: Métricas principales
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_leads = len(df_leads)
-        st.metric("📊 Total Leads", total_leads)
+        st.metric("📊 Total Leads", snapshot['total_leads'])
     
     with col2:
-        clientes_activos = len(df_clientes)
-        st.metric("✅ Clientes Activos", clientes_activos)
+        st.metric("✅ Clientes Activos", snapshot['clientes_activos'])
     
     with col3:
-        pausados = len(df_clientes_todos[df_clientes_todos['Estado'] == 'Pausado']) if 'Estado' in df_clientes_todos.columns else 0
-        st.metric("⏸️ Pausados", pausados)
+        st.metric("⏸️ Pausados", snapshot['pausados'])
     
     with col4:
-        bajas = len(df_clientes_todos[df_clientes_todos['Estado'] == 'Baja']) if 'Estado' in df_clientes_todos.columns else 0
-        st.metric("❌ Bajas", bajas)
+        st.metric("❌ Bajas", snapshot['bajas'])
     
     st.markdown("---")
     
@@ -166,37 +326,38 @@ def modulo_dashboard():
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        if not df_clientes.empty and 'MRR' in df_clientes.columns:
-            mrr_total = df_clientes['MRR'].sum()
-            st.metric("💰 MRR Mensual", f"{mrr_total:.0f}€", help="Monthly Recurring Revenue de clientes activos")
-        else:
-            st.metric("💰 MRR Mensual", "0€")
+        st.metric("💰 MRR Mensual", f"{snapshot['mrr']:.0f}€", help="Monthly Recurring Revenue de clientes activos")
     
     with col2:
         # Facturación anual proyectada (MRR * 12)
-        if not df_clientes.empty and 'MRR' in df_clientes.columns:
-            arr = df_clientes['MRR'].sum() * 12
-            st.metric("📈 ARR Proyectado", f"{arr:.0f}€", help="Annual Recurring Revenue (MRR × 12)")
-        else:
-            st.metric("📈 ARR Proyectado", "0€")
+        st.metric("📈 ARR Proyectado", f"{snapshot['arr']:.0f}€", help="Annual Recurring Revenue (MRR × 12)")
     
     with col3:
-        # Tasa de conversión real (leads convertidos / total leads histórico)
-        # Contamos cuántos leads tienen estado "Cliente" (ya convertidos)
-        leads_convertidos = len(df_leads[df_leads['Estado Lead'] == 'Cliente']) if 'Estado Lead' in df_leads.columns and not df_leads.empty else 0
-        if total_leads > 0:
-            tasa_conv = (leads_convertidos / total_leads) * 100
-            st.metric("🎯 Tasa Conversión", f"{tasa_conv:.1f}%", help="Leads convertidos a cliente / Total leads")
-        else:
-            st.metric("🎯 Tasa Conversión", "0.0%")
+        # Tasa de conversión real (leads con estado "Cliente" / total leads histórico)
+        st.metric("🎯 Tasa Conversión", f"{snapshot['tasa_conversion']:.1f}%", help="Leads convertidos a cliente / Total leads")
     
     with col4:
-        if not df_clientes.empty and 'Satisfacción (1-5)' in df_clientes.columns:
-            satisfaccion_media = df_clientes['Satisfacción (1-5)'].mean()
-            st.metric("⭐ Satisfacción", f"{satisfaccion_media:.1f}/5", help="Media de satisfacción de clientes activos")
+        if snapshot['satisfaccion'] is not None:
+            st.metric("⭐ Satisfacción", f"{snapshot['satisfaccion']:.1f}/5", help="Media de satisfacción de clientes activos")
         else:
             st.metric("⭐ Satisfacción", "N/A")
     
+    # Evolución de los últimos 12 meses (último cubo de KPIs calculado en segundo plano)
+    df_cubo, cubo_vigente = planificador.kpis_dashboard()
+    if df_cubo is None:
+        st.caption("⏳ Calculando la evolución mensual en segundo plano...")
+    elif not df_cubo.empty:
+        df_ultimos = df_cubo.tail(12)
+        df_ultimos.index = df_ultimos.index.astype(str)
+        st.subheader("📈 MRR y Clientes Activos (últimos 12 meses)")
+        if not cubo_vigente:
+            st.caption("⏳ Actualizando la evolución mensual con los últimos cambios...")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.line_chart(df_ultimos['MRR'])
+        with col2:
+            st.bar_chart(df_ultimos['Clientes Activos'])
+    
     st.markdown("---")
     
     # Fila 2: Gráficos
@@ -204,22 +365,32 @@ def modulo_dashboard():
     
     with col1:
         st.subheader("📊 Distribución de Leads por Estado")
-        if not df_leads.empty and 'Estado Lead' in df_leads.columns:
-            estados = df_leads['Estado Lead'].value_counts()
-            st.bar_chart(estados)
+        if snapshot['leads_por_estado']:
+            st.bar_chart(pd.Series(snapshot['leads_por_estado']))
         else:
             st.info("No hay datos de leads todavía")
     
     with col2:
-        st.subheader("💼 Servicios Este Mes")
-        if not df_servicios.empty:
-            mes_actual = datetime.now().month
-            servicios_mes = df_servicios[pd.to_datetime(df_servicios['Fecha Solicitud']).dt.month == mes_actual]
-            if not servicios_mes.empty:
-                tipos_servicio = servicios_mes['Tipo Servicio'].value_counts()
-                st.bar_chart(tipos_servicio)
+        st.subheader("💼 Servicios por Tipo")
+        if snapshot['servicios_por_mes']:
+            periodo = st.radio("Periodo", ["Este mes", "Últimos 3 meses", "Este año"], horizontal=True,
+                               label_visibility="collapsed", key="periodo_servicios")
+            hoy_mes = pd.Timestamp.now()
+            
+            # Consultas sobre el rollup año-mes × tipo del snapshot (sin leer SERVICIOS)
+            if periodo == "Este mes":
+                tipos_servicio = snapshot['servicios_por_mes'].get(hoy_mes.strftime('%Y-%m'), {})
+            elif periodo == "Últimos 3 meses":
+                tipos_servicio = indicadores.servicios_en_periodo(
+                    snapshot['servicios_por_mes'], hoy_mes - pd.DateOffset(months=2), hoy_mes)
             else:
-                st.info("No hay servicios este mes")
+                tipos_servicio = indicadores.servicios_en_periodo(
+                    snapshot['servicios_por_mes'], f"{hoy_mes.year}-01", hoy_mes)
+            
+            if tipos_servicio:
+                st.bar_chart(pd.Series(tipos_servicio))
+            else:
+                st.info("No hay servicios en este periodo")
         else:
             st.info("No hay datos de servicios")
     
@@ -228,52 +399,12 @@ def modulo_dashboard():
     # Fila 3: Próximas Acciones Pendientes
     st.subheader("📅 Próximas Acciones Pendientes")
     
-    # Cargar leads e interacciones
-    df_leads_acciones = utils.leer_excel(config.ARCHIVO_CRM, "LEADS")
-    df_interacciones_acciones = utils.leer_excel(config.ARCHIVO_CRM, "INTERACCIONES")
-    
     acciones_pendientes = []
     hoy = datetime.now().date()
     
-    # Procesar acciones de LEADS
-    if not df_leads_acciones.empty and 'Fecha Próxima Acción' in df_leads_acciones.columns:
-        for _, row in df_leads_acciones.iterrows():
-            if pd.notna(row.get('Fecha Próxima Acción')) and pd.notna(row.get('Próxima Acción')):
-                try:
-                    fecha_accion = pd.to_datetime(row['Fecha Próxima Acción']).date()
-                    dias_diff = (fecha_accion - hoy).days
-                    
-                    acciones_pendientes.append({
-                        'Fecha': fecha_accion,
-                        'Días': dias_diff,
-                        'Cliente': row.get('Nombre Comercial', 'N/A'),
-                        'Acción': row.get('Próxima Acción', 'N/A'),
-                        'Responsable': row.get('Comercial Asignado', 'N/A'),
-                        'Origen': 'Lead',
-                        'Prioridad': row.get('Prioridad', 'Media')
-                    })
-                except:
-                    pass
-    
-    # Procesar acciones de INTERACCIONES
-    if not df_interacciones_acciones.empty and 'Fecha Próxima Acción' in df_interacciones_acciones.columns:
-        for _, row in df_interacciones_acciones.iterrows():
-            if pd.notna(row.get('Fecha Próxima Acción')) and pd.notna(row.get('Próxima Acción')):
-                try:
-                    fecha_accion = pd.to_datetime(row['Fecha Próxima Acción']).date()
-                    dias_diff = (fecha_accion - hoy).days
-                    
-                    acciones_pendientes.append({
-                        'Fecha': fecha_accion,
-                        'Días': dias_diff,
-                        'Cliente': row.get('Nombre Cliente', 'N/A'),
-                        'Acción': row.get('Próxima Acción', 'N/A'),
-                        'Responsable': row.get('Responsable', 'N/A'),
-                        'Origen': 'Interacción',
-                        'Prioridad': 'Media'
-                    })
-                except:
-                    pass
+    for accion in snapshot['acciones_pendientes']:
+        fecha_accion = datetime.strptime(accion['Fecha'], '%Y-%m-%d').date()
+        acciones_pendientes.append(dict(accion, Fecha=fecha_accion, Días=(fecha_accion - hoy).days))
     
     if acciones_pendientes:
         # Ordenar por fecha
@@ -369,8 +500,12 @@ def modulo_dashboard():
     # Fila 4: Alertas del sistema
     st.subheader("🚨 Alertas del Sistema")
     
-    alertas_precio = utils.detectar_alertas_precios()
-    alertas_margen = utils.detectar_alertas_margenes()
+    # Calculadas en segundo plano; si los datos cambiaron se muestran las últimas mientras se recalculan
+    alertas = planificador.alertas_sistema()
+    alertas_precio = alertas['precios']
+    alertas_margen = alertas['margenes']
+    if not alertas['vigentes']:
+        st.caption("⏳ Actualizando alertas en segundo plano con los últimos cambios...")
     
     if alertas_precio or alertas_margen:
         col1, col2 = st.columns(2)
@@ -408,33 +543,18 @@ def modulo_crm():
     """Módulo de gestión de clientes y leads"""
     st.markdown('<h1 class="main-header">👥 CRM - Gestión de Clientes</h1>', unsafe_allow_html=True)
     
-    # Tabs
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-        "📋 Leads", 
-        "✅ Clientes Activos", 
-        "⏸️ Pausados/Baja",
-        "📅 Próximas Acciones", 
-        "📞 Interacciones", 
-        "💼 Servicios"
-    ])
-    
-    with tab1:
-        mostrar_leads()
-    
-    with tab2:
-        mostrar_clientes_activos()
-    
-    with tab3:
-        mostrar_clientes_inactivos()
-    
-    with tab4:
-        mostrar_proximas_acciones()
-    
-    with tab5:
-        mostrar_interacciones()
+    # Pestañas (solo se ejecuta la vista activa)
+    vistas = {
+        "📋 Leads": mostrar_leads,
+        "✅ Clientes Activos": mostrar_clientes_activos,
+        "⏸️ Pausados/Baja": mostrar_clientes_inactivos,
+        "📅 Próximas Acciones": mostrar_proximas_acciones,
+        "📞 Interacciones": mostrar_interacciones,
+        "💼 Servicios": mostrar_servicios
+    }
     
-    with tab6:
-        mostrar_servicios()
+    vista = selector_vista(list(vistas.keys()), key="vista_crm")
+    vistas[vista]()
 
 def mostrar_proximas_acciones():
     """Vista dedicada de próximas acciones con gestión"""
@@ -564,7 +684,10 @@ def mostrar_proximas_acciones():
             df_filtrado = df_filtrado[df_filtrado['Origen'].isin(filtro_origen)]
         
         if buscar:
-            df_filtrado = df_filtrado[df_filtrado['Cliente/Lead'].str.contains(buscar, case=False, na=False)]
+            # Cada acción se busca en el índice de su hoja de origen (se mantiene el orden por urgencia)
+            encontradas = busqueda.filtrar(df_filtrado[df_filtrado['Origen'] == 'Lead'], buscar, "LEADS", 'ID').index.union(
+                busqueda.filtrar(df_filtrado[df_filtrado['Origen'] == 'Interacción'], buscar, "INTERACCIONES", 'ID').index)
+            df_filtrado = df_filtrado[df_filtrado.index.isin(encontradas)]
         
         st.markdown("---")
         
@@ -656,6 +779,109 @@ def mostrar_proximas_acciones():
         st.success("✅ ¡No hay acciones pendientes! Perfecto para tomarse un descanso ☕")
         st.info("Las acciones aparecerán aquí cuando agregues 'Próxima Acción' en Leads o Interacciones")
 
+def convertir_leads_a_clientes(ids_leads, df_leads):
+    """
+    Convierte varios leads a clientes activos en un solo paso
+    (un bloque de IDs, una comprobación de duplicados y una escritura)
+    
+    Args:
+        ids_leads: IDs de los leads a convertir
+        df_leads: DataFrame de leads
+    
+    Returns:
+        dict: 'convertidos' [(id_lead, id_cliente, nombre)], 'existentes' [(id_lead, nombre, motivo)],
+              'no_encontrados' [id_lead] y 'error' (str o None)
+    """
+    resultado = {'convertidos': [], 'existentes': [], 'no_encontrados': [], 'error': None}
+    
+    try:
+        leads = df_leads[df_leads['ID'].isin(ids_leads)].drop_duplicates('ID')
+        resultado['no_encontrados'] = [i for i in ids_leads if i not in set(leads['ID'])]
+        
+        if leads.empty:
+            return resultado
+        
+        # Comprobar y escribir sobre la misma lectura de CLIENTES_ACTIVOS. Si no se
+        # puede leer, la excepción aborta: escribir solo los nuevos borraría el resto
+        with utils.lock_escritura(config.ARCHIVO_CRM):
+            df_clientes = utils._leer_hoja(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS")
+            
+            # Comprobar si ya existen (mismo CIF, o teléfono/CP/nombre con nombre parecido)
+            # y si el propio lote trae el mismo local dos veces
+            coincidencias = duplicados.coincidencias_lote(leads, df_clientes, 'Cliente')
+            nombres_clientes = dict(zip(df_clientes.get('ID', []), df_clientes.get('Nombre Comercial', [])))
+            
+            a_convertir = []
+            for posicion, (id_existente, previa) in enumerate(coincidencias.itertuples(index=False)):
+                lead_data = leads.iloc[posicion]
+                nombre_lead = lead_data.get('Nombre Comercial', 'Sin nombre')
+                
+                if id_existente is not None:
+                    resultado['existentes'].append(
+                        (lead_data['ID'], nombre_lead, f"ya es el cliente #{id_existente} - {nombres_clientes.get(id_existente, '')}"))
+                elif previa is not None:
+                    resultado['existentes'].append(
+                        (lead_data['ID'], nombre_lead, f"mismo local que el lead #{leads.iloc[previa]['ID']}"))
+                else:
+                    a_convertir.append(posicion)
+            
+            if not a_convertir:
+                return resultado
+            
+            # Bloque contiguo de IDs para los nuevos clientes
+            primer_id = utils.siguiente_id(df_clientes)
+            hoy = datetime.now()
+            
+            # Crear registros de cliente - usar exactamente los nombres de columnas del Excel
+            nuevos_clientes = []
+            for nuevo_id_cliente, posicion in enumerate(a_convertir, start=primer_id):
+                lead_data = leads.iloc[posicion]
+                id_lead = lead_data['ID']
+                nombre_lead = lead_data.get('Nombre Comercial', 'Sin nombre')
+                
+                nuevos_clientes.append({
+                    'ID': nuevo_id_cliente,
+                    'Nombre Comercial': nombre_lead,
+                    'CIF': lead_data.get('CIF', ''),
+                    'Razón Social': nombre_lead,  # Usar nombre comercial por defecto
+                    'Tipo Local': lead_data.get('Tipo Local', ''),
+                    'Dirección': '',
+                    'Ciudad': lead_data.get('Ciudad', ''),
+                    'CP': lead_data.get('CP', ''),
+                    'Teléfono': lead_data.get('Teléfono', ''),
+                    'Email': lead_data.get('Email', ''),
+                    'Nombre Contacto': lead_data.get('Nombre Contacto', ''),
+                    'Servicio Contratado': 'Por definir',
+                    'Precio Mensual': 0,
+                    'Fecha Inicio': hoy.date(),
+                    'Fecha Fin': None,
+                    'Estado': 'Activo',
+                    'MRR': 0,
+                    'Último Servicio': None,
+                    'Satisfacción (1-5)': 5,
+                    'Notas': f"Convertido automáticamente desde Lead #{id_lead} el {hoy.strftime('%d/%m/%Y')}"
+                })
+                resultado['convertidos'].append((id_lead, nuevo_id_cliente, nombre_lead))
+            
+            print(f"[DEBUG] Convirtiendo {len(nuevos_clientes)} leads a clientes "
+                  f"(IDs {primer_id}-{primer_id + len(nuevos_clientes) - 1})")
+            
+            # Una sola escritura de CLIENTES_ACTIVOS
+            df_final = pd.concat([df_clientes, pd.DataFrame(nuevos_clientes)], ignore_index=True)
+            if not utils.escribir_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS", df_final):
+                resultado['convertidos'] = []
+                resultado['error'] = "Error al guardar en Excel"
+        
+        return resultado
+        
+    except Exception as e:
+        import traceback
+        error_detallado = traceback.format_exc()
+        st.error(f"❌ Error detallado:\n```\n{error_detallado}\n```")
+        resultado['convertidos'] = []
+        resultado['error'] = f"Error: {str(e)}"
+        return resultado
+
 def convertir_lead_a_cliente(id_lead, df_leads):
     """
     Convierte un lead a cliente activo automáticamente
@@ -667,75 +893,102 @@ def convertir_lead_a_cliente(id_lead, df_leads):
     Returns:
         tuple: (bool éxito, str mensaje)
     """
-    try:
-        # Buscar el lead
-        lead = df_leads[df_leads['ID'] == id_lead]
-        
-        if lead.empty:
-            return False, f"Lead #{id_lead} no encontrado"
+    resultado = convertir_leads_a_clientes([id_lead], df_leads)
+    
+    if resultado['error']:
+        return False, resultado['error']
+    if resultado['no_encontrados']:
+        return False, f"Lead #{id_lead} no encontrado"
+    if resultado['existentes']:
+        # Ya existe, no duplicar
+        _, nombre_lead, motivo = resultado['existentes'][0]
+        return True, f"'{nombre_lead}' {motivo}"
+    
+    _, nuevo_id_cliente, nombre_lead = resultado['convertidos'][0]
+    return True, f"✅ '{nombre_lead}' convertido exitosamente a Cliente #{nuevo_id_cliente}"
+
+def mostrar_importacion_leads(df_leads):
+    """Importación masiva de leads desde CSV o Excel (una sola escritura)"""
+    with st.expander("📥 Importar Leads (CSV / Excel)"):
+        if 'importacion_resultado' in st.session_state:
+            st.success(st.session_state.pop('importacion_resultado'))
+        
+        # La clave cambia tras cada importación para vaciar el selector de archivo
+        archivo = st.file_uploader("Archivo de leads", type=["csv", "xlsx", "xls"],
+                                   key=f"importar_leads_archivo_{st.session_state.get('importaciones', 0)}")
+        
+        if archivo is None:
+            st.caption("La primera fila del archivo debe contener los nombres de las columnas.")
+            return
+        
+        try:
+            df_origen = importacion.leer_archivo(archivo)
+        except Exception as e:
+            st.error(f"❌ No se pudo leer el archivo: {str(e)}")
+            return
+        
+        st.caption(f"{len(df_origen)} filas leídas de {archivo.name}")
+        
+        # Correspondencia de columnas (se propone a partir de las cabeceras)
+        st.write("**Correspondencia de columnas**")
+        sugerido = importacion.sugerir_mapeo(df_origen.columns)
+        opciones = ["—"] + list(df_origen.columns)
+        mapeo = {}
+        
+        columnas = st.columns(4)
+        for i, destino in enumerate(importacion.COLUMNAS_IMPORTABLES):
+            with columnas[i % 4]:
+                indice = opciones.index(sugerido[destino]) if destino in sugerido else 0
+                origen = st.selectbox(destino, opciones, index=indice, key=f"importar_mapeo_{destino}")
+            if origen != "—":
+                mapeo[destino] = origen
+        
+        # Valores para las celdas vacías
+        st.write("**Valores por defecto**")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            tipo_local = st.selectbox("Tipo de Local", config.TIPOS_LOCAL, key="importar_tipo_local")
+        with col2:
+            estado = st.selectbox("Estado", config.ESTADOS_LEAD, key="importar_estado")
+        with col3:
+            fuente = st.selectbox("Fuente de Captación", config.FUENTES_CAPTACION, key="importar_fuente")
+        with col4:
+            prioridad = st.selectbox("Prioridad", config.PRIORIDADES, index=1, key="importar_prioridad")
         
-        lead_data = lead.iloc[0]
-        nombre_lead = lead_data.get('Nombre Comercial', 'Sin nombre')
+        if 'Nombre Comercial' not in mapeo:
+            st.warning("⚠️ Indica qué columna contiene el Nombre Comercial")
+            return
         
-        # Verificar si ya existe en clientes activos
-        df_clientes = utils.leer_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS")
+        validos, informe = importacion.preparar_importacion(
+            df_origen, mapeo,
+            {'Tipo Local': tipo_local, 'Estado Lead': estado, 'Fuente Captación': fuente, 'Prioridad': prioridad},
+            df_leads
+        )
         
-        # Comprobar si ya existe por nombre comercial
-        if not df_clientes.empty and 'Nombre Comercial' in df_clientes.columns:
-            existe = df_clientes[df_clientes['Nombre Comercial'] == nombre_lead]
-            if not existe.empty:
-                # Ya existe, no duplicar
-                return True, f"'{nombre_lead}' ya existe como cliente activo"
-        
-        # Obtener siguiente ID para cliente
-        nuevo_id_cliente = utils.obtener_siguiente_id(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS")
-        
-        # Crear registro de cliente - usar exactamente los nombres de columnas del Excel
-        nuevo_cliente = {
-            'ID': nuevo_id_cliente,
-            'Nombre Comercial': nombre_lead,
-            'CIF': lead_data.get('CIF', ''),
-            'Razón Social': nombre_lead,  # Usar nombre comercial por defecto
-            'Tipo Local': lead_data.get('Tipo Local', ''),
-            'Dirección': '',
-            'Ciudad': lead_data.get('Ciudad', ''),
-            'CP': lead_data.get('CP', ''),
-            'Teléfono': lead_data.get('Teléfono', ''),
-            'Email': lead_data.get('Email', ''),
-            'Nombre Contacto': lead_data.get('Nombre Contacto', ''),
-            'Servicio Contratado': 'Por definir',
-            'Precio Mensual': 0,
-            'Fecha Inicio': datetime.now().date(),
-            'Fecha Fin': None,
-            'Estado': 'Activo',
-            'MRR': 0,
-            'Último Servicio': None,
-            'Satisfacción (1-5)': 5,
-            'Notas': f"Convertido automáticamente desde Lead #{id_lead} el {datetime.now().strftime('%d/%m/%Y')}"
-        }
-        
-        # Debug: mostrar qué vamos a guardar
-        st.write("🔍 **Debug - Datos a guardar:**")
-        st.json({
-            'ID': nuevo_id_cliente,
-            'Nombre': nombre_lead,
-            'Ciudad': lead_data.get('Ciudad', ''),
-            'Teléfono': lead_data.get('Teléfono', '')
-        })
-        
-        # Agregar a CLIENTES_ACTIVOS
-        resultado = utils.agregar_fila(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS", nuevo_cliente)
-        
-        if resultado:
-            return True, f"✅ '{nombre_lead}' convertido exitosamente a Cliente #{nuevo_id_cliente}"
-        else:
-            return False, "Error al guardar en Excel"
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("✅ Filas válidas", len(validos))
+        with col2:
+            st.metric("❌ Filas con errores", len(informe))
+        
+        if not informe.empty:
+            st.dataframe(informe, use_container_width=True, hide_index=True)
+            st.download_button(
+                "⬇️ Descargar informe de errores",
+                informe.to_csv(index=False).encode('utf-8-sig'),
+                file_name="errores_importacion_leads.csv",
+                mime="text/csv"
+            )
         
-    except Exception as e:
-        import traceback
-        error_detallado = traceback.format_exc()
-        st.error(f"❌ Error detallado:\n```\n{error_detallado}\n```")
-        return False, f"Error: {str(e)}"
+        if not validos.empty and st.button(f"📥 Importar {len(validos)} leads", type="primary", key="importar_leads_confirmar"):
+            exito, ids = importacion.importar_leads(validos)
+            
+            if exito:
+                st.session_state.importacion_resultado = f"✅ {len(ids)} leads importados (IDs {ids[0]} a {ids[-1]})"
+                st.session_state.importaciones = st.session_state.get('importaciones', 0) + 1
+                st.rerun()
+            else:
+                st.error("❌ Error al importar los leads")
 
 def mostrar_leads():
     """Gestión de leads"""
@@ -854,51 +1107,94 @@ def mostrar_leads():
                 st.session_state.agregar_lead = False
                 st.rerun()
     
+    # Importación masiva
+    mostrar_importacion_leads(df_leads)
+    
     # Mostrar tabla de leads
     st.markdown("---")
     
     if not df_leads.empty:
         # Sección de cambio rápido de estado
         with st.expander("⚡ Cambio Rápido de Estado (Conversión Automática a Cliente)"):
-            st.write("**Cambia el estado de un lead. Si seleccionas 'Cliente', se convertirá automáticamente.**")
+            st.write("**Cambia el estado de uno o varios leads. Si seleccionas 'Cliente', se convertirán automáticamente.**")
             
-            col1, col2, col3 = st.columns([2, 2, 1])
+            if 'cambio_estado_resultado' in st.session_state:
+                for tipo, mensaje in st.session_state.pop('cambio_estado_resultado'):
+                    getattr(st, tipo)(mensaje)
+            
+            col1, col2 = st.columns([1, 3])
             
             with col1:
-                # Crear lista de leads
-                opciones_leads = [f"{row['ID']} - {row['Nombre Comercial']}" for _, row in df_leads.iterrows()]
-                lead_seleccionado = st.selectbox("Seleccionar Lead", opciones_leads, key="cambiar_estado_lead")
+                estados_actuales = df_leads['Estado Lead'].dropna().unique().tolist() if 'Estado Lead' in df_leads.columns else []
+                filtro_actual = st.selectbox("Estado actual", ["Todos"] + estados_actuales, key="cambiar_estado_filtro")
+            
+            candidatos = df_leads if filtro_actual == "Todos" else df_leads[df_leads['Estado Lead'] == filtro_actual]
+            # Crear lista de leads
+            opciones_leads = (candidatos['ID'].astype(str) + " - " + candidatos['Nombre Comercial'].astype(str)).tolist()
             
             with col2:
+                todos = st.checkbox(f"Seleccionar los {len(opciones_leads)} leads", key="cambiar_estado_todos")
+                leads_seleccionados = opciones_leads if todos else st.multiselect(
+                    "Seleccionar Leads", opciones_leads, key="cambiar_estado_leads")
+            
+            col1, col2 = st.columns([2, 1])
+            
+            with col1:
                 nuevo_estado = st.selectbox("Nuevo Estado", config.ESTADOS_LEAD, key="nuevo_estado_lead")
             
-            with col3:
+            with col2:
                 st.write("")
                 st.write("")
-                if st.button("🔄 Cambiar Estado", use_container_width=True):
-                    id_lead = int(lead_seleccionado.split(" - ")[0])
+                if st.button(f"🔄 Cambiar Estado ({len(leads_seleccionados)})", use_container_width=True,
+                             disabled=not leads_seleccionados):
+                    ids_leads = [int(opcion.split(" - ")[0]) for opcion in leads_seleccionados]
+                    mensajes = []
                     
-                    # Actualizar estado en el DataFrame
-                    df_leads_actualizado = df_leads.copy()
-                    df_leads_actualizado.loc[df_leads_actualizado['ID'] == id_lead, 'Estado Lead'] = nuevo_estado
+                    # Actualizar estado sobre la hoja recién leída (una sola escritura de LEADS)
+                    with utils.lock_escritura(config.ARCHIVO_CRM):
+                        df_leads_actualizado = utils.leer_excel(config.ARCHIVO_CRM, "LEADS")
+                        df_leads_actualizado.loc[df_leads_actualizado['ID'].isin(ids_leads), 'Estado Lead'] = nuevo_estado
+                        guardado = not df_leads_actualizado.empty and \
+                            utils.escribir_excel(config.ARCHIVO_CRM, "LEADS", df_leads_actualizado)
                     
-                    if utils.escribir_excel(config.ARCHIVO_CRM, "LEADS", df_leads_actualizado):
-                        st.success(f"✅ Estado actualizado a '{nuevo_estado}'")
+                    if guardado:
+                        mensajes.append(('success', f"✅ {len(ids_leads)} lead(s) actualizados a '{nuevo_estado}'"))
                         
-                        # Si el nuevo estado es "Cliente", convertir automáticamente
+                        # Si el nuevo estado es "Cliente", convertir todos en un lote
                         if nuevo_estado == "Cliente":
-                            exito, mensaje = convertir_lead_a_cliente(id_lead, df_leads_actualizado)
+                            resultado = convertir_leads_a_clientes(ids_leads, df_leads_actualizado)
                             
-                            if exito:
-                                st.success(f"🎉 {mensaje}")
-                                st.balloons()
-                                st.info("📋 Ve a la pestaña 'Clientes Activos' para verlo")
-                            else:
-                                st.error(f"⚠️ {mensaje}")
-                        
-                        st.cache_data.clear()
-                        time.sleep(1)
-                        st.rerun()
+                            if resultado['error']:
+                                mensajes.append(('error', f"⚠️ {resultado['error']}"))
+                            if resultado['convertidos']:
+                                ids_clientes = [c[1] for c in resultado['convertidos']]
+                                mensajes.append(('success', f"🎉 {len(ids_clientes)} lead(s) convertidos a clientes "
+                                                            f"(#{ids_clientes[0]} a #{ids_clientes[-1]})"))
+                                mensajes.append(('info', "📋 Ve a la pestaña 'Clientes Activos' para verlos"))
+                            for id_lead, nombre, motivo in resultado['existentes']:
+                                mensajes.append(('info', f"ℹ️ Lead #{id_lead} '{nombre}' no se convierte: {motivo}"))
+                    else:
+                        mensajes.append(('error', "❌ Error al guardar los cambios de estado"))
+                    
+                    st.session_state.cambio_estado_resultado = mensajes
+                    st.cache_data.clear()
+                    st.rerun()
+        
+        # Informe de duplicados (leads entre sí y leads frente a clientes)
+        with st.expander("🔁 Posibles Duplicados"):
+            st.write("**Registros que comparten CIF, teléfono, código postal o nombre y tienen un nombre parecido.**")
+            
+            if st.button("🔍 Buscar duplicados", key="buscar_duplicados"):
+                st.session_state.mostrar_duplicados = True
+            
+            if st.session_state.get('mostrar_duplicados', False):
+                df_duplicados = duplicados.duplicados_crm()
+                
+                if df_duplicados.empty:
+                    st.success("✅ No se han encontrado duplicados")
+                else:
+                    st.warning(f"⚠️ {df_duplicados['Grupo'].nunique()} grupos con {len(df_duplicados)} registros")
+                    st.dataframe(df_duplicados, use_container_width=True, hide_index=True)
         
         st.markdown("---")
         
@@ -911,7 +1207,8 @@ def mostrar_leads():
             filtro_prioridad = st.multiselect("Filtrar por Prioridad", 
                                              df_leads['Prioridad'].unique() if 'Prioridad' in df_leads.columns else [])
         with col3:
-            buscar = st.text_input("🔍 Buscar por nombre", key="buscar_leads")
+            buscar = st.text_input("🔍 Buscar por nombre", key="buscar_leads",
+                help="Nombre, ciudad, contacto, email, teléfono o notas. Tolera faltas de ortografía.")
         
         # Aplicar filtros
         df_filtrado = df_leads.copy()
@@ -923,16 +1220,12 @@ def mostrar_leads():
             df_filtrado = df_filtrado[df_filtrado['Prioridad'].isin(filtro_prioridad)]
         
         if buscar:
-            df_filtrado = df_filtrado[df_filtrado['Nombre Comercial'].str.contains(buscar, case=False, na=False)]
-        
-        # Mostrar tabla
-        st.dataframe(
-            df_filtrado,
-            use_container_width=True,
-            hide_index=True
-        )
+            df_filtrado = busqueda.filtrar(df_filtrado, buscar, "LEADS")
         
         st.caption(f"Mostrando {len(df_filtrado)} de {len(df_leads)} leads")
+        
+        # Mostrar tabla (solo la página visible)
+        tabla_paginada(df_filtrado, key="tabla_leads", filtro=False)
     else:
         st.info("No hay leads registrados. ¡Agrega el primero!")
 
@@ -1013,55 +1306,44 @@ def mostrar_clientes_activos():
         df_filtrado = df_filtrado[df_filtrado['Tipo Local'].isin(filtro_tipo)]
     
     if buscar:
-        df_filtrado = df_filtrado[
-            df_filtrado['Nombre Comercial'].str.contains(buscar, case=False, na=False) |
-            df_filtrado['Ciudad'].str.contains(buscar, case=False, na=False) if 'Ciudad' in df_filtrado.columns else False
-        ]
+        df_filtrado = busqueda.filtrar(df_filtrado, buscar, "CLIENTES_ACTIVOS")
     
     st.markdown("---")
     
-    # Mostrar tabla con botón de editar por fila
+    # Tabla paginada (solo se renderiza la página visible) + panel de edición único
     if not df_filtrado.empty:
         st.caption(f"Mostrando {len(df_filtrado)} de {len(df_clientes)} clientes")
         
-        for idx, row in df_filtrado.iterrows():
-            with st.container():
-                # Crear tarjeta por cliente
-                col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 1])
-                
-                with col1:
-                    st.markdown(f"**{row['Nombre Comercial']}**")
-                    if 'Ciudad' in row:
-                        st.caption(f"📍 {row.get('Ciudad', 'N/A')} | {row.get('Tipo Local', 'N/A')}")
-                
-                with col2:
-                    if 'Servicio Contratado' in row:
-                        st.write(f"📋 {row.get('Servicio Contratado', 'N/A')}")
-                
-                with col3:
-                    if 'MRR' in row:
-                        mrr_valor = row.get('MRR', 0)
-                        st.write(f"💰 {mrr_valor:.0f}€/mes")
-                
-                with col4:
-                    if 'Satisfacción (1-5)' in row:
-                        satisf = row.get('Satisfacción (1-5)', 0)
-                        estrellas = "⭐" * int(satisf) if satisf > 0 else "☆☆☆☆☆"
-                        st.write(f"{estrellas} ({satisf:.1f})")
-                
-                with col5:
-                    if st.button("✏️", key=f"edit_{row['ID']}", use_container_width=True, help="Editar cliente"):
-                        st.session_state.editando_cliente = row['ID']
-                        st.rerun()
-                
-                st.markdown("---")
+        columnas = [c for c in ['ID', 'Nombre Comercial', 'Ciudad', 'Tipo Local', 'Servicio Contratado',
+                                'MRR', 'Satisfacción (1-5)', 'Estado'] if c in df_filtrado.columns]
+        
+        df_pagina = tabla_paginada(
+            df_filtrado[columnas],
+            key="grid_clientes_activos",
+            filtro=False,
+            column_config={
+                "MRR": st.column_config.NumberColumn("💰 MRR", format="%.0f €"),
+                "Satisfacción (1-5)": st.column_config.NumberColumn("⭐ Satisfacción", format="%.1f")
+            }
+        )
+        
+        id_editar = selector_edicion(df_pagina, key="grid_clientes_activos")
+        if id_editar is not None:
+            st.session_state.editando_cliente = id_editar
+            st.rerun()
     else:
         st.warning("No hay clientes que coincidan con los filtros")
     
-    # Modal de edición
+    # Panel de edición
     if st.session_state.get('editando_cliente'):
         id_cliente = st.session_state.editando_cliente
-        cliente = df_clientes[df_clientes['ID'] == id_cliente].iloc[0]
+        seleccion = df_clientes_todos[df_clientes_todos['ID'] == id_cliente]
+        
+        if seleccion.empty:
+            del st.session_state.editando_cliente
+            st.rerun()
+        
+        cliente = seleccion.iloc[0]
         
         st.markdown("---")
         st.subheader(f"✏️ Editando: {cliente['Nombre Comercial']}")
@@ -1128,31 +1410,37 @@ def mostrar_clientes_activos():
                 if not nombre_comercial:
                     st.error("El nombre comercial es obligatorio")
                 else:
-                    # Actualizar datos
-                    df_actualizado = df_clientes.copy()
-                    
-                    # Calcular MRR
-                    mrr = precio_mensual if estado == "Activo" else 0
-                    
-                    # Actualizar la fila
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Nombre Comercial'] = nombre_comercial
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'CIF'] = cif
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Razón Social'] = razon_social
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Tipo Local'] = tipo_local
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Dirección'] = direccion
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Ciudad'] = ciudad
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'CP'] = cp
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Teléfono'] = telefono
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Email'] = email
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Nombre Contacto'] = nombre_contacto
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Servicio Contratado'] = servicio
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Precio Mensual'] = precio_mensual
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Estado'] = estado
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'MRR'] = mrr
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Satisfacción (1-5)'] = satisfaccion
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Notas'] = notas
+                    # Actualizar datos (hoja completa, incluidos los clientes de Baja)
+                    with utils.lock_escritura(config.ARCHIVO_CRM):
+                        # Sobre la hoja recién leída: no pisar cambios guardados desde otra sesión
+                        df_actualizado = utils.leer_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS")
+                        
+                        # Calcular MRR
+                        mrr = precio_mensual if estado == "Activo" else 0
+                        
+                        # Actualizar la fila
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Nombre Comercial'] = nombre_comercial
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'CIF'] = cif
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Razón Social'] = razon_social
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Tipo Local'] = tipo_local
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Dirección'] = direccion
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Ciudad'] = ciudad
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'CP'] = cp
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Teléfono'] = telefono
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Email'] = email
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Nombre Contacto'] = nombre_contacto
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Servicio Contratado'] = servicio
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Precio Mensual'] = precio_mensual
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Estado'] = estado
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'MRR'] = mrr
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Satisfacción (1-5)'] = satisfaccion
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Notas'] = notas
+                        
+                        # Vacía solo si no se pudo leer: no sobrescribir la hoja con nada
+                        guardado = not df_actualizado.empty and \
+                            utils.escribir_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS", df_actualizado)
                     
-                    if utils.escribir_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS", df_actualizado):
+                    if guardado:
                         st.success(f"✅ Cliente '{nombre_comercial}' actualizado correctamente")
                         
                         # Si cambió el estado a Baja o Pausado, mostrar alerta
@@ -1223,61 +1511,48 @@ def mostrar_clientes_inactivos():
         df_filtrado = df_filtrado[df_filtrado['Estado'].isin(filtro_estado)]
     
     if buscar:
-        df_filtrado = df_filtrado[
-            df_filtrado['Nombre Comercial'].str.contains(buscar, case=False, na=False) |
-            df_filtrado['Ciudad'].str.contains(buscar, case=False, na=False) if 'Ciudad' in df_filtrado.columns else False
-        ]
+        df_filtrado = busqueda.filtrar(df_filtrado, buscar, "CLIENTES_ACTIVOS")
     
     st.markdown("---")
     
-    # Mostrar tabla
+    # Tabla paginada + panel de edición único
     if not df_filtrado.empty:
         st.caption(f"Mostrando {len(df_filtrado)} de {len(df_clientes)} clientes inactivos")
         
-        for idx, row in df_filtrado.iterrows():
-            with st.container():
-                col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 1, 1])
-                
-                with col1:
-                    # Icono según estado
-                    icono = "⏸️" if row['Estado'] == 'Pausado' else "❌"
-                    st.markdown(f"{icono} **{row['Nombre Comercial']}**")
-                    if 'Ciudad' in row:
-                        st.caption(f"📍 {row.get('Ciudad', 'N/A')} | {row.get('Tipo Local', 'N/A')}")
-                
-                with col2:
-                    if 'Servicio Contratado' in row:
-                        st.write(f"📋 {row.get('Servicio Contratado', 'N/A')}")
-                
-                with col3:
-                    if 'Precio Mensual' in row:
-                        precio = row.get('Precio Mensual', 0)
-                        st.write(f"💰 {precio:.0f}€/mes")
-                
-                with col4:
-                    # Badge de estado
-                    if row['Estado'] == 'Pausado':
-                        st.markdown("🟡 **Pausado**")
-                    else:
-                        st.markdown("🔴 **Baja**")
-                
-                with col5:
-                    if st.button("✏️", key=f"edit_inact_{row['ID']}", use_container_width=True, help="Editar"):
-                        st.session_state.editando_cliente_inactivo = row['ID']
-                        st.rerun()
-                
-                # Mostrar notas si hay
-                if 'Notas' in row and row.get('Notas'):
-                    st.caption(f"📝 {row.get('Notas')}")
-                
-                st.markdown("---")
+        df_tabla = df_filtrado.copy()
+        # Badge de estado
+        df_tabla['Estado'] = df_tabla['Estado'].map({'Pausado': '🟡 Pausado', 'Baja': '🔴 Baja'}).fillna(df_tabla['Estado'])
+        
+        columnas = [c for c in ['ID', 'Estado', 'Nombre Comercial', 'Ciudad', 'Tipo Local', 'Servicio Contratado',
+                                'Precio Mensual', 'Notas'] if c in df_tabla.columns]
+        
+        df_pagina = tabla_paginada(
+            df_tabla[columnas],
+            key="grid_clientes_inactivos",
+            filtro=False,
+            column_config={
+                "Precio Mensual": st.column_config.NumberColumn("💰 Precio Mensual", format="%.0f €"),
+                "Notas": st.column_config.TextColumn("📝 Notas", width="large")
+            }
+        )
+        
+        id_editar = selector_edicion(df_pagina, key="grid_clientes_inactivos")
+        if id_editar is not None:
+            st.session_state.editando_cliente_inactivo = id_editar
+            st.rerun()
     else:
         st.warning("No hay clientes que coincidan con los filtros")
     
-    # Modal de edición (reutilizar la misma lógica que clientes activos)
+    # Panel de edición (misma lógica que clientes activos)
     if st.session_state.get('editando_cliente_inactivo'):
         id_cliente = st.session_state.editando_cliente_inactivo
-        cliente = df_clientes_todos[df_clientes_todos['ID'] == id_cliente].iloc[0]
+        seleccion = df_clientes_todos[df_clientes_todos['ID'] == id_cliente]
+        
+        if seleccion.empty:
+            del st.session_state.editando_cliente_inactivo
+            st.rerun()
+        
+        cliente = seleccion.iloc[0]
         
         st.markdown("---")
         st.subheader(f"✏️ Editando: {cliente['Nombre Comercial']}")
@@ -1319,21 +1594,27 @@ def mostrar_clientes_inactivos():
                 if not nombre_comercial:
                     st.error("El nombre comercial es obligatorio")
                 else:
-                    df_actualizado = df_clientes_todos.copy()
-                    
-                    # Calcular MRR
-                    mrr = precio_mensual if estado == "Activo" else 0
-                    
-                    # Actualizar
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Nombre Comercial'] = nombre_comercial
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Servicio Contratado'] = servicio
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Precio Mensual'] = precio_mensual
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Estado'] = estado
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'MRR'] = mrr
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Satisfacción (1-5)'] = satisfaccion
-                    df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Notas'] = notas
+                    with utils.lock_escritura(config.ARCHIVO_CRM):
+                        # Sobre la hoja recién leída: no pisar cambios guardados desde otra sesión
+                        df_actualizado = utils.leer_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS")
+                        
+                        # Calcular MRR
+                        mrr = precio_mensual if estado == "Activo" else 0
+                        
+                        # Actualizar
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Nombre Comercial'] = nombre_comercial
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Servicio Contratado'] = servicio
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Precio Mensual'] = precio_mensual
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Estado'] = estado
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'MRR'] = mrr
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Satisfacción (1-5)'] = satisfaccion
+                        df_actualizado.loc[df_actualizado['ID'] == id_cliente, 'Notas'] = notas
+                        
+                        # Vacía solo si no se pudo leer: no sobrescribir la hoja con nada
+                        guardado = not df_actualizado.empty and \
+                            utils.escribir_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS", df_actualizado)
                     
-                    if utils.escribir_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS", df_actualizado):
+                    if guardado:
                         st.success(f"✅ Cliente '{nombre_comercial}' actualizado")
                         
                         # Alertas según cambio de estado
@@ -1353,6 +1634,66 @@ def mostrar_clientes_inactivos():
                 del st.session_state.editando_cliente_inactivo
                 st.rerun()
 
+def mostrar_linea_tiempo_cliente():
+    """Línea de tiempo de un cliente/lead a partir del índice de interacciones"""
+    indice = historial.indice_interacciones()
+    df_con_interacciones = indice.clientes()
+    
+    if df_con_interacciones.empty:
+        return
+    
+    with st.expander("🕒 Línea de Tiempo por Cliente"):
+        opciones = (df_con_interacciones['ID Cliente'].astype(str) + " - " +
+                    df_con_interacciones['Nombre Cliente'].astype(str) + " (" +
+                    df_con_interacciones['Interacciones'].astype(str) + ")").tolist()
+        
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            seleccion = st.selectbox("Cliente/Lead", opciones, key="linea_tiempo_cliente")
+        with col2:
+            ultimas = st.number_input("Últimas", min_value=5, max_value=200, value=20, step=5,
+                                      key="linea_tiempo_ultimas")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            rango = st.date_input("Periodo", value=(), key="linea_tiempo_periodo")
+        with col2:
+            tipos = st.multiselect("Tipo", ["Visita", "Llamada", "Email", "WhatsApp", "Reunión", "Videollamada"],
+                                   key="linea_tiempo_tipos")
+        with col3:
+            resultados = st.multiselect("Resultado", ["Positivo", "Negativo", "Neutro", "Seguimiento Necesario"],
+                                        key="linea_tiempo_resultados")
+        
+        id_cliente = int(seleccion.split(" - ")[0])
+        desde = rango[0] if len(rango) > 0 else None
+        hasta = rango[1] if len(rango) > 1 else None
+        
+        resumen = indice.resumen_cliente(id_cliente)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Interacciones", resumen['total'])
+        with col2:
+            st.metric("Primera", utils.fecha_a_texto(resumen['primera']))
+        with col3:
+            st.metric("Última", utils.fecha_a_texto(resumen['ultima']))
+        
+        df_linea = indice.linea_tiempo(id_cliente, desde=desde, hasta=hasta, tipos=tipos,
+                                       resultados=resultados, ultimas=ultimas)
+        
+        if df_linea.empty:
+            st.info("No hay interacciones con esos filtros")
+            return
+        
+        emojis_resultado = {"Positivo": "🟢", "Negativo": "🔴", "Neutro": "⚪", "Seguimiento Necesario": "🟡"}
+        for _, interaccion in df_linea.iterrows():
+            fecha = interaccion['Fecha'].strftime('%d/%m/%Y %H:%M') if pd.notna(interaccion['Fecha']) else "Sin fecha"
+            emoji = emojis_resultado.get(interaccion.get('Resultado'), "⚪")
+            st.write(f"{emoji} **{fecha}** · {interaccion.get('Tipo', '')} · {interaccion.get('Resultado', '')}")
+            if pd.notna(interaccion.get('Descripción')):
+                st.caption(str(interaccion['Descripción']))
+            if pd.notna(interaccion.get('Próxima Acción')) and str(interaccion['Próxima Acción']).strip():
+                st.caption(f"➡️ {interaccion['Próxima Acción']}")
+
 def mostrar_interacciones():
     """Historial de interacciones"""
     st.subheader("📞 Historial de Interacciones")
@@ -1459,6 +1800,8 @@ def mostrar_interacciones():
     st.markdown("---")
     
     if not df_inter.empty:
+        mostrar_linea_tiempo_cliente()
+        
         # Filtros
         col1, col2, col3 = st.columns(3)
         
@@ -1486,7 +1829,7 @@ def mostrar_interacciones():
             df_filtrado = df_filtrado[df_filtrado['Resultado'].isin(filtro_resultado)]
         
         if 'buscar_cliente' in locals() and buscar_cliente:
-            df_filtrado = df_filtrado[df_filtrado['Nombre Cliente'].str.contains(buscar_cliente, case=False, na=False)]
+            df_filtrado = busqueda.filtrar(df_filtrado, buscar_cliente, "INTERACCIONES")
         
         # Ordenar por fecha descendente
         if 'Fecha' in df_filtrado.columns:
@@ -1511,14 +1854,10 @@ def mostrar_interacciones():
         
         st.markdown("---")
         
-        # Mostrar tabla
-        st.dataframe(
-            df_filtrado,
-            use_container_width=True,
-            hide_index=True
-        )
-        
         st.caption(f"Mostrando {len(df_filtrado)} de {len(df_inter)} interacciones")
+        
+        # Mostrar tabla (solo la página visible)
+        tabla_paginada(df_filtrado, key="tabla_interacciones")
     else:
         st.info("📞 No hay interacciones registradas. ¡Registra la primera!")
 
@@ -1547,14 +1886,86 @@ def mostrar_servicios():
         
         st.markdown("---")
         
-        st.dataframe(
-            df_serv,
-            use_container_width=True,
-            hide_index=True
-        )
+        tabla_paginada(df_serv, key="tabla_servicios")
     else:
         st.info("No hay servicios registrados")
 
+# ============================================================================
+# CACHÉ DE DATOS POR CLIENTE (OPERACIONES)
+# ============================================================================
+
+def opciones_clientes_activos():
+    """
+    Opciones 'ID - Nombre' de clientes activos (índice memoizado en el rerun)
+    Se construyen siempre desde CLIENTES_ACTIVOS completa, no desde un DataFrame
+    del llamador: así el índice es el mismo para todos los que lo comparten
+    """
+    def construir():
+        df_clientes = utils.leer_excel(config.ARCHIVO_CRM, "CLIENTES_ACTIVOS")
+        if 'Estado' in df_clientes.columns:
+            df_clientes = df_clientes[df_clientes['Estado'] == 'Activo']
+        if df_clientes.empty:
+            return []
+        return (df_clientes['ID'].astype(str) + " - " + df_clientes['Nombre Comercial'].astype(str)).tolist()
+    
+    contexto = contexto_datos.contexto_actual()
+    if contexto is None:
+        return construir()
+    return contexto.indice("opciones_clientes_activos", [config.ARCHIVO_CRM], construir)
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _hoja_operaciones(hoja, version):
+    """
+    Hoja completa de OPERACIONES (una entrada por versión del archivo)
+    Si no se puede leer (p. ej. el Excel está abierto) la excepción se propaga:
+    st.cache_resource no guarda excepciones, así el siguiente rerun reintenta
+    """
+    return pd.read_excel(config.ARCHIVO_OPERACIONES, sheet_name=hoja)
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _hoja_por_cliente(hoja, version):
+    """
+    Parte una hoja de OPERACIONES por 'ID Cliente'
+    ESCANDALLOS no tiene cliente: se asigna a través del plato en CARTA_CLIENTES
+    """
+    df = _hoja_operaciones(hoja, version)
+    
+    if hoja == "ESCANDALLOS" and not df.empty:
+        df_carta = _hoja_operaciones("CARTA_CLIENTES", version)
+        if df_carta.empty:
+            return df.iloc[0:0], {}
+        cliente_por_plato = df_carta.set_index('ID Plato')['ID Cliente']
+        cliente_por_plato = cliente_por_plato[~cliente_por_plato.index.duplicated()]
+        claves = df['ID Plato'].map(cliente_por_plato)
+    elif not df.empty:
+        claves = df['ID Cliente']
+    else:
+        return df, {}
+    
+    return df.iloc[0:0], {id_cliente: grupo for id_cliente, grupo in df.groupby(claves)}
+
+def cargar_hoja_operaciones(hoja):
+    """Copia de una hoja de OPERACIONES, cacheada hasta que el archivo cambie"""
+    try:
+        return _hoja_operaciones(hoja, utils.version_archivo(config.ARCHIVO_OPERACIONES)).copy()
+    except Exception as e:
+        st.error(f"Error al leer {config.ARCHIVO_OPERACIONES} - {hoja}: {str(e)}")
+        return pd.DataFrame()
+
+def cargar_hoja_cliente(hoja, id_cliente):
+    """
+    Filas de una hoja de OPERACIONES para un cliente
+    
+    Las particiones se cachean por versión del archivo, así que volver a una
+    pestaña o a un cliente ya visitado no vuelve a leer el Excel.
+    """
+    try:
+        vacio, particiones = _hoja_por_cliente(hoja, utils.version_archivo(config.ARCHIVO_OPERACIONES))
+    except Exception as e:
+        st.error(f"Error al leer {config.ARCHIVO_OPERACIONES} - {hoja}: {str(e)}")
+        return pd.DataFrame()
+    return particiones.get(id_cliente, vacio).copy()
+
 # ============================================================================
 # MÓDULO: ESCANDALLOS
 # ============================================================================
@@ -1597,8 +2008,7 @@ def modulo_escandallos():
     
     with col1:
         # Solo mostrar clientes ACTIVOS
-        opciones_clientes = [f"{row['ID']} - {row['Nombre Comercial']}" 
-                            for _, row in df_clientes.iterrows()]
+        opciones_clientes = opciones_clientes_activos()
         
         # Recordar el cliente seleccionado
         if 'cliente_escandallo_actual' not in st.session_state:
@@ -1632,32 +2042,23 @@ def modulo_escandallos():
     st.markdown("---")
     
     # ========== TABS DEL CLIENTE ==========
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "🍴 Carta", 
-        "🔍 Escandallos", 
-        "📊 Ingredientes", 
-        "💰 Compras"
-    ])
-    
-    with tab1:
-        mostrar_carta_cliente(id_cliente, nombre_cliente)
-    
-    with tab2:
-        mostrar_escandallos_cliente(id_cliente, nombre_cliente)
-    
-    with tab3:
-        mostrar_ingredientes_cliente(id_cliente, nombre_cliente)
+    # Solo se carga la vista activa
+    vistas = {
+        "🍴 Carta": mostrar_carta_cliente,
+        "🔍 Escandallos": mostrar_escandallos_cliente,
+        "📊 Ingredientes": mostrar_ingredientes_cliente,
+        "💰 Compras": mostrar_compras_cliente
+    }
     
-    with tab4:
-        mostrar_compras_cliente(id_cliente, nombre_cliente)
+    vista = selector_vista(list(vistas.keys()), key="vista_escandallos")
+    vistas[vista](id_cliente, nombre_cliente)
 
 def mostrar_carta_cliente(id_cliente, nombre_cliente):
     """Carta del cliente seleccionado"""
     st.subheader(f"🍴 Carta de {nombre_cliente}")
     
     # Cargar platos solo de este cliente
-    df_carta_completa = utils.leer_excel(config.ARCHIVO_OPERACIONES, "CARTA_CLIENTES")
-    df_carta = df_carta_completa[df_carta_completa['ID Cliente'] == id_cliente] if not df_carta_completa.empty else pd.DataFrame()
+    df_carta = cargar_hoja_cliente("CARTA_CLIENTES", id_cliente)
     
     # Botón agregar
     if st.button("➕ Agregar Plato a la Carta", type="primary", key="btn_agregar_plato"):
@@ -1771,7 +2172,7 @@ def mostrar_carta_cliente(id_cliente, nombre_cliente):
             if not bajo.empty:
                 st.warning(f"⚠️ {len(bajo)} platos con margen bajo")
         
-        st.dataframe(df_carta, use_container_width=True, hide_index=True)
+        tabla_paginada(df_carta, key="tabla_carta_cliente")
     else:
         st.info(f"🍽️ {nombre_cliente} no tiene platos. ¡Agrega el primero!")
 
@@ -1779,12 +2180,8 @@ def mostrar_escandallos_cliente(id_cliente, nombre_cliente):
     """Escandallos del cliente seleccionado"""
     st.subheader(f"🔍 Escandallos de {nombre_cliente}")
     
-    df_esc_completo = utils.leer_excel(config.ARCHIVO_OPERACIONES, "ESCANDALLOS")
-    df_platos_completo = utils.leer_excel(config.ARCHIVO_OPERACIONES, "CARTA_CLIENTES")
-    df_ing = utils.leer_excel(config.ARCHIVO_OPERACIONES, "INGREDIENTES_MAESTRO")
-    
-    # Filtrar platos de este cliente
-    df_platos = df_platos_completo[df_platos_completo['ID Cliente'] == id_cliente] if not df_platos_completo.empty else pd.DataFrame()
+    # Platos de este cliente
+    df_platos = cargar_hoja_cliente("CARTA_CLIENTES", id_cliente)
     
     if df_platos.empty:
         st.warning(f"⚠️ {nombre_cliente} no tiene platos. Agrega platos en la pestaña 'Carta' primero.")
@@ -1792,7 +2189,6 @@ def mostrar_escandallos_cliente(id_cliente, nombre_cliente):
     
     # Lista de platos del cliente
     platos_cliente = [f"{row['ID Plato']} - {row['Nombre Plato']}" for _, row in df_platos.iterrows()]
-    ingredientes_disp = [f"{row['ID Ingrediente']} - {row['Nombre']}" for _, row in df_ing.iterrows()] if not df_ing.empty else []
     
     # Selector de plato + botón
     col1, col2 = st.columns([3, 1])
@@ -1810,8 +2206,7 @@ def mostrar_escandallos_cliente(id_cliente, nombre_cliente):
             st.write("**Agregar ingrediente al escandallo**")
             
             # Cargar precios de este cliente
-            df_precios_cliente = utils.leer_excel(config.ARCHIVO_OPERACIONES, "PRECIOS_POR_CLIENTE")
-            df_precios_cliente = df_precios_cliente[df_precios_cliente['ID Cliente'] == id_cliente]
+            df_precios_cliente = cargar_hoja_cliente("PRECIOS_POR_CLIENTE", id_cliente)
             
             if df_precios_cliente.empty:
                 st.error(f"⚠️ {nombre_cliente} no tiene ingredientes asignados.")
@@ -1889,7 +2284,7 @@ def mostrar_escandallos_cliente(id_cliente, nombre_cliente):
                         
                         if utils.agregar_fila(config.ARCHIVO_OPERACIONES, "ESCANDALLOS", nuevo_esc):
                             st.success(f"✅ Ingrediente agregado (coste: {coste_total:.2f}€)")
-                            utils.recalcular_costes_platos(utils.leer_excel(config.ARCHIVO_OPERACIONES, "ESCANDALLOS"))
+                            planificador.encolar('recalcular_costes', origen='Guardado')
                             st.session_state.agregar_escandallo = False
                             time.sleep(0.5)
                             st.rerun()
@@ -1901,9 +2296,8 @@ def mostrar_escandallos_cliente(id_cliente, nombre_cliente):
     # Mostrar escandallos
     st.markdown("---")
     
-    # Filtrar escandallos por platos del cliente
-    ids_platos_cliente = df_platos['ID Plato'].tolist()
-    df_esc = df_esc_completo[df_esc_completo['ID Plato'].isin(ids_platos_cliente)] if not df_esc_completo.empty else pd.DataFrame()
+    # Escandallos de los platos del cliente
+    df_esc = cargar_hoja_cliente("ESCANDALLOS", id_cliente)
     
     if plato_ver != "📋 Todos":
         id_plato_filtro = int(plato_ver.split(" - ")[0])
@@ -1925,7 +2319,7 @@ def mostrar_escandallos_cliente(id_cliente, nombre_cliente):
             st.markdown("---")
     
     if not df_esc.empty:
-        st.dataframe(df_esc, use_container_width=True, hide_index=True)
+        tabla_paginada(df_esc, key="tabla_escandallos_cliente")
     else:
         st.info("🔍 No hay escandallos. Agrega ingredientes a los platos.")
 
@@ -1933,13 +2327,50 @@ def mostrar_compras_cliente(id_cliente, nombre_cliente):
     """Compras del cliente seleccionado"""
     st.subheader(f"💰 Compras de {nombre_cliente}")
     
-    df_compras_completo = utils.leer_excel(config.ARCHIVO_OPERACIONES, "COMPRAS_CLIENTE")
-    df_compras = df_compras_completo[df_compras_completo['ID Cliente'] == id_cliente] if not df_compras_completo.empty else pd.DataFrame()
+    df_compras = cargar_hoja_cliente("COMPRAS_CLIENTE", id_cliente)
     
-    if not df_compras.empty:
-        st.dataframe(df_compras, use_container_width=True, hide_index=True)
-    else:
+    if df_compras.empty:
         st.info(f"💰 {nombre_cliente} no tiene compras registradas todavía.")
+        return
+    
+    analitica = analisis_compras.obtener_analitica()
+    filtro = {'ID Cliente': id_cliente}
+    serie = analitica.serie_semanal(filtro)
+    
+    if not serie.empty:
+        ultima = serie.iloc[-1]
+        por_proveedor = analitica.gasto_por('Proveedor', filtro)
+        comparable = analitica.gasto_por('Cliente', filtro)
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("🛒 Gasto 4 semanas", utils.formatear_moneda(ultima['Gasto 4 sem']))
+        with col2:
+            st.metric("🛒 Gasto 12 semanas", utils.formatear_moneda(ultima['Gasto 12 sem']))
+        with col3:
+            sobreprecio = comparable['Sobreprecio %'].iloc[0] if not comparable.empty else None
+            st.metric("📈 Sobreprecio 12 semanas", f"{sobreprecio:+.1f}%" if pd.notna(sobreprecio) else "-")
+        with col4:
+            st.metric("💸 Ahorro potencial acumulado", utils.formatear_moneda(ultima['Ahorro Potencial Acumulado']))
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**📊 Gasto semanal y ventanas móviles**")
+            st.line_chart(serie[['Gasto'] + [f"Gasto {v} sem" for v in analisis_compras.VENTANAS_SEMANAS]])
+        with col2:
+            st.write("**💸 Ahorro potencial acumulado**")
+            st.area_chart(serie['Ahorro Potencial Acumulado'])
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**🏢 Por proveedor**")
+            st.dataframe(por_proveedor, use_container_width=True, hide_index=True)
+        with col2:
+            st.write("**🗂️ Por categoría**")
+            st.dataframe(analitica.gasto_por('Categoría', filtro), use_container_width=True, hide_index=True)
+    
+    with st.expander("📋 Registro de compras"):
+        tabla_paginada(df_compras, key="tabla_compras_cliente")
 
 def mostrar_escandallos():
     """Vista y gestión de escandallos (ingredientes por plato)"""
@@ -2048,8 +2479,8 @@ def mostrar_escandallos():
                         st.success(f"✅ Ingrediente agregado al escandallo")
                         st.info(f"💰 Coste: {coste_total:.2f} €")
                         
-                        # Recalcular coste total del plato
-                        utils.recalcular_costes_platos(utils.leer_excel(config.ARCHIVO_OPERACIONES, "ESCANDALLOS"))
+                        # Recalcular coste total del plato (en segundo plano)
+                        planificador.encolar('recalcular_costes', origen='Guardado')
                         
                         st.session_state.agregar_escandallo = False
                         st.cache_data.clear()
@@ -2104,10 +2535,9 @@ def mostrar_escandallos():
             df_filtrado = df_esc
         
         # Mostrar tabla
-        st.dataframe(
+        tabla_paginada(
             df_filtrado,
-            use_container_width=True,
-            hide_index=True,
+            key="tabla_escandallos",
             column_config={
                 "Coste Unitario": st.column_config.NumberColumn(
                     "Coste Unitario",
@@ -2302,10 +2732,9 @@ def mostrar_carta():
                 st.warning(f"⚠️ {len(platos_bajo_margen)} platos con margen bajo (<{config.UMBRAL_MARGEN_MINIMO}%)")
         
         # Mostrar tabla con formato condicional
-        st.dataframe(
+        tabla_paginada(
             df_filtrado,
-            use_container_width=True,
-            hide_index=True,
+            key="tabla_carta",
             column_config={
                 "Margen %": st.column_config.NumberColumn(
                     "Margen %",
@@ -2346,20 +2775,60 @@ def mostrar_ingredientes():
         
         if not df_ing.empty:
             st.caption("**Base de datos de referencia** (precio promedio del mercado)")
-            st.dataframe(df_ing, use_container_width=True, hide_index=True)
+            tabla_paginada(historico_precios.aplicar_variaciones(df_ing), key="tabla_ingredientes_maestro",
+                           column_config={
+                               "Var % Semana": st.column_config.NumberColumn("Var % Semana", format="%+.1f%%"),
+                               "Var % Mes": st.column_config.NumberColumn("Var % Mes", format="%+.1f%%")
+                           })
+            mostrar_historico_precio(df_ing)
         else:
             st.info("No hay ingredientes en la base maestra")
 
+def mostrar_historico_precio(df_ing):
+    """Evolución del precio de mercado de un ingrediente y actualización del precio"""
+    with st.expander("📈 Histórico y Actualización de Precio de Mercado"):
+        nombres = dict(zip(df_ing['ID Ingrediente'], df_ing['Nombre']))
+        
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            id_ing = st.selectbox("Ingrediente", list(nombres), format_func=lambda i: f"{i} - {nombres[i]}",
+                                  key="historico_ingrediente")
+        with col2:
+            dias = st.selectbox("Periodo", [30, 90, 365, 3650], index=1,
+                                format_func=lambda d: "Todo" if d == 3650 else f"Últimos {d} días",
+                                key="historico_dias")
+        
+        ventana = historico_precios.historico().ventana(id_ing, desde=datetime.now() - pd.Timedelta(days=dias))
+        if not ventana.empty:
+            st.line_chart(ventana.set_index('Fecha')['Precio'])
+        else:
+            st.info("Sin precios registrados en el periodo (el histórico empieza con el primer cambio de precio)")
+        
+        precio_actual = float(df_ing.loc[df_ing['ID Ingrediente'] == id_ing, 'Precio Mercado Medio'].iloc[0])
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            nuevo_precio = st.number_input("Nuevo Precio Mercado (€)", value=precio_actual, min_value=0.0,
+                                           step=0.1, format="%.2f", key="historico_nuevo_precio")
+        with col2:
+            st.write("")
+            st.write("")
+            if st.button("🔄 Actualizar Precio", use_container_width=True, key="historico_actualizar"):
+                if nuevo_precio > 0 and nuevo_precio != precio_actual:
+                    if utils.actualizar_precio_mercado(id_ing, nuevo_precio, recalcular=False):
+                        planificador.encolar('recalcular_costes', origen='Guardado')
+                        st.success(f"✅ {nombres[id_ing]}: {precio_actual:.2f}€ → {nuevo_precio:.2f}€ "
+                                   f"(costes de los platos recalculándose en segundo plano)")
+                        time.sleep(0.5)
+                        st.rerun()
+                else:
+                    st.warning("Introduce un precio distinto del actual y mayor que 0")
+
 def mostrar_ingredientes_cliente(id_cliente, nombre_cliente):
     """Ingredientes con precios específicos del cliente seleccionado"""
     st.subheader(f"📊 Ingredientes de {nombre_cliente}")
     
-    # Cargar datos
-    df_ing_maestro = utils.leer_excel(config.ARCHIVO_OPERACIONES, "INGREDIENTES_MAESTRO")
-    df_precios_todos = utils.leer_excel(config.ARCHIVO_OPERACIONES, "PRECIOS_POR_CLIENTE")
-    
-    # Filtrar precios de este cliente
-    df_precios_cliente = df_precios_todos[df_precios_todos['ID Cliente'] == id_cliente] if not df_precios_todos.empty else pd.DataFrame()
+    # Precios de este cliente
+    df_precios_cliente = cargar_hoja_cliente("PRECIOS_POR_CLIENTE", id_cliente)
     
     st.write("---")
     
@@ -2379,6 +2848,8 @@ def mostrar_ingredientes_cliente(id_cliente, nombre_cliente):
         with st.form("form_asignar_ingrediente"):
             st.write(f"**Asignar ingrediente existente a {nombre_cliente}**")
             
+            df_ing_maestro = cargar_hoja_operaciones("INGREDIENTES_MAESTRO")
+            
             if df_ing_maestro.empty:
                 st.error("No hay ingredientes en la base. Crea uno primero.")
             else:
@@ -2513,6 +2984,7 @@ def mostrar_ingredientes_cliente(id_cliente, nombre_cliente):
                     }
                     
                     if utils.agregar_fila(config.ARCHIVO_OPERACIONES, "INGREDIENTES_MAESTRO", nuevo_ing):
+                        historico_precios.registrar_precio(nuevo_id, precio_mercado, 'Alta')
                         st.success(f"✅ '{nombre_ing}' creado en Base Maestro")
                         st.info("Ahora puedes asignarlo a clientes con sus precios específicos")
                         st.session_state.crear_ingrediente_base = False
@@ -2572,33 +3044,36 @@ def mostrar_ingredientes_cliente(id_cliente, nombre_cliente):
                 st.write("")
                 if st.button("🔄 Actualizar", use_container_width=True, key="btn_actualizar_precio"):
                     if nuevo_precio > 0:
-                        # Actualizar en PRECIOS_POR_CLIENTE
-                        df_precios_actualizado = df_precios_todos.copy()
-                        mascara = (df_precios_actualizado['ID Cliente'] == id_cliente) & \
-                                 (df_precios_actualizado['ID Ingrediente'] == id_ing_act)
-                        
-                        precio_mercado_ref = df_precios_actualizado.loc[mascara, 'Precio Mercado Referencia'].values[0]
-                        nueva_desv = ((nuevo_precio - precio_mercado_ref) / precio_mercado_ref * 100) if precio_mercado_ref > 0 else 0
-                        
-                        df_precios_actualizado.loc[mascara, 'Precio Cliente'] = nuevo_precio
-                        df_precios_actualizado.loc[mascara, 'Desviación %'] = nueva_desv
-                        df_precios_actualizado.loc[mascara, 'Última Actualización'] = datetime.now().date()
+                        # Actualizar en PRECIOS_POR_CLIENTE (hoja completa, leída y escrita bajo el lock)
+                        with utils.lock_escritura(config.ARCHIVO_OPERACIONES):
+                            df_precios_actualizado = utils.leer_excel(config.ARCHIVO_OPERACIONES, "PRECIOS_POR_CLIENTE")
+                            mascara = (df_precios_actualizado['ID Cliente'] == id_cliente) & \
+                                     (df_precios_actualizado['ID Ingrediente'] == id_ing_act)
+                            
+                            precio_mercado_ref = df_precios_actualizado.loc[mascara, 'Precio Mercado Referencia'].values[0]
+                            nueva_desv = ((nuevo_precio - precio_mercado_ref) / precio_mercado_ref * 100) if precio_mercado_ref > 0 else 0
+                            
+                            df_precios_actualizado.loc[mascara, 'Precio Cliente'] = nuevo_precio
+                            df_precios_actualizado.loc[mascara, 'Desviación %'] = nueva_desv
+                            df_precios_actualizado.loc[mascara, 'Última Actualización'] = datetime.now().date()
+                            
+                            guardado = utils.escribir_excel(config.ARCHIVO_OPERACIONES, "PRECIOS_POR_CLIENTE",
+                                                            df_precios_actualizado)
                         
-                        if utils.escribir_excel(config.ARCHIVO_OPERACIONES, "PRECIOS_POR_CLIENTE", df_precios_actualizado):
+                        if guardado:
                             st.success(f"✅ Precio actualizado a {nuevo_precio:.2f}€")
                             
-                            # Recalcular escandallos
-                            st.info("♻️ Recalculando escandallos de este cliente...")
-                            utils.recalcular_costes_platos(utils.leer_excel(config.ARCHIVO_OPERACIONES, "ESCANDALLOS"))
+                            # Recalcular escandallos (en segundo plano)
+                            st.info("♻️ Recalculando escandallos en segundo plano...")
+                            planificador.encolar('recalcular_costes', origen='Guardado')
                             
                             time.sleep(1)
                             st.rerun()
         
         # Tabla de ingredientes
-        st.dataframe(
+        tabla_paginada(
             df_precios_cliente,
-            use_container_width=True,
-            hide_index=True,
+            key="tabla_precios_cliente",
             column_config={
                 "Precio Cliente": st.column_config.NumberColumn("Precio Cliente", format="%.2f €"),
                 "Precio Mercado Referencia": st.column_config.NumberColumn("Ref. Mercado", format="%.2f €"),
@@ -2608,20 +3083,59 @@ def mostrar_ingredientes_cliente(id_cliente, nombre_cliente):
         
     else:
         st.info(f"📊 {nombre_cliente} no tiene ingredientes asignados. Usa el botón '➕ Asignar Ingrediente' arriba.")
+    
+    # Precio de mercado de referencia (compartido por todos los clientes)
+    df_ing_maestro = cargar_hoja_operaciones("INGREDIENTES_MAESTRO")
+    if not df_ing_maestro.empty:
+        mostrar_historico_precio(df_ing_maestro)
+
 def mostrar_compras():
-    """Vista de compras de clientes"""
-    st.subheader("💰 Registro de Compras")
+    """Analítica de compras de todos los clientes: gasto por dimensión y precio pagado frente a mercado"""
+    st.subheader("💰 Analítica de Compras")
     
-    df_comp = utils.leer_excel(config.ARCHIVO_OPERACIONES, "COMPRAS_CLIENTE")
+    analitica = analisis_compras.obtener_analitica()
+    serie = analitica.serie_semanal()
     
-    if not df_comp.empty:
-        st.dataframe(
-            df_comp,
-            use_container_width=True,
-            hide_index=True
-        )
-    else:
+    if serie.empty:
         st.info("No hay compras registradas")
+        return
+    
+    ultima = serie.iloc[-1]
+    larga = max(analisis_compras.VENTANAS_SEMANAS)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("🛒 Gasto 4 semanas", utils.formatear_moneda(ultima['Gasto 4 sem']))
+    with col2:
+        st.metric(f"🛒 Gasto {larga} semanas", utils.formatear_moneda(ultima[f'Gasto {larga} sem']))
+    with col3:
+        st.metric("💸 Ahorro potencial acumulado", utils.formatear_moneda(ultima['Ahorro Potencial Acumulado']))
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("**📊 Gasto semanal y ventanas móviles**")
+        st.line_chart(serie[['Gasto'] + [f"Gasto {v} sem" for v in analisis_compras.VENTANAS_SEMANAS]])
+    with col2:
+        st.write("**💸 Ahorro potencial acumulado**")
+        st.area_chart(serie['Ahorro Potencial Acumulado'])
+    
+    # Gasto por dimensión en las ventanas móviles
+    st.markdown("---")
+    dimension = st.radio("Agrupar gasto por", list(analisis_compras.DIMENSIONES), horizontal=True,
+                         key="compras_dimension")
+    tabla_paginada(analitica.gasto_por(dimension), key="compras_gasto", column_config={
+        c: st.column_config.NumberColumn(c, format="%.2f €")
+        for c in [f"Gasto {v} sem" for v in analisis_compras.VENTANAS_SEMANAS] + [f"Ahorro Potencial {larga} sem"]
+    })
+    
+    # Precio pagado frente al de mercado en el tiempo
+    st.markdown("---")
+    st.write("**📈 Precio pagado vs mercado**")
+    ingredientes = analitica.ingredientes()
+    if ingredientes:
+        opciones = sorted(ingredientes, key=lambda i: str(ingredientes[i]))
+        id_ing = st.selectbox("Ingrediente", opciones, format_func=lambda i: f"{i} - {ingredientes[i]}",
+                              key="compras_ingrediente")
+        st.line_chart(analitica.precio_vs_mercado(id_ing))
 
 # ============================================================================
 # MÓDULO: PROVEEDORES
@@ -2631,19 +3145,161 @@ def modulo_proveedores():
     """Módulo de gestión de proveedores"""
     st.markdown('<h1 class="main-header">🏢 Gestión de Proveedores</h1>', unsafe_allow_html=True)
     
-    tab1, tab2 = st.tabs(["📋 Listado", "📊 Comparativa"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📋 Listado", "📊 Comparativa", "🧺 Cesta Óptima", "💰 Compras"])
     
     with tab1:
         df_prov = utils.leer_excel(config.ARCHIVO_PROVEEDORES, "PROVEEDORES")
         
         if not df_prov.empty:
-            st.dataframe(df_prov, use_container_width=True, hide_index=True)
+            tabla_paginada(df_prov, key="tabla_proveedores")
         else:
             st.info("No hay proveedores registrados")
     
     with tab2:
-        st.subheader("📊 Comparativa de Precios")
-        st.info("Funcionalidad en desarrollo")
+        mostrar_comparativa_proveedores()
+    
+    with tab3:
+        mostrar_cesta_optima()
+    
+    with tab4:
+        mostrar_compras()
+
+def mostrar_comparativa_proveedores():
+    """Comparativa de precios por ingrediente y proveedor y sobrecoste por cliente"""
+    st.subheader("📊 Comparativa de Precios")
+    
+    comparativa = proveedores.comparativa_precios()
+    ingredientes = comparativa.ingredientes()
+    
+    if not ingredientes:
+        st.info("No hay precios de clientes ni compras registradas para comparar")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("🥕 Ingredientes comparados", len(ingredientes))
+    with col2:
+        st.metric("🏢 Proveedores", comparativa.estadisticas['Proveedor'].nunique())
+    with col3:
+        st.metric("💸 Ahorro potencial en compras",
+                  utils.formatear_moneda(comparativa.sobrecoste_por_cliente['Ahorro Potencial'].clip(lower=0).sum()))
+    
+    # Proveedor más barato por ingrediente
+    st.write("**🔎 Mejor proveedor por ingrediente**")
+    opciones = sorted(ingredientes, key=lambda i: str(ingredientes[i]))
+    id_ing = st.selectbox("Ingrediente", opciones, format_func=lambda i: f"{i} - {ingredientes[i]}",
+                          key="comparativa_ingrediente")
+    
+    mas_barato = comparativa.proveedor_mas_barato(id_ing)
+    mejor = comparativa.mejor_precio.loc[id_ing]
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("🏆 Más barato (mediana)", mas_barato['proveedor'],
+                  delta=f"{mas_barato['mediana']:.2f}€ · {mas_barato['observaciones']} precios", delta_color="off")
+    with col2:
+        st.metric("📉 Mejor precio observado", f"{mejor['Mejor Precio']:.2f}€",
+                  delta=mejor['Proveedor Mejor Precio'], delta_color="off")
+    
+    st.dataframe(
+        comparativa.proveedores_ingrediente(id_ing).drop(columns=['ID Ingrediente', 'Ingrediente']),
+        use_container_width=True, hide_index=True,
+        column_config={c: st.column_config.NumberColumn(c, format="%.2f €")
+                       for c in ['Mínimo', 'Mediana'] + [f"P{p}" for p in proveedores.PERCENTILES]}
+    )
+    
+    with st.expander("📋 Mediana de precio por ingrediente y proveedor"):
+        matriz = comparativa.matriz_medianas()
+        st.dataframe(matriz.style.highlight_min(axis=1, color="#c8e6c9").format("{:.2f}", na_rep="-"),
+                     use_container_width=True)
+    
+    # Sobrecoste de cada cliente frente al mejor precio observado
+    st.markdown("---")
+    st.write("**💸 Sobrecoste por cliente**")
+    st.caption("Precio acordado frente al mejor precio observado; el ahorro potencial se calcula sobre las compras registradas")
+    
+    por_cliente = comparativa.sobrecoste_por_cliente
+    tabla_paginada(por_cliente, key="comparativa_clientes", column_config={
+        'Ahorro Potencial': st.column_config.NumberColumn("Ahorro Potencial", format="%.2f €")
+    })
+    
+    clientes = por_cliente.dropna(subset=['ID Cliente'])
+    if not clientes.empty:
+        nombres = dict(zip(clientes['ID Cliente'], clientes['Nombre Cliente']))
+        id_cliente = st.selectbox("Detalle del cliente", list(nombres),
+                                  format_func=lambda c: f"{c} - {nombres[c]}", key="comparativa_cliente")
+        detalle = comparativa.sobrecoste_cliente(id_cliente)
+        if not detalle.empty:
+            st.dataframe(detalle.drop(columns=['ID Cliente', 'Nombre Cliente']),
+                         use_container_width=True, hide_index=True)
+        else:
+            st.info("Este cliente no tiene precios acordados registrados")
+
+def mostrar_cesta_optima():
+    """Reparto más barato de los ingredientes de un cliente entre proveedores"""
+    st.subheader("🧺 Cesta Óptima de Proveedores")
+    st.caption("Necesidades mensuales = cantidad del escandallo × ventas/mes de cada plato; precios = mediana observada por proveedor")
+    
+    opciones = opciones_clientes_activos()
+    
+    if not opciones:
+        st.info("No hay clientes activos")
+        return
+    
+    n_proveedores = max(1, proveedores.comparativa_precios().estadisticas['Proveedor'].nunique())
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        cliente = st.selectbox("Cliente", opciones, key="cesta_cliente")
+    with col2:
+        max_proveedores = st.number_input("Máx. proveedores", min_value=1, max_value=n_proveedores,
+                                          value=n_proveedores, key="cesta_max_proveedores")
+    with col3:
+        pedido_minimo = st.number_input("Pedido mínimo/mes (€)", min_value=0.0, step=50.0,
+                                        key="cesta_pedido_minimo")
+    
+    id_cliente = int(cliente.split(" - ")[0])
+    resultado = optimizador.cesta_optima_cliente(
+        id_cliente,
+        cargar_hoja_operaciones("CARTA_CLIENTES"),
+        cargar_hoja_operaciones("ESCANDALLOS"),
+        cargar_hoja_operaciones("PRECIOS_POR_CLIENTE"),
+        max_proveedores=int(max_proveedores),
+        pedido_minimo=pedido_minimo
+    )
+    
+    if resultado['metodo'] is None:
+        if resultado['sin_precio'].empty:
+            st.info("El cliente no tiene platos activos con escandallo y ventas/mes")
+        else:
+            st.info("No hay precios observados de proveedores para los ingredientes de este cliente")
+        return
+    if not resultado['factible']:
+        st.warning("⚠️ No hay ninguna combinación de proveedores que cumpla el pedido mínimo")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("💰 Coste Actual/Mes", utils.formatear_moneda(resultado['coste_actual']))
+    with col2:
+        st.metric("🎯 Coste Óptimo/Mes", utils.formatear_moneda(resultado['coste_optimo']))
+    with col3:
+        st.metric("💸 Ahorro/Mes", utils.formatear_moneda(resultado['ahorro']))
+    with col4:
+        st.metric("⚙️ Método", resultado['metodo'])
+    
+    if not resultado['sin_cubrir'].empty:
+        st.warning(f"⚠️ {len(resultado['sin_cubrir'])} ingredientes no los sirve ningún proveedor elegido "
+                   "(se mantienen con el proveedor actual)")
+    if not resultado['sin_precio'].empty:
+        st.caption(f"Sin precios observados: {', '.join(resultado['sin_precio']['Ingrediente'].astype(str))}")
+    
+    st.write("**🏢 Pedido por proveedor**")
+    st.dataframe(resultado['por_proveedor'], use_container_width=True, hide_index=True,
+                 column_config={"Gasto": st.column_config.NumberColumn("Gasto/Mes", format="%.2f €")})
+    
+    st.write("**📋 Detalle por ingrediente**")
+    moneda = {c: st.column_config.NumberColumn(c, format="%.2f €")
+              for c in ['Precio Actual', 'Coste Actual', 'Precio Recomendado', 'Coste Recomendado', 'Ahorro']}
+    st.dataframe(resultado['detalle'], use_container_width=True, hide_index=True, column_config=moneda)
 
 # ============================================================================
 # MÓDULO: EMPRESA
@@ -2653,32 +3309,251 @@ def modulo_empresa():
     """Módulo de backoffice y empresa"""
     st.markdown('<h1 class="main-header">💼 Gestión Empresarial</h1>', unsafe_allow_html=True)
     
-    tab1, tab2, tab3 = st.tabs(["📊 KPIs", "💰 Facturación", "📉 Gastos"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 KPIs", "💰 Facturación", "📉 Gastos", "👥 Cohortes", "📑 Informes"])
     
     with tab1:
-        df_kpis = utils.leer_excel(config.ARCHIVO_EMPRESA, "KPIS_MENSUALES")
+        # KPIs calculados a partir de clientes, servicios y facturación
+        df_cubo = kpis_mensuales.obtener_kpis_mensuales()
         
-        if not df_kpis.empty:
-            st.dataframe(df_kpis, use_container_width=True, hide_index=True)
+        if not df_cubo.empty:
+            actual = df_cubo.iloc[-1]
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("💰 MRR", utils.formatear_moneda(actual['MRR']),
+                          delta=utils.formatear_moneda(actual['MRR Nuevo'] - actual['MRR Perdido']))
+            with col2:
+                st.metric("✅ Clientes Activos", int(actual['Clientes Activos']),
+                          delta=int(actual['Altas'] - actual['Bajas']))
+            with col3:
+                st.metric("💼 Servicios del Mes", int(actual['Servicios']))
+            with col4:
+                st.metric("🧾 Facturado este Mes", utils.formatear_moneda(actual['Facturación']))
+            
+            meses = st.slider("Meses a mostrar", min_value=3, max_value=max(3, len(df_cubo)),
+                              value=min(12, max(3, len(df_cubo))), key="kpis_meses")
+            df_periodo = df_cubo.tail(meses)
+            df_periodo.index = df_periodo.index.astype(str)
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write("**📈 Evolución del MRR**")
+                st.line_chart(df_periodo['MRR'])
+            with col2:
+                st.write("**🔁 MRR Nuevo vs Perdido**")
+                st.bar_chart(df_periodo[['MRR Nuevo', 'MRR Perdido']])
+            
+            st.dataframe(df_periodo.iloc[::-1], use_container_width=True)
         else:
-            st.info("No hay KPIs registrados")
+            st.info("No hay datos suficientes para calcular KPIs")
+        
+        # Hoja manual anterior, solo como referencia
+        with st.expander("📋 Hoja KPIS_MENSUALES (manual)"):
+            df_kpis = utils.leer_excel(config.ARCHIVO_EMPRESA, "KPIS_MENSUALES")
+            
+            if not df_kpis.empty:
+                tabla_paginada(df_kpis, key="tabla_kpis_manual")
+            else:
+                st.info("No hay KPIs registrados")
     
     with tab2:
+        mostrar_facturacion()
+    
+    with tab3:
+        mostrar_gastos()
+    
+    with tab4:
+        mostrar_cohortes()
+    
+    with tab5:
+        mostrar_informes_clientes()
+
+def mostrar_facturacion():
+    """Cuenta de resultados por periodo con desglose por cliente y tipo de servicio"""
+    cuenta = cuenta_resultados.obtener_cuenta_resultados()
+    
+    if not len(cuenta.meses):
+        st.info("No hay facturas ni gastos registrados")
+    else:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            periodo = st.radio("Periodo", list(cuenta_resultados.PERIODOS), horizontal=True, key="pyg_periodo")
+        with col2:
+            cliente = st.selectbox("Cliente", ["Todos"] + cuenta.clientes(), key="pyg_cliente")
+        with col3:
+            servicio = st.selectbox("Tipo de servicio", ["Todos"] + cuenta.servicios(), key="pyg_servicio")
+        
+        cliente = None if cliente == "Todos" else cliente
+        servicio = None if servicio == "Todos" else servicio
+        resumen = cuenta.resumen(periodo, cliente, servicio)
+        actual = resumen.iloc[-1]
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric(f"💰 Ingresos ({resumen.index[-1]})", utils.formatear_moneda(actual['Ingresos']))
+        if 'Margen' in resumen.columns:
+            with col2:
+                st.metric("📈 Margen", utils.formatear_moneda(actual['Margen']),
+                          delta=f"{actual['Margen %']:.1f}%" if pd.notna(actual['Margen %']) else None)
+            with col3:
+                st.metric("🏦 Caja acumulada", utils.formatear_moneda(actual['Caja Acumulada']))
+        with col4:
+            st.metric("⏳ Pendiente de cobro", utils.formatear_moneda(cuenta.pendiente_cobro(cliente, servicio)))
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if 'Gastos' in resumen.columns:
+                st.write("**📊 Ingresos vs Gastos**")
+                st.bar_chart(resumen[['Ingresos', 'Gastos']], stack=False)
+            else:
+                st.write("**📊 Ingresos**")
+                st.bar_chart(resumen['Ingresos'])
+        with col2:
+            if 'Caja Acumulada' in resumen.columns:
+                st.write("**🏦 Posición de caja**")
+                st.line_chart(resumen[['Flujo de Caja', 'Caja Acumulada']])
+            else:
+                st.write("**🏦 Cobros**")
+                st.line_chart(resumen['Cobros'])
+        
+        st.dataframe(resumen.iloc[::-1], use_container_width=True)
+        
+        # Desglose de ingresos
+        st.markdown("---")
+        dimension = st.radio("Desglosar ingresos por", ["Cliente", "Servicio"], horizontal=True,
+                             key="pyg_dimension")
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            desglose = cuenta.ingresos_por(dimension, periodo, cliente, servicio)
+            if not desglose.empty:
+                st.bar_chart(desglose.iloc[:, :10])
+        with col2:
+            st.dataframe(cuenta.ranking(dimension, cliente=cliente, servicio=servicio),
+                         use_container_width=True, hide_index=True)
+    
+    with st.expander("📋 Hoja FACTURACION"):
         df_fact = utils.leer_excel(config.ARCHIVO_EMPRESA, "FACTURACION")
         
         if not df_fact.empty:
-            st.dataframe(df_fact, use_container_width=True, hide_index=True)
+            tabla_paginada(df_fact, key="tabla_facturacion")
         else:
             st.info("No hay facturas registradas")
+
+def mostrar_gastos():
+    """Gastos por categoría y periodo"""
+    cuenta = cuenta_resultados.obtener_cuenta_resultados()
+    por_categoria = cuenta.gastos_por_categoria(
+        st.radio("Periodo", list(cuenta_resultados.PERIODOS), horizontal=True, key="gastos_periodo"))
+    
+    if not por_categoria.empty:
+        totales = por_categoria.sum().sort_values(ascending=False)
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            st.write("**📉 Gastos por categoría**")
+            st.bar_chart(por_categoria)
+        with col2:
+            st.write("**🗂️ Total por categoría**")
+            st.dataframe(pd.DataFrame({'Gastos': totales, '% del Total': (totales / totales.sum() * 100).round(1)}),
+                         use_container_width=True)
+        
+        st.dataframe(por_categoria.iloc[::-1], use_container_width=True)
     
-    with tab3:
+    with st.expander("📋 Hoja GASTOS"):
         df_gastos = utils.leer_excel(config.ARCHIVO_EMPRESA, "GASTOS")
         
         if not df_gastos.empty:
-            st.dataframe(df_gastos, use_container_width=True, hide_index=True)
+            tabla_paginada(df_gastos, key="tabla_gastos")
         else:
             st.info("No hay gastos registrados")
 
+def mostrar_informes_clientes():
+    """Generación del pack mensual de revisión (Excel/PDF) de los clientes activos"""
+    st.subheader("📑 Informes Mensuales por Cliente")
+    st.caption("Carta con márgenes, escandallos, desviaciones de precio y alertas de cada cliente")
+    
+    opciones = opciones_clientes_activos()
+    
+    if not opciones:
+        st.info("No hay clientes activos")
+        return
+    
+    seleccion = st.multiselect("Clientes (vacío = todos los activos)", opciones, key="informes_clientes")
+    col1, col2 = st.columns(2)
+    with col1:
+        con_pdf = st.checkbox("📄 Generar también PDF", key="informes_pdf", disabled=not informes.pdf_disponible(),
+                              help=None if informes.pdf_disponible() else "Requiere matplotlib")
+    with col2:
+        generar = st.button(f"⚙️ Generar {len(seleccion) or len(opciones)} informes", type="primary",
+                            use_container_width=True, key="informes_generar")
+    
+    if generar:
+        ids = [int(o.split(" - ")[0]) for o in seleccion] or None
+        barra = st.progress(0.0, text="Generando informes...")
+        resultado = informes.generar_informes(
+            ids, pdf=con_pdf, progreso=lambda hechos, total: barra.progress(hechos / total, text=f"{hechos}/{total} clientes")
+        )
+        barra.empty()
+        st.session_state.informes_resultado = resultado
+    
+    resultado = st.session_state.get('informes_resultado')
+    if resultado is not None and not resultado.empty:
+        errores = resultado['Error'].notna()
+        if errores.any():
+            st.error(f"❌ {errores.sum()} informes con errores")
+        if (~errores).any():
+            st.success(f"✅ {(~errores).sum()} informes en {os.path.dirname(resultado['Excel'].dropna().iloc[0])}")
+        
+        st.dataframe(resultado.drop(columns=['Excel', 'PDF']), use_container_width=True, hide_index=True)
+        archivos = resultado['Excel'].dropna().tolist() + resultado['PDF'].dropna().tolist()
+        if archivos:
+            st.download_button(
+                "⬇️ Descargar todos (ZIP)",
+                informes.comprimir_informes(archivos),
+                file_name=f"informes_{datetime.now().strftime('%Y-%m')}.zip",
+                mime="application/zip"
+            )
+
+def mostrar_cohortes():
+    """Mapa de calor de retención por cohorte mensual de alta"""
+    datos = cohortes.obtener_cohortes()
+    
+    if datos['retencion'].empty:
+        st.info("No hay clientes con Fecha Inicio para calcular cohortes")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        medida = st.radio("Retención de", ["Clientes", "MRR"], horizontal=True, key="cohortes_medida")
+    with col2:
+        total = len(datos['tamano'])
+        mostrar = st.slider("Cohortes a mostrar", min_value=1, max_value=total,
+                            value=min(24, total), key="cohortes_numero")
+    
+    matriz = datos['retencion'] if medida == "Clientes" else datos['retencion_mrr']
+    matriz = matriz.tail(mostrar)
+    matriz = matriz.loc[:, matriz.notna().any()]
+    tamano = datos['tamano'].loc[matriz.index]
+    
+    media = cohortes.retencion_media(matriz, tamano)
+    col1, col2, col3 = st.columns(3)
+    for col, mes in zip([col1, col2, col3], [3, 6, 12]):
+        with col:
+            valor = media.get(mes)
+            st.metric(f"Retención a {mes} meses", f"{valor:.1f}%" if pd.notna(valor) else "-")
+    
+    etiquetas = [f"{c} ({n})" for c, n in tamano.items()]
+    fig = px.imshow(
+        matriz.to_numpy(), x=[str(m) for m in matriz.columns], y=etiquetas,
+        color_continuous_scale="Blues", zmin=0, zmax=100, aspect="auto",
+        labels={'x': "Meses desde el alta", 'y': "Cohorte (clientes)", 'color': "% retenido"}
+    )
+    fig.update_layout(height=max(300, 22 * len(matriz) + 120), margin=dict(l=10, r=10, t=10, b=10))
+    st.plotly_chart(fig, use_container_width=True)
+    
+    with st.expander("📋 Tabla de cohortes"):
+        tabla = matriz.copy()
+        tabla.insert(0, 'Clientes', tamano)
+        st.dataframe(tabla.iloc[::-1], use_container_width=True)
+
 # ============================================================================
 # MÓDULO: CONFIGURACIÓN
 # ============================================================================
@@ -2702,6 +3577,87 @@ def modulo_configuracion():
         st.error("❌ Archivos faltantes:")
         for archivo in archivos_faltantes:
             st.write(archivo)
+        return
+    
+    st.markdown("---")
+    
+    st.subheader("💾 Motor de Escritura Excel")
+    st.write(f"Los libros se guardan con **{utils.motor_escritura()}** "
+             f"(configurado: `{config.MOTOR_ESCRITURA_EXCEL}`).")
+    
+    archivos = {"CRM": config.ARCHIVO_CRM, "Operaciones": config.ARCHIVO_OPERACIONES,
+                "Proveedores": config.ARCHIVO_PROVEEDORES, "Empresa": config.ARCHIVO_EMPRESA}
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        libro = st.selectbox("Libro a medir", list(archivos), index=1, key="motor_libro")
+    with col2:
+        st.write("")
+        medir = st.button("⏱️ Comparar motores", use_container_width=True, key="motor_medir")
+    
+    if medir:
+        with st.spinner("Reescribiendo una copia del libro con cada motor..."):
+            st.dataframe(utils.medir_motores_escritura(archivos[libro], repeticiones=2),
+                         use_container_width=True, hide_index=True)
+    
+    st.markdown("---")
+    
+    st.subheader("⏱️ Tareas en Segundo Plano")
+    mostrar_tareas_planificador()
+    
+    st.markdown("---")
+    
+    st.subheader("🩺 Calidad de Datos del CRM")
+    st.write("Revisa emails, teléfonos, CIF y códigos postales de leads y clientes.")
+    
+    if st.button("🔍 Revisar datos", key="revisar_calidad_datos"):
+        for hoja, titulo in [("LEADS", "📋 Leads"), ("CLIENTES_ACTIVOS", "✅ Clientes")]:
+            df_hoja = utils.leer_excel(config.ARCHIVO_CRM, hoja)
+            df_incidencias = utils.revisar_calidad_datos(df_hoja)
+            
+            st.write(f"**{titulo}** ({len(df_hoja)} registros)")
+            if df_incidencias.empty:
+                st.success("✅ Sin incidencias")
+                continue
+            
+            resumen = df_incidencias.groupby(['Columna', 'Problema']).size().reset_index(name='Registros')
+            st.dataframe(resumen, use_container_width=True, hide_index=True)
+            with st.expander(f"Ver las {len(df_incidencias)} incidencias"):
+                tabla_paginada(df_incidencias, key="tabla_incidencias")
+
+def mostrar_tareas_planificador():
+    """Estado de la cola de recálculos y lanzamiento manual de tareas"""
+    st.write("Los recálculos de costes, alertas y KPIs se ejecutan en segundo plano al guardar "
+             "o cuando cambian los Excel; cada noche se reconstruye todo desde cero.")
+    
+    resumen = planificador.resumen()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Pendientes", resumen['pendientes'])
+    col2.metric("En curso", resumen['en_curso'])
+    col3.metric("Con error", resumen['errores'])
+    proxima = resumen['proxima_reconstruccion']
+    col4.metric("Reconstrucción nocturna", proxima.strftime('%d/%m %H:%M') if proxima else "-")
+    
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        tipo = st.selectbox("Tarea", list(planificador.TAREAS),
+                            format_func=lambda t: planificador.TAREAS[t][0], key="planificador_tarea")
+    with col2:
+        st.write("")
+        if st.button("▶️ Encolar", use_container_width=True, key="planificador_encolar"):
+            tarea = planificador.encolar(tipo)
+            if tarea['solicitudes'] > 1:
+                st.info(f"Ya había una igual pendiente (#{tarea['id']})")
+            else:
+                st.success(f"✅ Tarea #{tarea['id']} encolada")
+    with col3:
+        st.write("")
+        st.button("🔄 Actualizar estado", use_container_width=True, key="planificador_actualizar")
+    
+    df_tareas = planificador.estado_tareas()
+    if df_tareas.empty:
+        st.info("Todavía no se ha ejecutado ninguna tarea en este proceso")
+    else:
+        st.dataframe(df_tareas, use_container_width=True, hide_index=True)
 
 # ============================================================================
 # MAIN - PUNTO DE ENTRADA
@@ -2713,22 +3669,40 @@ def main():
     # Verificar sistema
     verificar_sistema()
     
-    # Mostrar sidebar y obtener módulo seleccionado
-    modulo = mostrar_sidebar()
-    
-    # Renderizar módulo seleccionado
-    if "Dashboard" in modulo:
-        modulo_dashboard()
-    elif "CRM" in modulo:
-        modulo_crm()
-    elif "Escandallos" in modulo:
-        modulo_escandallos()
-    elif "Proveedores" in modulo:
-        modulo_proveedores()
-    elif "Empresa" in modulo:
-        modulo_empresa()
-    elif "Configuración" in modulo:
-        modulo_configuracion()
+    # Recálculos en segundo plano (se arranca una sola vez por proceso)
+    planificador.iniciar()
+    
+    # Contexto de datos del rerun: cada hoja se lee como mucho una vez
+    contexto = contexto_datos.iniciar_contexto()
+    
+    try:
+        # Mostrar sidebar y obtener módulo seleccionado
+        modulo = mostrar_sidebar()
+        
+        # Renderizar módulo seleccionado
+        if "Dashboard" in modulo:
+            modulo_dashboard()
+        elif "CRM" in modulo:
+            modulo_crm()
+        elif "Escandallos" in modulo:
+            modulo_escandallos()
+        elif "Proveedores" in modulo:
+            modulo_proveedores()
+        elif "Empresa" in modulo:
+            modulo_empresa()
+        elif "Configuración" in modulo:
+            modulo_configuracion()
+    finally:
+        contexto_datos.finalizar_contexto()
+    
+    # Instrumentación del contexto de datos
+    estadisticas = contexto.estadisticas()
+    print(f"[DEBUG] 📦 Rerun: {estadisticas['lecturas']} lecturas de hojas, "
+          f"{estadisticas['lecturas_evitadas']} evitadas, "
+          f"{estadisticas['indices_reutilizados']} índices reutilizados")
+    with st.sidebar:
+        st.caption(f"**Lecturas Excel:** {estadisticas['lecturas']} "
+                   f"(evitadas: {estadisticas['lecturas_evitadas']})")
 
 if __name__ == "__main__":
     main()
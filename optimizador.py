@@ -0,0 +1,257 @@
+"""
+OPTIMIZADOR.PY - Cesta Óptima de Proveedores
+Asigna cada ingrediente de un cliente al proveedor más barato respetando
+un máximo de proveedores y un pedido mínimo por proveedor
+"""
+
+from itertools import combinations
+from math import comb
+import numpy as np
+import pandas as pd
+import proveedores
+
+# Nº máximo de combinaciones de proveedores que se prueban todas (método exacto)
+MAXIMO_COMBINACIONES_EXACTO = 5000
+
+# ============================================================================
+# DATOS DE ENTRADA
+# ============================================================================
+
+def necesidades_cliente(id_cliente, df_carta, df_escandallos, df_precios_cliente=None):
+    """
+    Cantidad mensual de cada ingrediente que consume un cliente
+
+    Cantidad del escandallo × Ventas/Mes de cada plato activo, sumada por
+    ingrediente. El proveedor y precio actuales salen de PRECIOS_POR_CLIENTE
+    (o del Proveedor Actual del escandallo si el cliente no tiene precio).
+
+    Returns:
+        DataFrame con ID Ingrediente, Ingrediente, Cantidad Mes, Proveedor Actual y Precio Actual
+    """
+    columnas = ['ID Ingrediente', 'Ingrediente', 'Cantidad Mes', 'Proveedor Actual', 'Precio Actual']
+    if df_carta.empty or df_escandallos.empty or 'ID Plato' not in df_carta.columns:
+        return pd.DataFrame(columns=columnas)
+
+    platos = df_carta[df_carta['ID Cliente'] == id_cliente]
+    if 'Activo' in platos.columns:
+        platos = platos[platos['Activo'].fillna('Sí') != 'No']
+    ventas = pd.to_numeric(platos.set_index('ID Plato')['Ventas/Mes'], errors='coerce').fillna(0) \
+        if 'Ventas/Mes' in platos.columns else pd.Series(1.0, index=platos['ID Plato'])
+    ventas = ventas[~ventas.index.duplicated()]
+
+    lineas = df_escandallos[df_escandallos['ID Plato'].isin(ventas.index)]
+    if lineas.empty:
+        return pd.DataFrame(columns=columnas)
+
+    cantidad = pd.to_numeric(lineas['Cantidad'], errors='coerce').fillna(0) * lineas['ID Plato'].map(ventas)
+    agrupado = lineas.assign(**{'Cantidad Mes': cantidad}).groupby('ID Ingrediente')
+    necesidades = pd.DataFrame({
+        'Ingrediente': agrupado['Nombre Ingrediente'].first() if 'Nombre Ingrediente' in lineas.columns else '',
+        'Cantidad Mes': agrupado['Cantidad Mes'].sum(),
+        'Proveedor Actual': agrupado['Proveedor Actual'].agg(
+            lambda p: p.mode().iat[0] if not p.mode().empty else None) if 'Proveedor Actual' in lineas.columns else None,
+        'Precio Actual': np.nan
+    })
+
+    # Precio acordado del cliente (y su proveedor) si existe
+    if df_precios_cliente is not None and not df_precios_cliente.empty:
+        acordados = df_precios_cliente[df_precios_cliente['ID Cliente'] == id_cliente] \
+            .drop_duplicates('ID Ingrediente', keep='last').set_index('ID Ingrediente')
+        comunes = necesidades.index.intersection(acordados.index)
+        necesidades.loc[comunes, 'Precio Actual'] = pd.to_numeric(acordados.loc[comunes, 'Precio Cliente'], errors='coerce')
+        if 'Proveedor' in acordados.columns:
+            proveedor = acordados.loc[comunes, 'Proveedor']
+            necesidades.loc[comunes, 'Proveedor Actual'] = proveedor.where(proveedor.notna() & (proveedor != ''),
+                                                                           necesidades.loc[comunes, 'Proveedor Actual'])
+
+    necesidades = necesidades[necesidades['Cantidad Mes'] > 0]
+    return necesidades.reset_index()[columnas]
+
+def matriz_precios(comparativa, ids_ingredientes, columna='Mediana'):
+    """Precio ingrediente × proveedor (NaN si el proveedor no lo sirve) para los ingredientes dados"""
+    estadisticas = comparativa.estadisticas
+    estadisticas = estadisticas[estadisticas['ID Ingrediente'].isin(ids_ingredientes)]
+    if estadisticas.empty:
+        return pd.DataFrame(index=pd.Index(ids_ingredientes, name='ID Ingrediente'))
+    matriz = estadisticas.pivot_table(index='ID Ingrediente', columns='Proveedor', values=columna, aggfunc='first')
+    return matriz.reindex(ids_ingredientes)
+
+# ============================================================================
+# SOLVER
+# ============================================================================
+
+def _asignar(costes, columnas):
+    """Proveedor más barato (posición en columnas) por ingrediente y su coste (inf si ninguno lo sirve)"""
+    sub = costes[:, columnas]
+    eleccion = np.argmin(sub, axis=1)
+    return np.asarray(columnas)[eleccion], sub[np.arange(len(sub)), eleccion]
+
+def _gasto(asignacion, coste, n_proveedores):
+    cubiertos = np.isfinite(coste)
+    gasto = np.bincount(asignacion[cubiertos], weights=coste[cubiertos], minlength=n_proveedores)
+    usados = np.bincount(asignacion[cubiertos], minlength=n_proveedores) > 0
+    return gasto, usados
+
+def _resolver_conjunto(costes, columnas, minimos):
+    """
+    Asignación con un conjunto fijo de proveedores
+
+    Cada ingrediente va al más barato del conjunto; si un proveedor usado no
+    llega a su pedido mínimo se le pasan los ingredientes que menos encarecen
+    la cesta por euro trasladado.
+
+    Returns:
+        tuple (cumple mínimos, nº ingredientes sin proveedor, coste total, asignación, coste por ingrediente)
+    """
+    asignacion, coste = _asignar(costes, columnas)
+    gasto, usados = _gasto(asignacion, coste, costes.shape[1])
+
+    for proveedor in np.where(usados & (gasto < minimos - 1e-9))[0]:
+        deficit = minimos[proveedor] - gasto[proveedor]
+        candidatos = np.where(np.isfinite(costes[:, proveedor]) & (asignacion != proveedor))[0]
+        extra = (costes[candidatos, proveedor] - coste[candidatos]) / costes[candidatos, proveedor]
+        for i in candidatos[np.argsort(extra, kind='stable')]:
+            if deficit <= 1e-9:
+                break
+            asignacion[i], coste[i] = proveedor, costes[i, proveedor]
+            deficit -= coste[i]
+
+    gasto, usados = _gasto(asignacion, coste, costes.shape[1])
+    cumple = bool(np.all(gasto[usados] >= minimos[usados] - 1e-9))
+    cubiertos = np.isfinite(coste)
+    return cumple, int((~cubiertos).sum()), float(coste[cubiertos].sum()), asignacion, coste
+
+def _mejor(solucion, candidata):
+    """Primero cumplir mínimos, luego cubrir más ingredientes, luego menor coste"""
+    if candidata is None:
+        return solucion
+    if solucion is None:
+        return candidata
+    clave = lambda s: (not s[0], s[1], s[2])
+    return candidata if clave(candidata) < clave(solucion) else solucion
+
+def _tamanos(max_proveedores, minimos):
+    """Tamaños de conjunto a probar: sin pedidos mínimos, añadir proveedores nunca encarece"""
+    return [max_proveedores] if not minimos.any() else range(1, max_proveedores + 1)
+
+def _exacto(costes, max_proveedores, minimos):
+    """Prueba todos los conjuntos de hasta max_proveedores proveedores"""
+    mejor = None
+    for tamano in _tamanos(max_proveedores, minimos):
+        for columnas in combinations(range(costes.shape[1]), tamano):
+            mejor = _mejor(mejor, _resolver_conjunto(costes, list(columnas), minimos))
+    return mejor
+
+def _voraz(costes, max_proveedores, minimos):
+    """
+    Parte de todos los proveedores y retira, de uno en uno, el que menos
+    encarece la cesta hasta cumplir el máximo de proveedores y los mínimos
+    """
+    activos = list(np.where(np.isfinite(costes).any(axis=0))[0])
+    solucion = _resolver_conjunto(costes, activos, minimos)
+
+    while True:
+        usados = sorted(set(solucion[3][np.isfinite(solucion[4])].tolist()))
+        if (solucion[0] and len(usados) <= max_proveedores) or len(usados) <= 1:
+            return solucion
+
+        siguiente = None
+        for proveedor in usados:
+            siguiente = _mejor(siguiente, _resolver_conjunto(costes, [p for p in usados if p != proveedor], minimos))
+        solucion = siguiente
+
+def optimizar_cesta(necesidades, precios, max_proveedores=None, pedido_minimo=0.0,
+                    maximo_combinaciones=MAXIMO_COMBINACIONES_EXACTO):
+    """
+    Proveedor recomendado para cada ingrediente de la cesta
+
+    Con pocos proveedores se prueban todos los conjuntos posibles (exacto en
+    la elección de proveedores; el reparto para llegar a un pedido mínimo es
+    heurístico). Si hay demasiadas combinaciones se usa el método voraz.
+
+    Args:
+        necesidades: DataFrame de necesidades_cliente
+        precios: DataFrame ID Ingrediente × Proveedor (matriz_precios)
+        max_proveedores: Máximo de proveedores distintos (None = sin límite)
+        pedido_minimo: Gasto mensual mínimo por proveedor usado (número o dict por proveedor)
+        maximo_combinaciones: Límite de conjuntos a probar en el método exacto
+
+    Returns:
+        dict con 'detalle' (DataFrame por ingrediente), 'por_proveedor',
+        'coste_actual', 'coste_optimo', 'ahorro', 'metodo', 'sin_precio'
+        (sin precios observados), 'sin_cubrir' (ningún proveedor elegido los
+        sirve) y 'factible' (False si no hay forma de cumplir los mínimos)
+    """
+    nombres_proveedor = list(precios.columns)
+    precios = precios.reindex(necesidades['ID Ingrediente'])
+    con_precio = precios.notna().any(axis=1).to_numpy()
+    cesta = necesidades[con_precio].reset_index(drop=True)
+    sin_precio = necesidades[~con_precio]
+
+    resultado = {'detalle': pd.DataFrame(), 'por_proveedor': pd.DataFrame(), 'coste_actual': 0.0,
+                 'coste_optimo': 0.0, 'ahorro': 0.0, 'metodo': None, 'sin_precio': sin_precio,
+                 'sin_cubrir': pd.DataFrame(), 'factible': False}
+    if cesta.empty:
+        return resultado
+
+    matriz = precios.to_numpy(dtype=float)[con_precio]
+    costes = np.where(np.isnan(matriz), np.inf, matriz * cesta['Cantidad Mes'].to_numpy()[:, None])
+
+    n_proveedores = len(nombres_proveedor)
+    max_proveedores = min(max_proveedores or n_proveedores, n_proveedores)
+    if isinstance(pedido_minimo, dict):
+        minimos = np.array([float(pedido_minimo.get(p, 0) or 0) for p in nombres_proveedor])
+    else:
+        minimos = np.full(n_proveedores, float(pedido_minimo or 0))
+
+    combinaciones = sum(comb(n_proveedores, k) for k in _tamanos(max_proveedores, minimos))
+    if combinaciones <= maximo_combinaciones:
+        solucion = _exacto(costes, max_proveedores, minimos)
+        resultado['metodo'] = 'Exacto'
+    else:
+        solucion = _voraz(costes, max_proveedores, minimos)
+        resultado['metodo'] = 'Voraz'
+
+    cumple, _, total, asignacion, coste = solucion
+    if not cumple:
+        return resultado
+    cubiertos = np.isfinite(coste)
+
+    # Precio actual: el acordado o, si no hay, la mediana del proveedor actual
+    filas = np.arange(len(cesta))
+    posicion_actual = pd.Index(nombres_proveedor).get_indexer(cesta['Proveedor Actual'].fillna(''))
+    precio_proveedor_actual = np.where(posicion_actual >= 0, matriz[filas, np.maximum(posicion_actual, 0)], np.nan)
+    precio_actual = cesta['Precio Actual'].fillna(pd.Series(precio_proveedor_actual)).to_numpy(dtype=float)
+
+    cantidad = cesta['Cantidad Mes'].to_numpy()
+    detalle = cesta.assign(**{
+        'Precio Actual': precio_actual,
+        'Coste Actual': precio_actual * cantidad,
+        'Proveedor Recomendado': np.where(cubiertos, np.asarray(nombres_proveedor, dtype=object)[asignacion], None),
+        'Precio Recomendado': np.where(cubiertos, matriz[filas, asignacion], np.nan),
+        'Coste Recomendado': np.where(cubiertos, coste, np.nan)
+    })
+    detalle['Ahorro'] = detalle['Coste Actual'] - detalle['Coste Recomendado']
+    detalle = detalle.round({'Cantidad Mes': 3, 'Coste Actual': 2, 'Coste Recomendado': 2, 'Ahorro': 2})
+
+    # El ahorro se compara solo donde hay precio actual y proveedor recomendado
+    comparables = detalle['Ahorro'].notna()
+    resultado.update(
+        detalle=detalle.sort_values('Ahorro', ascending=False, kind='stable').reset_index(drop=True),
+        por_proveedor=detalle[cubiertos].groupby('Proveedor Recomendado').agg(
+            Ingredientes=('ID Ingrediente', 'count'), Gasto=('Coste Recomendado', 'sum')
+        ).sort_values('Gasto', ascending=False).reset_index(),
+        coste_actual=float(detalle.loc[comparables, 'Coste Actual'].sum()),
+        coste_optimo=float(total),
+        ahorro=float(detalle.loc[comparables, 'Ahorro'].sum()),
+        sin_cubrir=detalle[~cubiertos],
+        factible=True
+    )
+    return resultado
+
+def cesta_optima_cliente(id_cliente, df_carta, df_escandallos, df_precios_cliente,
+                         max_proveedores=None, pedido_minimo=0.0):
+    """Necesidades del cliente + precios observados (comparativa en caché) + solver"""
+    necesidades = necesidades_cliente(id_cliente, df_carta, df_escandallos, df_precios_cliente)
+    precios = matriz_precios(proveedores.comparativa_precios(), necesidades['ID Ingrediente'].tolist())
+    return optimizar_cesta(necesidades, precios, max_proveedores, pedido_minimo)
@@ -0,0 +1,305 @@
+"""
+PLANIFICADOR.PY - Tareas en Segundo Plano
+Cola de recálculos (costes, alertas, KPIs) atendida por un pool de hilos,
+sin tareas pendientes duplicadas y con reconstrucción completa nocturna
+"""
+
+import itertools
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pandas as pd
+import config
+import utils
+import contexto_datos
+import indicadores
+import kpis_mensuales
+import analisis_compras
+import cuenta_resultados
+import cohortes
+
+MAXIMO_HISTORIAL = 50  # Tareas terminadas que se conservan para consultar su estado
+
+# ============================================================================
+# TAREAS
+# ============================================================================
+
+def recalcular_costes():
+    """Coste, margen y food cost de todos los platos a partir de ESCANDALLOS"""
+    df_escandallos = utils.leer_excel(config.ARCHIVO_OPERACIONES, "ESCANDALLOS")
+    if not utils.recalcular_costes_platos(df_escandallos):
+        raise RuntimeError("No se pudo guardar CARTA_CLIENTES")
+    # La carta ha cambiado: las alertas de margen también
+    encolar('alertas', origen='Recálculo de costes')
+    return f"{df_escandallos['ID Plato'].nunique()} platos recalculados"
+
+def calcular_alertas():
+    """Alertas de precios altos y márgenes bajos (se guardan para el Dashboard)"""
+    alertas = alertas_sistema(esperar=True)
+    return f"{len(alertas['precios'])} de precio, {len(alertas['margenes'])} de margen"
+
+def derivar_kpis():
+    """Pone al día los motores de KPIs para que las vistas no esperen al abrirse"""
+    indicadores.obtener_snapshot_crm()
+    kpis_mensuales.obtener_kpis_mensuales()
+    analisis_compras.obtener_analitica()
+    cuenta_resultados.obtener_cuenta_resultados()
+    cohortes.obtener_cohortes()
+    return "Snapshot del CRM, KPIs mensuales, compras, P&G y cohortes al día"
+
+def reconstruir_todo():
+    """Olvida todas las cachés y recalcula costes, alertas y KPIs desde cero"""
+    contexto_datos.limpiar_cache()
+    kpis_mensuales.limpiar_cache()
+    analisis_compras.limpiar_cache()
+    with _lock:
+        _alertas.update(version=None)
+    recalcular_costes()
+    calcular_alertas()
+    derivar_kpis()
+    return "Reconstrucción completa"
+
+# Tipo -> (descripción, función)
+TAREAS = {
+    'recalcular_costes': ("♻️ Recalcular costes de platos", recalcular_costes),
+    'alertas': ("🚨 Detectar alertas", calcular_alertas),
+    'kpis': ("📈 Derivar KPIs", derivar_kpis),
+    'reconstruccion': ("🌙 Reconstrucción completa", reconstruir_todo)
+}
+
+# Archivo -> tareas a lanzar cuando cambia (lo detecta el vigilante)
+TAREAS_POR_ARCHIVO = {
+    config.ARCHIVO_OPERACIONES: ['alertas', 'kpis'],
+    config.ARCHIVO_CRM: ['kpis'],
+    config.ARCHIVO_EMPRESA: ['kpis']
+}
+
+# ============================================================================
+# ALERTAS Y KPIS CALCULADOS EN SEGUNDO PLANO
+# ============================================================================
+
+_alertas = {'version': None, 'valor': None}
+
+def alertas_sistema(esperar=False):
+    """
+    Alertas de precios y márgenes de la versión actual de OPERACIONES
+
+    Args:
+        esperar: Calcularlas ya si no están al día. Si es False y hay unas
+            anteriores, se devuelven esas y el recálculo se encola
+
+    Returns:
+        Dict con 'precios', 'margenes' y 'vigentes' (False si son de una versión anterior)
+    """
+    version = utils.version_archivo(config.ARCHIVO_OPERACIONES)
+    with _lock:
+        guardado = dict(_alertas)
+
+    if guardado['version'] == version:
+        return dict(guardado['valor'], vigentes=True)
+    if not esperar and guardado['valor'] is not None:
+        encolar('alertas', origen='Dashboard')
+        return dict(guardado['valor'], vigentes=False)
+
+    valor = {'precios': utils.detectar_alertas_precios(), 'margenes': utils.detectar_alertas_margenes()}
+    with _lock:
+        _alertas.update(version=version, valor=valor)
+    return dict(valor, vigentes=True)
+
+def snapshot_dashboard():
+    """
+    Snapshot de KPIs del CRM para el Dashboard sin parsear el CRM en el rerun
+
+    Si es de una versión anterior (primer arranque, Excel editado fuera de la
+    app) se encola su cálculo y se devuelve el último guardado.
+
+    Returns:
+        tuple: (dict o None si aún no hay ninguno, bool vigente)
+    """
+    snapshot, vigente = indicadores.ultimo_snapshot_crm()
+    if not vigente:
+        encolar('kpis', origen='Dashboard')
+    return snapshot, vigente
+
+def kpis_dashboard():
+    """
+    Cubo de KPIs mensuales para el Dashboard sin parsear el CRM en el rerun
+
+    Si no está al día se encola su cálculo y se devuelve el último disponible.
+
+    Returns:
+        tuple: (DataFrame o None si aún no hay ninguno, bool vigente)
+    """
+    tabla, vigente = kpis_mensuales.ultima_tabla()
+    if not vigente:
+        encolar('kpis', origen='Dashboard')
+    return tabla, vigente
+
+# ============================================================================
+# COLA Y EJECUCIÓN
+# ============================================================================
+
+_lock = threading.Lock()
+_tareas = {}  # id -> tarea (dict), en orden de creación
+_contador = itertools.count(1)
+_locks_tipo = {tipo: threading.Lock() for tipo in TAREAS}
+_estado = {'pool': None, 'vigilante': None, 'parar': threading.Event(),
+           'versiones': {}, 'proxima_reconstruccion': None}
+
+def encolar(tipo, origen='Manual'):
+    """
+    Añade una tarea a la cola (si no hay ya una igual pendiente)
+
+    Args:
+        tipo: Clave de TAREAS
+        origen: Quién la pidió ('Manual', 'Guardado', 'Cambio de datos', 'Nocturna'...)
+
+    Returns:
+        Dict de la tarea (la ya pendiente si estaba duplicada)
+    """
+    if tipo not in TAREAS:
+        raise ValueError(f"Tarea desconocida: {tipo}")
+    iniciar()
+
+    with _lock:
+        # Una igual pendiente ya verá los datos de ahora; una en curso puede que no
+        for tarea in _tareas.values():
+            if tarea['tipo'] == tipo and tarea['estado'] == 'Pendiente':
+                tarea['solicitudes'] += 1
+                return tarea
+
+        tarea = {'id': next(_contador), 'tipo': tipo, 'origen': origen, 'estado': 'Pendiente',
+                 'solicitudes': 1, 'creada': datetime.now(), 'inicio': None, 'fin': None,
+                 'detalle': '', 'error': ''}
+        _tareas[tarea['id']] = tarea
+        _recortar_historial()
+        pool = _estado['pool']
+
+    print(f"[DEBUG] ⏳ Tarea #{tarea['id']} encolada: {tipo} ({origen})")
+    pool.submit(_ejecutar, tarea)
+    return tarea
+
+def _recortar_historial():
+    terminadas = [i for i, t in _tareas.items() if t['estado'] in ('Completada', 'Error')]
+    for id_tarea in terminadas[:max(0, len(terminadas) - MAXIMO_HISTORIAL)]:
+        del _tareas[id_tarea]
+
+def _ejecutar(tarea):
+    # Dos tareas del mismo tipo nunca se ejecutan a la vez
+    with _locks_tipo[tarea['tipo']]:
+        with _lock:
+            tarea.update(estado='En curso', inicio=datetime.now())
+        try:
+            detalle = TAREAS[tarea['tipo']][1]()
+            with _lock:
+                tarea.update(estado='Completada', detalle=detalle or '')
+        except Exception as e:
+            with _lock:
+                tarea.update(estado='Error', error=str(e))
+            print(f"[DEBUG] ❌ Tarea #{tarea['id']} ({tarea['tipo']}) falló: {e}")
+            print(traceback.format_exc())
+        finally:
+            with _lock:
+                tarea['fin'] = datetime.now()
+
+    segundos = (tarea['fin'] - tarea['inicio']).total_seconds()
+    print(f"[DEBUG] ✅ Tarea #{tarea['id']} {tarea['tipo']}: {tarea['estado']} en {segundos:.2f}s")
+
+# ============================================================================
+# VIGILANTE (CAMBIOS DE ARCHIVO Y RECONSTRUCCIÓN NOCTURNA)
+# ============================================================================
+
+def proxima_reconstruccion(desde=None):
+    """Próxima hora de la reconstrucción nocturna a partir de `desde`"""
+    desde = desde or datetime.now()
+    momento = desde.replace(hour=config.HORA_RECONSTRUCCION_NOCTURNA, minute=0, second=0, microsecond=0)
+    return momento if momento > desde else momento + timedelta(days=1)
+
+def _revisar_archivos():
+    """Encola las tareas de los archivos que han cambiado desde la última revisión"""
+    tipos = []
+    for archivo, tipos_archivo in TAREAS_POR_ARCHIVO.items():
+        version = utils.version_archivo(archivo)
+        anterior = _estado['versiones'].get(archivo)
+        _estado['versiones'][archivo] = version
+        if anterior is not None and anterior != version:
+            tipos += [t for t in tipos_archivo if t not in tipos]
+    for tipo in tipos:
+        encolar(tipo, origen='Cambio de datos')
+
+def _vigilar():
+    parar = _estado['parar']
+    while not parar.wait(config.SEGUNDOS_VIGILANCIA_ARCHIVOS):
+        try:
+            _revisar_archivos()
+            if datetime.now() >= _estado['proxima_reconstruccion']:
+                _estado['proxima_reconstruccion'] = proxima_reconstruccion()
+                encolar('reconstruccion', origen='Nocturna')
+        except Exception as e:
+            print(f"[DEBUG] ❌ Vigilante de tareas: {e}")
+
+def iniciar():
+    """Arranca el pool y el vigilante (una sola vez por proceso)"""
+    with _lock:
+        if _estado['pool'] is not None:
+            return
+        _estado['pool'] = ThreadPoolExecutor(max_workers=config.HILOS_PLANIFICADOR,
+                                             thread_name_prefix="planificador")
+        _estado['proxima_reconstruccion'] = proxima_reconstruccion()
+        _estado['versiones'] = {a: utils.version_archivo(a) for a in TAREAS_POR_ARCHIVO}
+        _estado['parar'].clear()
+        _estado['vigilante'] = threading.Thread(target=_vigilar, name="planificador-vigilante", daemon=True)
+        _estado['vigilante'].start()
+    print(f"[DEBUG] ⏱️ Planificador iniciado ({config.HILOS_PLANIFICADOR} hilos, "
+          f"reconstrucción a las {config.HORA_RECONSTRUCCION_NOCTURNA:02d}:00)")
+
+def detener(esperar=True):
+    """Para el vigilante y el pool (las tareas pendientes se descartan)"""
+    with _lock:
+        pool, _estado['pool'] = _estado['pool'], None
+        _estado['parar'].set()
+    if pool is not None:
+        pool.shutdown(wait=esperar, cancel_futures=True)
+
+# ============================================================================
+# ESTADO
+# ============================================================================
+
+def estado_tareas():
+    """
+    Tareas recientes, de la más nueva a la más antigua
+
+    Returns:
+        DataFrame con ID, Tarea, Origen, Estado, Solicitudes, Creada, Inicio, Fin, Segundos, Detalle
+    """
+    with _lock:
+        tareas = [dict(t) for t in _tareas.values()]
+
+    filas = [{
+        'ID': t['id'],
+        'Tarea': TAREAS[t['tipo']][0],
+        'Origen': t['origen'],
+        'Estado': t['estado'],
+        'Solicitudes': t['solicitudes'],
+        'Creada': t['creada'],
+        'Inicio': t['inicio'],
+        'Fin': t['fin'],
+        'Segundos': round((t['fin'] - t['inicio']).total_seconds(), 2) if t['fin'] and t['inicio'] else None,
+        'Detalle': t['error'] or t['detalle']
+    } for t in reversed(tareas)]
+    return pd.DataFrame(filas, columns=['ID', 'Tarea', 'Origen', 'Estado', 'Solicitudes', 'Creada',
+                                        'Inicio', 'Fin', 'Segundos', 'Detalle'])
+
+def resumen():
+    """Contadores por estado y próxima reconstrucción nocturna"""
+    with _lock:
+        estados = [t['estado'] for t in _tareas.values()]
+        activo = _estado['pool'] is not None
+    return {
+        'activo': activo,
+        'pendientes': estados.count('Pendiente'),
+        'en_curso': estados.count('En curso'),
+        'errores': estados.count('Error'),
+        'proxima_reconstruccion': _estado['proxima_reconstruccion']
+    }
@@ -0,0 +1,260 @@
+"""
+PROVEEDORES.PY - Comparativa de Precios entre Proveedores
+Estadísticas de precio por ingrediente y proveedor y sobrecoste de cada cliente
+"""
+
+import numpy as np
+import pandas as pd
+import config
+import contexto_datos
+import utils
+from busqueda import normalizar_serie
+
+# Percentiles que se precalculan por ingrediente y proveedor
+PERCENTILES = [25, 75]
+
+COLUMNAS_SOBRECOSTE = ['ID Cliente', 'Nombre Cliente', 'Ingrediente', 'Proveedor', 'Precio Cliente',
+                       'Mejor Precio', 'Proveedor Mejor Precio', 'Sobrecoste €', 'Sobrecoste %']
+
+COLUMNAS_OBSERVACION = ['Origen', 'ID Cliente', 'Nombre Cliente', 'ID Ingrediente',
+                        'Nombre Ingrediente', 'Proveedor', 'Precio', 'Cantidad']
+
+# ============================================================================
+# OBSERVACIONES DE PRECIO
+# ============================================================================
+
+def _vacias():
+    return pd.DataFrame(columns=COLUMNAS_OBSERVACION)
+
+def _nombres_proveedor(serie, df_proveedores):
+    """Nombre del proveedor tal como figura en PROVEEDORES (si coincide sin tildes/mayúsculas)"""
+    serie = serie.fillna('').astype(str).str.strip()
+    if df_proveedores.empty or 'Nombre' not in df_proveedores.columns:
+        return serie
+    maestro = df_proveedores['Nombre'].dropna().astype(str).str.strip()
+    canonico = dict(zip(normalizar_serie(maestro), maestro))
+    return normalizar_serie(serie).map(canonico).fillna(serie)
+
+def observaciones_precios(df_precios, df_lineas, df_compras, df_proveedores=None):
+    """
+    Une en una sola tabla todos los precios observados por ingrediente
+
+    Args:
+        df_precios: PRECIOS_POR_CLIENTE (precio acordado de cada cliente y su proveedor)
+        df_lineas: LINEAS_COMPRA (precios realmente pagados)
+        df_compras: COMPRAS_CLIENTE (aporta Proveedor y Cliente a cada línea vía ID Compra)
+        df_proveedores: PROVEEDORES, para unificar los nombres
+
+    Returns:
+        DataFrame con Origen, ID Cliente, Nombre Cliente, ID Ingrediente,
+        Nombre Ingrediente, Proveedor, Precio y Cantidad (solo precios > 0)
+    """
+    df_proveedores = df_proveedores if df_proveedores is not None else pd.DataFrame()
+    partes = []
+
+    if not df_precios.empty and {'ID Ingrediente', 'Precio Cliente'} <= set(df_precios.columns):
+        partes.append(pd.DataFrame({
+            'Origen': 'Precio Cliente',
+            'ID Cliente': df_precios.get('ID Cliente'),
+            'Nombre Cliente': df_precios.get('Nombre Cliente'),
+            'ID Ingrediente': df_precios['ID Ingrediente'],
+            'Nombre Ingrediente': df_precios.get('Nombre Ingrediente'),
+            'Proveedor': df_precios.get('Proveedor'),
+            'Precio': df_precios['Precio Cliente'],
+            'Cantidad': np.nan
+        }))
+
+    if not df_lineas.empty and {'ID Ingrediente', 'Precio Unitario'} <= set(df_lineas.columns):
+        columnas_compra = [c for c in ['ID Compra', 'ID Cliente', 'Nombre Cliente', 'Proveedor']
+                           if c in df_compras.columns]
+        lineas = df_lineas
+        if 'ID Compra' in columnas_compra and 'ID Compra' in df_lineas.columns:
+            cabeceras = df_compras[columnas_compra].drop_duplicates('ID Compra')
+            lineas = df_lineas.merge(cabeceras, on='ID Compra', how='left', suffixes=('', ' Compra'))
+        partes.append(pd.DataFrame({
+            'Origen': 'Compra',
+            'ID Cliente': lineas.get('ID Cliente'),
+            'Nombre Cliente': lineas.get('Nombre Cliente'),
+            'ID Ingrediente': lineas['ID Ingrediente'],
+            'Nombre Ingrediente': lineas.get('Nombre Ingrediente'),
+            'Proveedor': lineas.get('Proveedor'),
+            'Precio': lineas['Precio Unitario'],
+            'Cantidad': lineas.get('Cantidad', np.nan)
+        }))
+
+    if not partes:
+        return _vacias()
+
+    obs = pd.concat(partes, ignore_index=True)
+    obs['ID Ingrediente'] = pd.to_numeric(obs['ID Ingrediente'], errors='coerce')
+    obs['Precio'] = pd.to_numeric(obs['Precio'], errors='coerce')
+    obs['Cantidad'] = pd.to_numeric(obs['Cantidad'], errors='coerce')
+    obs = obs[obs['ID Ingrediente'].notna() & (obs['Precio'] > 0)].reset_index(drop=True)
+    obs['ID Ingrediente'] = obs['ID Ingrediente'].astype('int64')
+
+    obs['Proveedor'] = _nombres_proveedor(obs['Proveedor'], df_proveedores).replace('', 'Sin proveedor')
+    return obs
+
+# ============================================================================
+# MOTOR DE COMPARATIVA
+# ============================================================================
+
+class ComparativaPrecios:
+    """
+    Estadísticas de precio precalculadas por ingrediente y proveedor
+
+    Todo se agrega una vez al construir; las consultas ("proveedor más
+    barato de X", "sobrecoste del cliente Y") son búsquedas en diccionarios.
+    """
+
+    def __init__(self, observaciones, df_ingredientes=None):
+        self.observaciones = observaciones
+        obs = observaciones
+
+        if obs.empty:
+            self.estadisticas = pd.DataFrame(columns=[
+                'ID Ingrediente', 'Ingrediente', 'Proveedor', 'Mínimo', 'Mediana',
+                *[f"P{p}" for p in PERCENTILES], 'Observaciones'])
+            self.mejor_precio = pd.DataFrame(columns=['Ingrediente', 'Mejor Precio', 'Proveedor Mejor Precio'])
+            self.sobrecoste = pd.DataFrame(columns=COLUMNAS_SOBRECOSTE)
+            self.sobrecoste_por_cliente = pd.DataFrame(columns=['ID Cliente', 'Nombre Cliente', 'Ingredientes',
+                                                                'Por Encima', 'Sobrecoste Medio %', 'Ahorro Potencial'])
+            self._por_ingrediente, self._por_cliente = {}, {}
+            return
+
+        nombres = self._nombres_ingredientes(obs, df_ingredientes)
+
+        # Estadísticas por (ingrediente, proveedor) en una sola agrupación
+        grupos = obs.groupby(['ID Ingrediente', 'Proveedor'])['Precio']
+        estadisticas = grupos.agg(['min', 'median', 'count'])
+        cuantiles = grupos.quantile([p / 100 for p in PERCENTILES]).unstack()
+        cuantiles.columns = [f"P{p}" for p in PERCENTILES]
+        estadisticas = estadisticas.join(cuantiles).reset_index().rename(
+            columns={'min': 'Mínimo', 'median': 'Mediana', 'count': 'Observaciones'})
+        estadisticas.insert(1, 'Ingrediente', estadisticas['ID Ingrediente'].map(nombres))
+        estadisticas = estadisticas.sort_values(['ID Ingrediente', 'Mediana', 'Mínimo'], kind='stable')
+        self.estadisticas = estadisticas.reset_index(drop=True)
+
+        # Mejor precio observado por ingrediente (mínimo de cualquier proveedor)
+        posicion_minimo = obs.groupby('ID Ingrediente')['Precio'].idxmin()
+        mejor = obs.loc[posicion_minimo, ['ID Ingrediente', 'Precio', 'Proveedor']].set_index('ID Ingrediente')
+        mejor.columns = ['Mejor Precio', 'Proveedor Mejor Precio']
+        mejor.insert(0, 'Ingrediente', mejor.index.map(nombres))
+        self.mejor_precio = mejor
+
+        self._por_ingrediente = {
+            int(i): self.estadisticas.iloc[posiciones]
+            for i, posiciones in self.estadisticas.groupby('ID Ingrediente').indices.items()
+        }
+
+        self._calcular_sobrecoste(obs)
+
+    @staticmethod
+    def _nombres_ingredientes(obs, df_ingredientes):
+        """ID Ingrediente -> nombre (del maestro si existe, si no el primero observado)"""
+        nombres = obs.dropna(subset=['Nombre Ingrediente']).drop_duplicates('ID Ingrediente') \
+            .set_index('ID Ingrediente')['Nombre Ingrediente']
+        if df_ingredientes is not None and not df_ingredientes.empty \
+                and {'ID Ingrediente', 'Nombre'} <= set(df_ingredientes.columns):
+            ids = pd.to_numeric(df_ingredientes['ID Ingrediente'], errors='coerce')
+            maestro = pd.Series(df_ingredientes['Nombre'].to_numpy(), index=ids)
+            maestro = maestro[maestro.index.notna()]
+            maestro.index = maestro.index.astype('int64')
+            nombres = maestro[~maestro.index.duplicated()].combine_first(nombres)
+        return nombres.to_dict()
+
+    def _calcular_sobrecoste(self, obs):
+        """Precio acordado de cada cliente frente al mejor observado, y ahorro según lo comprado"""
+        mejor = obs['ID Ingrediente'].map(self.mejor_precio['Mejor Precio'])
+        diferencia = obs['Precio'] - mejor
+
+        acordados = obs[obs['Origen'] == 'Precio Cliente']
+        self.sobrecoste = pd.DataFrame({
+            'ID Cliente': acordados['ID Cliente'],
+            'Nombre Cliente': acordados['Nombre Cliente'],
+            'Ingrediente': acordados['ID Ingrediente'].map(self.mejor_precio['Ingrediente']),
+            'Proveedor': acordados['Proveedor'],
+            'Precio Cliente': acordados['Precio'],
+            'Mejor Precio': mejor[acordados.index],
+            'Proveedor Mejor Precio': acordados['ID Ingrediente'].map(self.mejor_precio['Proveedor Mejor Precio']),
+            'Sobrecoste €': diferencia[acordados.index].round(2),
+            'Sobrecoste %': (diferencia / mejor * 100)[acordados.index].round(1)
+        }).sort_values('Sobrecoste %', ascending=False, kind='stable').reset_index(drop=True)
+
+        # Ahorro potencial: lo pagado de más en las compras reales
+        compras = obs[(obs['Origen'] == 'Compra') & obs['ID Cliente'].notna()]
+        ahorro = (diferencia[compras.index] * compras['Cantidad'].fillna(0)).groupby(compras['ID Cliente']).sum()
+
+        por_cliente = self.sobrecoste.groupby('ID Cliente').agg(
+            **{'Nombre Cliente': ('Nombre Cliente', 'first'),
+               'Ingredientes': ('Ingrediente', 'count'),
+               'Por Encima': ('Sobrecoste €', lambda s: int((s > 0).sum())),
+               'Sobrecoste Medio %': ('Sobrecoste %', 'mean')})
+        por_cliente = por_cliente.join(ahorro.rename('Ahorro Potencial'), how='outer')
+        por_cliente['Sobrecoste Medio %'] = por_cliente['Sobrecoste Medio %'].round(1)
+        por_cliente['Ahorro Potencial'] = por_cliente['Ahorro Potencial'].fillna(0).round(2)
+        self.sobrecoste_por_cliente = por_cliente.reset_index().sort_values(
+            'Ahorro Potencial', ascending=False, kind='stable').reset_index(drop=True)
+
+        self._por_cliente = {
+            cliente: self.sobrecoste.iloc[posiciones]
+            for cliente, posiciones in self.sobrecoste.groupby('ID Cliente').indices.items()
+        }
+
+    # ------------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------------
+
+    def ingredientes(self):
+        """ID Ingrediente -> nombre de los ingredientes con precios observados"""
+        return self.mejor_precio['Ingrediente'].to_dict()
+
+    def proveedores_ingrediente(self, id_ingrediente):
+        """Estadísticas de cada proveedor para el ingrediente, el más barato (mediana) primero"""
+        return self._por_ingrediente.get(int(id_ingrediente), self.estadisticas.iloc[0:0])
+
+    def proveedor_mas_barato(self, id_ingrediente):
+        """
+        Proveedor más barato para un ingrediente
+
+        Returns:
+            dict con proveedor, mediana, mínimo y observaciones, o None
+        """
+        tabla = self.proveedores_ingrediente(id_ingrediente)
+        if tabla.empty:
+            return None
+        fila = tabla.iloc[0]
+        return {'proveedor': fila['Proveedor'], 'mediana': fila['Mediana'],
+                'minimo': fila['Mínimo'], 'observaciones': int(fila['Observaciones'])}
+
+    def sobrecoste_cliente(self, id_cliente):
+        """Precios acordados del cliente frente al mejor observado, el mayor sobrecoste primero"""
+        return self._por_cliente.get(id_cliente, self.sobrecoste.iloc[0:0])
+
+    def matriz_medianas(self):
+        """Mediana de precio ingrediente × proveedor (NaN si el proveedor no lo sirve)"""
+        if self.estadisticas.empty:
+            return pd.DataFrame()
+        return self.estadisticas.pivot_table(index='Ingrediente', columns='Proveedor',
+                                             values='Mediana', aggfunc='first')
+
+# ============================================================================
+# ACCESO COMPARTIDO
+# ============================================================================
+
+def _construir_comparativa():
+    obs = observaciones_precios(
+        utils.leer_excel(config.ARCHIVO_OPERACIONES, "PRECIOS_POR_CLIENTE"),
+        utils.leer_excel(config.ARCHIVO_OPERACIONES, "LINEAS_COMPRA"),
+        utils.leer_excel(config.ARCHIVO_OPERACIONES, "COMPRAS_CLIENTE"),
+        utils.leer_excel(config.ARCHIVO_PROVEEDORES, "PROVEEDORES")
+    )
+    print(f"[DEBUG] 📊 Comparativa de proveedores: {len(obs)} precios observados")
+    return ComparativaPrecios(obs, utils.leer_excel(config.ARCHIVO_OPERACIONES, "INGREDIENTES_MAESTRO"))
+
+def comparativa_precios():
+    """Comparativa de proveedores, reconstruida solo cuando cambian OPERACIONES o PROVEEDORES"""
+    return contexto_datos.cache_por_version(
+        "proveedores:comparativa", [config.ARCHIVO_OPERACIONES, config.ARCHIVO_PROVEEDORES],
+        _construir_comparativa
+    )
@@ -0,0 +1,248 @@
+"""
+RENDIMIENTO.PY - Pruebas de Rendimiento
+Mide las operaciones de datos más pesadas sobre libros sintéticos (o una copia
+de los reales) y genera un informe JSON para detectar regresiones entre versiones
+"""
+
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import config
+
+TOLERANCIA_REGRESION = 0.25  # +25% sobre la mediana anterior se considera regresión
+
+# ============================================================================
+# OPERACIONES MEDIDAS
+# ============================================================================
+# Cada operación recibe el contador de repetición y devuelve las filas procesadas
+# (en las alertas, las alertas encontradas).
+# Las que escriben trabajan sobre la copia temporal, nunca sobre los datos reales.
+
+def _leer(archivo, hoja):
+    import utils
+    return lambda i: len(utils.leer_excel(archivo(), hoja))
+
+def _escribir(archivo, hoja):
+    """Reescribe la hoja sin cambios (se lee una vez, fuera de la medida)"""
+    import utils
+    datos = []
+    def operacion(i):
+        if not datos:
+            df = utils.leer_excel(archivo(), hoja)
+            datos.append(df)
+        inicio = time.perf_counter()
+        utils.escribir_excel(archivo(), hoja, datos[0])
+        return len(datos[0]), time.perf_counter() - inicio
+    return operacion
+
+def _agregar(archivo, hoja, columna_id, fila):
+    """Añade una fila de prueba (con un ID alto para no chocar con los generados)"""
+    import utils
+    def operacion(i):
+        utils.agregar_fila(archivo(), hoja, dict(fila(), **{columna_id: 10**9 + i}))
+        return 1
+    return operacion
+
+def _recalcular(i):
+    import utils
+    df_escandallos = utils.leer_excel(config.ARCHIVO_OPERACIONES, "ESCANDALLOS")
+    inicio = time.perf_counter()
+    utils.recalcular_costes_platos(df_escandallos)
+    # Solo cuenta el recálculo (la lectura de ESCANDALLOS ya se mide en leer_excel)
+    return len(df_escandallos), time.perf_counter() - inicio
+
+def _alertas_precios(i):
+    import utils
+    return len(utils.detectar_alertas_precios())
+
+def _alertas_margenes(i):
+    import utils
+    return len(utils.detectar_alertas_margenes())
+
+def _lead_prueba():
+    return {'Nombre Comercial': 'Bar Prueba Rendimiento', 'Tipo Local': 'Bar', 'Ciudad': 'Madrid',
+            'Estado Lead': 'Prospecto', 'Fecha Contacto': datetime.now().date()}
+
+def _escandallo_prueba():
+    return {'ID Plato': 1, 'Nombre Plato': 'Plato de prueba', 'ID Ingrediente': 1, 'Cantidad': 0.1,
+            'Coste Unitario': 1.0, 'Coste Total': 0.1, 'Última Actualización': datetime.now().date()}
+
+def operaciones():
+    """
+    Operaciones disponibles
+
+    Returns:
+        Dict {nombre: función(repetición) -> filas, o (filas, segundos) si mide solo una parte}
+    """
+    crm = lambda: config.ARCHIVO_CRM
+    operaciones_ = lambda: config.ARCHIVO_OPERACIONES
+    return {
+        'leer_excel:LEADS': _leer(crm, "LEADS"),
+        'leer_excel:ESCANDALLOS': _leer(operaciones_, "ESCANDALLOS"),
+        'leer_excel:LINEAS_COMPRA': _leer(operaciones_, "LINEAS_COMPRA"),
+        'escribir_excel:LEADS': _escribir(crm, "LEADS"),
+        'escribir_excel:ESCANDALLOS': _escribir(operaciones_, "ESCANDALLOS"),
+        'agregar_fila:LEADS': _agregar(crm, "LEADS", 'ID', _lead_prueba),
+        'agregar_fila:ESCANDALLOS': _agregar(operaciones_, "ESCANDALLOS", 'ID Escandallo', _escandallo_prueba),
+        'recalcular_costes_platos': _recalcular,
+        'detectar_alertas_precios': _alertas_precios,
+        'detectar_alertas_margenes': _alertas_margenes
+    }
+
+def medir(nombre, operacion, repeticiones):
+    """
+    Ejecuta una operación varias veces
+
+    Returns:
+        Dict con operacion, filas, repeticiones y minimo/mediana/media/maximo en segundos
+    """
+    tiempos, filas = [], 0
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = operacion(i)
+        segundos = time.perf_counter() - inicio
+        if isinstance(resultado, tuple):
+            resultado, segundos = resultado
+        tiempos.append(segundos)
+        filas = resultado
+        print(f"[DEBUG] ⏱️ {nombre} #{i + 1}: {segundos:.3f}s")
+
+    return {
+        'operacion': nombre,
+        'filas': filas,
+        'repeticiones': repeticiones,
+        'minimo': round(min(tiempos), 4),
+        'mediana': round(statistics.median(tiempos), 4),
+        'media': round(statistics.mean(tiempos), 4),
+        'maximo': round(max(tiempos), 4)
+    }
+
+# ============================================================================
+# EJECUCIÓN COMPLETA
+# ============================================================================
+
+def _entorno():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except Exception:
+        commit = ''
+    import utils
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'procesadores': os.cpu_count(),
+        'motor_escritura': utils.motor_escritura(),
+        'commit': commit or None
+    }
+
+def _filas_por_hoja():
+    """Filas de cada hoja según la dimensión guardada en el libro (sin leer los datos)"""
+    from openpyxl import load_workbook
+    hojas = {}
+    for archivo in [config.ARCHIVO_CRM, config.ARCHIVO_OPERACIONES, config.ARCHIVO_PROVEEDORES, config.ARCHIVO_EMPRESA]:
+        libro = load_workbook(archivo, read_only=True)
+        for hoja in libro.worksheets:
+            hojas[hoja.title] = max((hoja.max_row or 1) - 1, 0)
+        libro.close()
+    return hojas
+
+def ejecutar(escala='pequeña', semilla=42, repeticiones=3, nombres=None, carpeta=None, copiar_de=None, **tamanos):
+    """
+    Genera (o copia) los datos en una carpeta temporal y mide las operaciones
+
+    Args:
+        escala: Escala de datos_sinteticos.ESCALAS
+        semilla: Semilla del generador
+        repeticiones: Veces que se ejecuta cada operación
+        nombres: Operaciones a medir (por defecto todas)
+        carpeta: Carpeta de trabajo (por defecto una temporal que se borra al terminar)
+        copiar_de: Medir sobre una copia de los Excel de esta carpeta en lugar de generarlos
+        **tamanos: Filas de hojas concretas (ver datos_sinteticos.generar_libros)
+
+    Returns:
+        Dict del informe (fecha, escala, entorno, filas por hoja y resultados)
+    """
+    import datos_sinteticos
+
+    disponibles = operaciones()
+    nombres = nombres or list(disponibles)
+    desconocidas = [n for n in nombres if n not in disponibles]
+    if desconocidas:
+        raise ValueError(f"Operaciones desconocidas: {', '.join(desconocidas)}")
+
+    temporal = carpeta is None
+    carpeta = carpeta or tempfile.mkdtemp(prefix="rendimiento_horeca_")
+    ruta_anterior = config.RUTA_DATOS
+    try:
+        config.usar_ruta_datos(carpeta)
+        inicio = time.perf_counter()
+        if copiar_de:
+            for archivo in [config.ARCHIVO_CRM, config.ARCHIVO_OPERACIONES, config.ARCHIVO_PROVEEDORES, config.ARCHIVO_EMPRESA]:
+                shutil.copy2(os.path.join(copiar_de, os.path.basename(archivo)), archivo)
+        else:
+            datos_sinteticos.generar_datos(escala, semilla, solo_faltantes=False, **tamanos)
+        preparacion = time.perf_counter() - inicio
+
+        informe = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'escala': 'copia' if copiar_de else escala,
+            'semilla': None if copiar_de else semilla,
+            'tamanos': {k: v for k, v in tamanos.items() if v is not None},
+            'entorno': _entorno(),
+            'filas_por_hoja': _filas_por_hoja(),
+            'preparacion_segundos': round(preparacion, 2),
+            'resultados': []
+        }
+        for nombre in nombres:
+            informe['resultados'].append(medir(nombre, disponibles[nombre], repeticiones))
+        return informe
+    finally:
+        config.usar_ruta_datos(ruta_anterior)
+        if temporal:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+# ============================================================================
+# INFORMES
+# ============================================================================
+
+def guardar_informe(informe, ruta):
+    """Guarda el informe como JSON"""
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+
+def cargar_informe(ruta):
+    """Lee un informe guardado con guardar_informe"""
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+def tabla_resultados(informe):
+    """Resultados del informe como DataFrame"""
+    return pd.DataFrame(informe['resultados'])
+
+def comparar(informe, anterior, tolerancia=TOLERANCIA_REGRESION):
+    """
+    Compara las medianas con las de un informe anterior
+
+    Returns:
+        DataFrame con operacion, antes, ahora, variacion_pct y regresion
+        (solo las operaciones presentes en ambos informes)
+    """
+    antes = tabla_resultados(anterior).set_index('operacion')['mediana']
+    ahora = tabla_resultados(informe).set_index('operacion')['mediana']
+    comunes = ahora.index.intersection(antes.index)
+    tabla = pd.DataFrame({'antes': antes[comunes], 'ahora': ahora[comunes]})
+    tabla['variacion_pct'] = ((tabla['ahora'] / tabla['antes'].where(tabla['antes'] > 0) - 1) * 100).round(1)
+    tabla['regresion'] = tabla['ahora'] > tabla['antes'] * (1 + tolerancia)
+    tabla.index.name = 'operacion'
+    return tabla.reset_index()
@@ -3,15 +3,102 @@ UTILS.PY - Funciones Utilitarias
 Lectura/Escritura de Excel y funciones comunes
 """
 
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
-import streamlit as st
 from datetime import datetime, date
 import config
+import contexto_datos
+
+# ============================================================================
+# NOTIFICACIÓN DE ERRORES
+# ============================================================================
+# En la app los errores se muestran con st.error; fuera de Streamlit (línea de
+# comandos, tareas programadas) se cambia el destino con definir_destino_errores.
+# Streamlit solo se importa si se llega a usar.
+
+def _error_streamlit(mensaje):
+    import streamlit as st
+    st.error(mensaje)
+
+_destino_errores = {'funcion': _error_streamlit}
+
+def definir_destino_errores(funcion):
+    """
+    Cambia a dónde van los errores de lectura/escritura y cálculo
+
+    Args:
+        funcion: Función (mensaje) -> None; None restablece st.error
+
+    Returns:
+        La función anterior (para restaurarla)
+    """
+    anterior = _destino_errores['funcion']
+    _destino_errores['funcion'] = funcion or _error_streamlit
+    return anterior
+
+def notificar_error(mensaje):
+    """Envía un mensaje de error al destino configurado"""
+    _destino_errores['funcion'](mensaje)
 
 # ============================================================================
 # FUNCIONES DE LECTURA DE EXCEL
 # ============================================================================
 
+# Lecturas fallidas en cada hilo: leer_excel devuelve una hoja vacía en lugar de
+# lanzar, así que las cachés lo consultan para no guardar un resultado incompleto
+_lecturas_fallidas = threading.local()
+
+def lecturas_fallidas():
+    """Número de lecturas de Excel fallidas en este hilo desde que arrancó"""
+    return getattr(_lecturas_fallidas, 'total', 0)
+
+def _registrar_lectura_fallida():
+    _lecturas_fallidas.total = lecturas_fallidas() + 1
+
+def version_archivo(archivo):
+    """
+    Devuelve la versión de los datos de un archivo
+    Cambia cada vez que el archivo se guarda (desde la app, Excel u OneDrive)
+
+    Args:
+        archivo: Ruta del archivo
+
+    Returns:
+        str con la versión, o "" si el archivo no existe
+    """
+    try:
+        info = os.stat(archivo)
+        return f"{info.st_mtime_ns}-{info.st_size}"
+    except OSError:
+        return ""
+
+def huellas_filas(df):
+    """
+    Huella de cada fila (contenido + nº de repetición, para filas idénticas)
+    Permite saber qué filas se han añadido o eliminado entre dos versiones de una hoja
+    """
+    # Solo el texto se convierte a str (los números se hashean directamente, mucho más rápido)
+    texto = df.select_dtypes(include='object').columns
+    huellas = pd.Series(pd.util.hash_pandas_object(df.astype({c: str for c in texto}), index=False).to_numpy())
+    return (huellas.astype(str) + '-' + huellas.groupby(huellas).cumcount().astype(str)).to_numpy()
+
+def _leer_hoja(archivo, hoja):
+    """
+    Lee una hoja pasando por el contexto de datos del rerun (si hay uno activo)
+    Las excepciones se propagan: quien llama decide cómo tratarlas
+    """
+    contexto = contexto_datos.contexto_actual()
+    if contexto is None:
+        return pd.read_excel(archivo, sheet_name=hoja)
+    return contexto.leer(archivo, hoja, lambda a, h: pd.read_excel(a, sheet_name=h))
+
 def leer_excel(archivo, hoja):
     """
     Lee una hoja de Excel y la devuelve como DataFrame
@@ -24,29 +111,234 @@ def leer_excel(archivo, hoja):
         DataFrame con los datos
     """
     try:
-        df = pd.read_excel(archivo, sheet_name=hoja)
+        df = _leer_hoja(archivo, hoja)
         return df
     except Exception as e:
-        st.error(f"Error al leer {archivo} - {hoja}: {str(e)}")
+        _registrar_lectura_fallida()
+        notificar_error(f"Error al leer {archivo} - {hoja}: {str(e)}")
         return pd.DataFrame()
 
 def leer_todas_hojas(archivo):
     """Lee todas las hojas de un archivo Excel"""
     try:
-        excel_file = pd.ExcelFile(archivo)
-        hojas = {}
-        for nombre_hoja in excel_file.sheet_names:
-            hojas[nombre_hoja] = pd.read_excel(archivo, sheet_name=nombre_hoja)
-        return hojas
+        # Una sola apertura del archivo para todas las hojas
+        return pd.read_excel(archivo, sheet_name=None)
     except Exception as e:
-        st.error(f"Error al leer {archivo}: {str(e)}")
+        _registrar_lectura_fallida()
+        notificar_error(f"Error al leer {archivo}: {str(e)}")
         return {}
 
+# ============================================================================
+# MOTORES DE ESCRITURA EXCEL
+# ============================================================================
+# Guardar una hoja reescribe el libro completo. xlsxwriter solo escribe (no
+# puede editar un libro existente) pero es bastante más rápido que openpyxl,
+# que se mantiene como alternativa si xlsxwriter no está instalado.
+
+# Ancho máximo de columna (en caracteres) y filas que se miran para calcularlo
+ANCHO_MAXIMO_COLUMNA = 50
+FILAS_MUESTRA_ANCHO = 200
+
+def _anchos_columnas(df):
+    """Ancho de cada columna según su cabecera y una muestra de valores"""
+    muestra = df.head(FILAS_MUESTRA_ANCHO)
+    anchos = []
+    for columna in df.columns:
+        largo = muestra[columna].astype(str).str.len().max() if not muestra.empty else 0
+        anchos.append(min(ANCHO_MAXIMO_COLUMNA, max(len(str(columna)), int(largo or 0)) + 2))
+    return anchos
+
+# Umask del proceso (se lee una vez: os.umask solo se puede consultar cambiándola)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+@contextmanager
+def _archivo_temporal(archivo):
+    """
+    Ruta temporal en la misma carpeta que sustituye a `archivo` solo si la
+    escritura termina bien (un fallo a mitad no deja el libro original a medias)
+    """
+    carpeta = os.path.dirname(os.path.abspath(archivo))
+    descriptor, temporal = tempfile.mkstemp(suffix='.xlsx', prefix='.~' + os.path.basename(archivo) + '.',
+                                            dir=carpeta)
+    os.close(descriptor)
+    try:
+        yield temporal
+        if os.path.exists(archivo):
+            shutil.copymode(archivo, temporal)
+        else:
+            # mkstemp crea el fichero con 0600: un libro nuevo lleva los permisos normales
+            os.chmod(temporal, 0o666 & ~_UMASK)
+        os.replace(temporal, archivo)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+def _escribir_hoja_xlsxwriter(libro, nombre, df, formatos):
+    """
+    Vuelca un DataFrame fila a fila en una hoja nueva
+
+    Los valores se convierten por columna (una sola vez) y cada celda se
+    escribe con el método de su tipo; las celdas vacías (y los ±inf, que
+    Excel no admite como número) no se escriben.
+    """
+    hoja = libro.add_worksheet(nombre)
+    for j, ancho in enumerate(_anchos_columnas(df)):
+        hoja.set_column(j, j, ancho, formatos['columnas'].get(df.columns[j]))
+    hoja.write_row(0, 0, [str(c) for c in df.columns], formatos['cabecera'])
+    hoja.freeze_panes(1, 0)
+
+    columnas = []
+    for columna in df.columns:
+        serie = df[columna]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            if serie.dt.tz is not None:
+                serie = serie.dt.tz_localize(None)
+            valores = [None if pd.isna(v) else v.to_pydatetime() for v in serie]
+        else:
+            valores = serie.astype(object).where(serie.notna(), None).tolist()
+        columnas.append(valores)
+
+    formato_columna = [formatos['columnas'].get(c) for c in df.columns]
+    for i, fila in enumerate(zip(*columnas), start=1):
+        for j, valor in enumerate(fila):
+            if valor is None:
+                continue
+            if isinstance(valor, bool):
+                hoja.write_boolean(i, j, valor)
+            elif isinstance(valor, (int, float, np.integer, np.floating)):
+                if math.isfinite(valor):
+                    hoja.write_number(i, j, float(valor), formato_columna[j])
+            elif isinstance(valor, datetime):
+                hoja.write_datetime(i, j, valor, formato_columna[j] or formatos['fecha_hora'])
+            elif isinstance(valor, date):
+                hoja.write_datetime(i, j, valor, formato_columna[j] or formatos['fecha'])
+            else:
+                hoja.write_string(i, j, str(valor), formato_columna[j])
+
+def escribir_libro_xlsxwriter(archivo, hojas, formatos_columna=None, propiedades=None):
+    """
+    Escribe un libro completo con xlsxwriter (modo constant_memory)
+
+    Args:
+        archivo: Ruta del archivo (se sustituye solo si la escritura termina bien)
+        hojas: Dict {nombre_hoja: DataFrame}, en el orden en que se escriben
+        formatos_columna: Dict {columna: formato numérico de Excel} opcional
+        propiedades: Propiedades del documento (título, empresa...) opcional
+    """
+    import xlsxwriter
+
+    with _archivo_temporal(archivo) as temporal:
+        libro = xlsxwriter.Workbook(temporal, {
+            'constant_memory': True,
+            # Guardar el texto tal cual: sin convertirlo en fórmulas ni hipervínculos
+            'strings_to_formulas': False,
+            'strings_to_urls': False
+        })
+        try:
+            formatos = {
+                'cabecera': libro.add_format({'bold': True, 'font_color': 'white',
+                                              'bg_color': config.COLOR_PRIMARIO, 'border': 1}),
+                'fecha': libro.add_format({'num_format': 'yyyy-mm-dd'}),
+                'fecha_hora': libro.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'}),
+                'columnas': {columna: libro.add_format({'num_format': formato})
+                             for columna, formato in (formatos_columna or {}).items()}
+            }
+            if propiedades:
+                libro.set_properties(propiedades)
+            for nombre, df in hojas.items():
+                _escribir_hoja_xlsxwriter(libro, nombre, df, formatos)
+        finally:
+            # Cierra también si falla (se borra el temporal y el original queda intacto)
+            libro.close()
+
+def escribir_libro_openpyxl(archivo, hojas):
+    """Escribe un libro completo con openpyxl (más lento; alternativa si falta xlsxwriter)"""
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    cabecera = Font(bold=True, color="FFFFFF")
+    relleno = PatternFill("solid", fgColor=config.COLOR_PRIMARIO.lstrip('#'))
+    with _archivo_temporal(archivo) as temporal:
+        with pd.ExcelWriter(temporal, engine='openpyxl', mode='w') as writer:
+            for nombre, df in hojas.items():
+                df.to_excel(writer, sheet_name=nombre, index=False)
+                hoja = writer.sheets[nombre]
+                for j, ancho in enumerate(_anchos_columnas(df), start=1):
+                    celda = hoja.cell(row=1, column=j)
+                    celda.font, celda.fill = cabecera, relleno
+                    hoja.column_dimensions[get_column_letter(j)].width = ancho
+                hoja.freeze_panes = "A2"
+
+MOTORES_ESCRITURA = {
+    'xlsxwriter': escribir_libro_xlsxwriter,
+    'openpyxl': escribir_libro_openpyxl
+}
+
+def motor_escritura(motor=None):
+    """Motor a usar: el pedido (o el de config) si está instalado, si no openpyxl"""
+    motor = motor or config.MOTOR_ESCRITURA_EXCEL
+    if motor == 'xlsxwriter':
+        try:
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            print("[DEBUG] ⚠️ xlsxwriter no está instalado, se usa openpyxl")
+            return 'openpyxl'
+    return motor if motor in MOTORES_ESCRITURA else 'openpyxl'
+
+def escribir_libro(archivo, hojas, motor=None):
+    """
+    Reescribe un libro completo con el motor configurado
+
+    Returns:
+        Nombre del motor usado
+    """
+    motor = motor_escritura(motor)
+    MOTORES_ESCRITURA[motor](archivo, hojas)
+    return motor
+
+def medir_motores_escritura(archivo, repeticiones=1):
+    """
+    Tiempo de reescribir un libro con cada motor disponible (sobre una copia temporal)
+
+    Returns:
+        DataFrame con Motor, Segundos (mejor de las repeticiones), Filas y Hojas
+    """
+    import time
+
+    hojas = pd.read_excel(archivo, sheet_name=None)
+    filas = sum(len(df) for df in hojas.values())
+    resultados = []
+    with tempfile.TemporaryDirectory() as carpeta:
+        destino = os.path.join(carpeta, os.path.basename(archivo))
+        for motor in MOTORES_ESCRITURA:
+            if motor_escritura(motor) != motor:
+                continue
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                MOTORES_ESCRITURA[motor](destino, hojas)
+                tiempos.append(time.perf_counter() - inicio)
+            resultados.append({'Motor': motor, 'Segundos': round(min(tiempos), 3), 'Filas': filas,
+                               'Hojas': len(hojas)})
+    return pd.DataFrame(resultados)
+
 # ============================================================================
 # FUNCIONES DE ESCRITURA EN EXCEL
 # ============================================================================
 
-def escribir_excel(archivo, hoja, df):
+# Un lock por archivo: leer el resto de hojas y reescribir el libro no debe
+# solaparse con otra escritura (p. ej. una tarea en segundo plano)
+_locks_escritura = {}
+_lock_registro = threading.Lock()
+
+def lock_escritura(archivo):
+    """Lock de escritura del archivo (reentrante)"""
+    with _lock_registro:
+        return _locks_escritura.setdefault(os.path.abspath(archivo), threading.RLock())
+
+def escribir_excel(archivo, hoja, df, filas_agregadas=None):
     """
     Escribe un DataFrame en una hoja específica de Excel
     Preserva las otras hojas del archivo
@@ -55,39 +347,62 @@ def escribir_excel(archivo, hoja, df):
         archivo: Ruta del archivo Excel
         hoja: Nombre de la hoja a escribir
         df: DataFrame a escribir
+        filas_agregadas: Filas nuevas respecto a la versión anterior, si solo se añadieron
+            (permite actualizar los agregados de forma incremental)
     """
     try:
-        # Leer todas las hojas existentes
-        excel_file = pd.ExcelFile(archivo)
-        hojas_existentes = {}
-        
-        for nombre_hoja in excel_file.sheet_names:
-            if nombre_hoja == hoja:
-                # Usar el DataFrame nuevo para esta hoja
-                hojas_existentes[nombre_hoja] = df
-            else:
-                # Mantener las otras hojas como están
-                hojas_existentes[nombre_hoja] = pd.read_excel(archivo, sheet_name=nombre_hoja)
-        
-        # Si la hoja no existía, agregarla
-        if hoja not in hojas_existentes:
-            hojas_existentes[hoja] = df
-        
-        # Escribir todo de vuelta
-        with pd.ExcelWriter(archivo, engine='openpyxl', mode='w') as writer:
-            for nombre_hoja, datos in hojas_existentes.items():
-                datos.to_excel(writer, sheet_name=nombre_hoja, index=False)
+        with lock_escritura(archivo):
+            version_anterior = version_archivo(archivo)
+            
+            # Leer todas las hojas existentes
+            excel_file = pd.ExcelFile(archivo)
+            hojas_existentes = {}
+            
+            # Hojas que ya se leyeron en este rerun (no hace falta volver a parsearlas)
+            contexto = contexto_datos.contexto_actual()
+            en_memoria = contexto.hojas_en_memoria(archivo) if contexto else {}
+            
+            for nombre_hoja in excel_file.sheet_names:
+                if nombre_hoja == hoja:
+                    # Usar el DataFrame nuevo para esta hoja
+                    hojas_existentes[nombre_hoja] = df
+                elif nombre_hoja in en_memoria:
+                    hojas_existentes[nombre_hoja] = en_memoria[nombre_hoja]
+                else:
+                    # Mantener las otras hojas como están
+                    hojas_existentes[nombre_hoja] = pd.read_excel(excel_file, sheet_name=nombre_hoja)
+            excel_file.close()
+            
+            # Si la hoja no existía, agregarla
+            if hoja not in hojas_existentes:
+                hojas_existentes[hoja] = df
+            
+            # Escribir todo de vuelta
+            motor = escribir_libro(archivo, hojas_existentes)
+            
+            print(f"[DEBUG] ✅ Excel guardado: {hoja} con {len(df)} filas ({motor})")
+            
+            if contexto:
+                contexto.invalidar(archivo)
+                contexto.registrar(archivo, {n: d for n, d in hojas_existentes.items() if n != hoja})
+            
+        # Regenerar el snapshot del dashboard con las hojas que ya están en memoria
+        if archivo == config.ARCHIVO_CRM:
+            try:
+                import indicadores
+                indicadores.actualizar_snapshot_crm(hojas_existentes, hoja, version_anterior, filas_agregadas)
+            except Exception as e:
+                print(f"[DEBUG] ⚠️ No se pudo actualizar el snapshot de KPIs: {e}")
         
-        print(f"[DEBUG] ✅ Excel guardado: {hoja} con {len(df)} filas")
         return True
         
     except PermissionError as e:
-        st.error(f"❌ El archivo está bloqueado. Cierra Excel y OneDrive debe terminar de sincronizar.")
+        notificar_error(f"❌ El archivo está bloqueado. Cierra Excel y OneDrive debe terminar de sincronizar.")
         print(f"[DEBUG] ❌ PermissionError: {e}")
         return False
         
     except Exception as e:
-        st.error(f"Error al escribir en {archivo}: {str(e)}")
+        notificar_error(f"Error al escribir en {archivo}: {str(e)}")
         print(f"[DEBUG] ❌ Error escribiendo: {e}")
         import traceback
         print(traceback.format_exc())
@@ -103,26 +418,28 @@ def agregar_fila(archivo, hoja, nueva_fila):
         nueva_fila: Dict con los datos de la nueva fila
     """
     try:
-        # Leer la hoja actual directamente
-        df = pd.read_excel(archivo, sheet_name=hoja)
-        
-        print(f"[DEBUG] Agregando fila a {hoja}")
-        print(f"[DEBUG] Nombre: {nueva_fila.get('Nombre Comercial', nueva_fila.get('Nombre', 'N/A'))}")
-        print(f"[DEBUG] Filas antes: {len(df)}")
-        
-        # Agregar la nueva fila
-        nuevo_df = pd.concat([df, pd.DataFrame([nueva_fila])], ignore_index=True)
-        
-        print(f"[DEBUG] Filas después: {len(nuevo_df)}")
-        
-        # Escribir de vuelta
-        resultado = escribir_excel(archivo, hoja, nuevo_df)
+        # Leer, añadir y escribir sin que otra escritura del archivo se cuele en medio
+        with lock_escritura(archivo):
+            # Leer la hoja actual (si ya se leyó en este rerun y no ha cambiado, se reutiliza)
+            df = _leer_hoja(archivo, hoja)
+            
+            print(f"[DEBUG] Agregando fila a {hoja}")
+            print(f"[DEBUG] Nombre: {nueva_fila.get('Nombre Comercial', nueva_fila.get('Nombre', 'N/A'))}")
+            print(f"[DEBUG] Filas antes: {len(df)}")
+            
+            # Agregar la nueva fila
+            nuevo_df = pd.concat([df, pd.DataFrame([nueva_fila])], ignore_index=True)
+            
+            print(f"[DEBUG] Filas después: {len(nuevo_df)}")
+            
+            # Escribir de vuelta
+            resultado = escribir_excel(archivo, hoja, nuevo_df, filas_agregadas=pd.DataFrame([nueva_fila]))
         
         if resultado:
             print(f"[DEBUG] ✅ Fila agregada y guardada en {hoja}")
             
             # Verificar que se guardó
-            df_verif = pd.read_excel(archivo, sheet_name=hoja)
+            df_verif = _leer_hoja(archivo, hoja)
             print(f"[DEBUG] Verificación: ahora hay {len(df_verif)} filas en {hoja}")
         else:
             print(f"[DEBUG] ❌ Error al guardar en {hoja}")
@@ -131,7 +448,7 @@ def agregar_fila(archivo, hoja, nueva_fila):
         
     except Exception as e:
         print(f"[DEBUG] ❌ Excepción al agregar fila: {str(e)}")
-        st.error(f"Error al agregar fila: {str(e)}")
+        notificar_error(f"Error al agregar fila: {str(e)}")
         import traceback
         print(traceback.format_exc())
         return False
@@ -148,11 +465,12 @@ def actualizar_fila(archivo, hoja, indice, columna, nuevo_valor):
         nuevo_valor: Nuevo valor
     """
     try:
-        df = leer_excel(archivo, hoja)
-        df.loc[df.iloc[:, 0] == indice, columna] = nuevo_valor
-        return escribir_excel(archivo, hoja, df)
+        with lock_escritura(archivo):
+            df = leer_excel(archivo, hoja)
+            df.loc[df.iloc[:, 0] == indice, columna] = nuevo_valor
+            return escribir_excel(archivo, hoja, df)
     except Exception as e:
-        st.error(f"Error al actualizar: {str(e)}")
+        notificar_error(f"Error al actualizar: {str(e)}")
         return False
 
 def eliminar_fila(archivo, hoja, indice):
@@ -165,42 +483,82 @@ def eliminar_fila(archivo, hoja, indice):
         indice: ID de la fila a eliminar
     """
     try:
-        df = leer_excel(archivo, hoja)
-        df = df[df.iloc[:, 0] != indice]
-        return escribir_excel(archivo, hoja, df)
+        with lock_escritura(archivo):
+            df = leer_excel(archivo, hoja)
+            df = df[df.iloc[:, 0] != indice]
+            return escribir_excel(archivo, hoja, df)
     except Exception as e:
-        st.error(f"Error al eliminar: {str(e)}")
+        notificar_error(f"Error al eliminar: {str(e)}")
         return False
 
 # ============================================================================
 # FUNCIONES DE CÁLCULO Y RETROALIMENTACIÓN
 # ============================================================================
 
-def actualizar_precio_mercado(id_ingrediente, nuevo_precio):
+def actualizar_precio_mercado(id_ingrediente, nuevo_precio, recalcular=True):
     """
     Actualiza el precio de mercado de un ingrediente
     y recalcula los escandallos afectados
     """
+    return actualizar_precios_mercado({id_ingrediente: nuevo_precio}, recalcular=recalcular)
+
+def actualizar_precios_mercado(nuevos_precios, fuente='Manual', recalcular=True):
+    """
+    Actualiza varios precios de mercado con una escritura por hoja
+
+    El precio anterior no se pierde: queda en el histórico de precios, del
+    que salen también Var % Semana y Var % Mes de todo el maestro. Los
+    precios nuevos solo se añaden al histórico si el maestro se guardó.
+    
+    Args:
+        nuevos_precios: Dict {ID Ingrediente: nuevo precio}
+        fuente: Origen de los precios para el histórico
+        recalcular: Recalcular aquí los costes de los platos (False si se deja
+            a una tarea en segundo plano)
+
+    Returns:
+        True si se guardaron el maestro y los escandallos
+    """
+    import historico_precios
+    
     try:
-        # 1. Actualizar precio en INGREDIENTES_MAESTRO
-        df_ing = leer_excel(config.ARCHIVO_OPERACIONES, "INGREDIENTES_MAESTRO")
-        df_ing.loc[df_ing['ID Ingrediente'] == id_ingrediente, 'Precio Mercado Medio'] = nuevo_precio
-        df_ing.loc[df_ing['ID Ingrediente'] == id_ingrediente, 'Última Actualización'] = datetime.now()
-        escribir_excel(config.ARCHIVO_OPERACIONES, "INGREDIENTES_MAESTRO", df_ing)
-        
-        # 2. Actualizar escandallos que usan ese ingrediente
-        df_esc = leer_excel(config.ARCHIVO_OPERACIONES, "ESCANDALLOS")
-        mascara = df_esc['ID Ingrediente'] == id_ingrediente
-        df_esc.loc[mascara, 'Coste Unitario'] = nuevo_precio
-        df_esc.loc[mascara, 'Última Actualización'] = datetime.now()
-        escribir_excel(config.ARCHIVO_OPERACIONES, "ESCANDALLOS", df_esc)
+        # Los dos leer-modificar-escribir, sin escrituras ajenas en medio
+        with lock_escritura(config.ARCHIVO_OPERACIONES):
+            # 1. Histórico: el precio anterior como referencia si es el primero
+            # (las lecturas lanzan: con una hoja vacía se sobrescribiría entera)
+            df_ing = _leer_hoja(config.ARCHIVO_OPERACIONES, "INGREDIENTES_MAESTRO")
+            historico_precios.sembrar_desde_maestro(df_ing)
+            nuevas = historico_precios.observaciones(list(nuevos_precios), list(nuevos_precios.values()), fuente)
+            
+            # 2. Actualizar precios y variaciones en INGREDIENTES_MAESTRO
+            mascara = df_ing['ID Ingrediente'].isin(list(nuevos_precios))
+            df_ing.loc[mascara, 'Precio Mercado Medio'] = df_ing.loc[mascara, 'ID Ingrediente'].map(nuevos_precios)
+            df_ing.loc[mascara, 'Última Actualización'] = datetime.now()
+            df_ing = historico_precios.aplicar_variaciones(df_ing, pendientes=nuevas)
+            if not escribir_excel(config.ARCHIVO_OPERACIONES, "INGREDIENTES_MAESTRO", df_ing):
+                return False
+            # El histórico es solo de añadir: no registrar precios que no se aplicaron
+            historico_precios.registrar_precios(nuevas['ID Ingrediente'], nuevas['Precio'], fuente,
+                                                nuevas['Fecha'].iloc[0] if not nuevas.empty else None)
+            
+            # 3. Actualizar escandallos que usan esos ingredientes
+            df_esc = _leer_hoja(config.ARCHIVO_OPERACIONES, "ESCANDALLOS")
+            mascara = df_esc['ID Ingrediente'].isin(list(nuevos_precios))
+            df_esc.loc[mascara, 'Coste Unitario'] = df_esc.loc[mascara, 'ID Ingrediente'].map(nuevos_precios)
+            if 'Cantidad' in df_esc.columns:
+                df_esc.loc[mascara, 'Coste Total'] = pd.to_numeric(df_esc.loc[mascara, 'Cantidad'], errors='coerce') * \
+                    df_esc.loc[mascara, 'Coste Unitario']
+            df_esc.loc[mascara, 'Última Actualización'] = datetime.now()
+            if not escribir_excel(config.ARCHIVO_OPERACIONES, "ESCANDALLOS", df_esc):
+                return False
         
-        # 3. Recalcular costes de platos afectados
-        recalcular_costes_platos(df_esc)
+            # 4. Recalcular costes de platos afectados
+            if recalcular:
+                recalcular_costes_platos(df_esc)
         
         return True
     except Exception as e:
-        st.error(f"Error al actualizar precio: {str(e)}")
+        notificar_error(f"Error al actualizar precio: {str(e)}")
         return False
 
 def recalcular_costes_platos(df_escandallos):
@@ -214,31 +572,34 @@ def recalcular_costes_platos(df_escandallos):
             'Coste Total': 'sum'
         }).reset_index()
         
-        # Actualizar en CARTA_CLIENTES
-        df_carta = leer_excel(config.ARCHIVO_OPERACIONES, "CARTA_CLIENTES")
-        
-        for _, row in costes_por_plato.iterrows():
-            id_plato = row['ID Plato']
-            nuevo_coste = row['Coste Total']
+        # Actualizar en CARTA_CLIENTES. Se lee y se escribe bajo el lock del archivo:
+        # si no, un plato añadido o editado mientras tanto se perdería al guardar
+        with lock_escritura(config.ARCHIVO_OPERACIONES):
+            df_carta = leer_excel(config.ARCHIVO_OPERACIONES, "CARTA_CLIENTES")
             
-            mascara = df_carta['ID Plato'] == id_plato
-            df_carta.loc[mascara, 'Coste Total'] = nuevo_coste
-            
-            # Recalcular márgenes
-            precio_venta = df_carta.loc[mascara, 'Precio Venta'].values[0]
-            if precio_venta > 0:
-                margen_euros = precio_venta - nuevo_coste
-                margen_pct = (margen_euros / precio_venta) * 100
-                food_cost = (nuevo_coste / precio_venta) * 100
+            for _, row in costes_por_plato.iterrows():
+                id_plato = row['ID Plato']
+                nuevo_coste = row['Coste Total']
                 
-                df_carta.loc[mascara, 'Margen €'] = margen_euros
-                df_carta.loc[mascara, 'Margen %'] = margen_pct
-                df_carta.loc[mascara, 'Food Cost %'] = food_cost
-        
-        escribir_excel(config.ARCHIVO_OPERACIONES, "CARTA_CLIENTES", df_carta)
-        return True
+                mascara = df_carta['ID Plato'] == id_plato
+                if not mascara.any():
+                    continue
+                df_carta.loc[mascara, 'Coste Total'] = nuevo_coste
+                
+                # Recalcular márgenes
+                precio_venta = df_carta.loc[mascara, 'Precio Venta'].values[0]
+                if precio_venta > 0:
+                    margen_euros = precio_venta - nuevo_coste
+                    margen_pct = (margen_euros / precio_venta) * 100
+                    food_cost = (nuevo_coste / precio_venta) * 100
+                    
+                    df_carta.loc[mascara, 'Margen €'] = margen_euros
+                    df_carta.loc[mascara, 'Margen %'] = margen_pct
+                    df_carta.loc[mascara, 'Food Cost %'] = food_cost
+            
+            return escribir_excel(config.ARCHIVO_OPERACIONES, "CARTA_CLIENTES", df_carta)
     except Exception as e:
-        st.error(f"Error al recalcular costes: {str(e)}")
+        notificar_error(f"Error al recalcular costes: {str(e)}")
         return False
 
 def detectar_alertas_precios():
@@ -276,7 +637,7 @@ def detectar_alertas_precios():
         
         return alertas
     except Exception as e:
-        st.error(f"Error al detectar alertas: {str(e)}")
+        notificar_error(f"Error al detectar alertas: {str(e)}")
         return []
 
 def detectar_alertas_margenes():
@@ -304,7 +665,7 @@ def detectar_alertas_margenes():
         
         return alertas
     except Exception as e:
-        st.error(f"Error al detectar alertas de margen: {str(e)}")
+        notificar_error(f"Error al detectar alertas de margen: {str(e)}")
         return []
 
 # ============================================================================
@@ -348,37 +709,142 @@ def obtener_siguiente_id(archivo, hoja):
     Asume que la primera columna es el ID
     """
     try:
-        df = leer_excel(archivo, hoja)
-        if df.empty:
-            return 1
-        
-        max_id = df.iloc[:, 0].max()
-        return int(max_id) + 1 if pd.notna(max_id) else 1
+        return siguiente_id(leer_excel(archivo, hoja))
     except:
         return 1
 
+def siguiente_id(df):
+    """Siguiente ID a partir de la primera columna de una hoja ya leída"""
+    if df.empty:
+        return 1
+    max_id = pd.to_numeric(df.iloc[:, 0], errors='coerce').max()
+    return int(max_id) + 1 if pd.notna(max_id) else 1
+
 # ============================================================================
 # FUNCIONES DE VALIDACIÓN
 # ============================================================================
 
+# Patrones compilados una sola vez (los usan los validadores escalares y por columnas)
+PATRON_EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PATRON_TELEFONO = re.compile(r'^[6-9]\d{8}$')
+PATRON_CIF = re.compile(r'^[A-Z]\d{8}$')
+PATRON_CP = re.compile(r'^\d{5}$')
+_PATRON_NO_DIGITOS = re.compile(r'\D')
+_PATRON_DECIMAL_CERO = re.compile(r'\.0+$')
+_PATRON_PREFIJO_ESPANA = re.compile(r'^34(?=\d{9}$)')
+_PATRON_SEPARADORES_CIF = re.compile(r'[^A-Z0-9]')
+
+def _limpiar_telefono(telefono):
+    """Dígitos del teléfono sin prefijo +34 (admite el float con el que lo guarda Excel)"""
+    if isinstance(telefono, float) and telefono.is_integer():
+        telefono = int(telefono)
+    digitos = _PATRON_NO_DIGITOS.sub('', str(telefono))
+    return _PATRON_PREFIJO_ESPANA.sub('', digitos)
+
 def validar_email(email):
     """Valida formato de email"""
-    import re
-    patron = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(patron, email) is not None
+    return PATRON_EMAIL.match(str(email).strip()) is not None
 
 def validar_telefono(telefono):
     """Valida formato de teléfono español"""
-    import re
-    patron = r'^[6-9]\d{8}$'
-    telefono_limpio = ''.join(filter(str.isdigit, str(telefono)))
-    return re.match(patron, telefono_limpio) is not None
+    return PATRON_TELEFONO.match(_limpiar_telefono(telefono)) is not None
 
 def validar_cif(cif):
-    """Valida formato de CIF español (básico)"""
-    import re
-    patron = r'^[A-Z]\d{8}$'
-    return re.match(patron, str(cif).upper()) is not None
+    """Valida formato de CIF español (básico), sin separadores como validar_cifs"""
+    return PATRON_CIF.match(_PATRON_SEPARADORES_CIF.sub('', str(cif).upper())) is not None
+
+# ----------------------------------------------------------------------------
+# Versiones por columna: validan una Serie completa de una vez
+# Devuelven (máscara de válidos, valores normalizados); los vacíos no son válidos
+# ----------------------------------------------------------------------------
+
+def solo_digitos(serie):
+    """Columna como cadena de dígitos (Excel guarda teléfonos y CP como número)"""
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.to_numeric(serie, errors='coerce').round().astype('Int64').astype(str).replace('<NA>', '')
+    texto = serie.fillna('').astype(str).str.replace(_PATRON_DECIMAL_CERO, '', regex=True)
+    return texto.str.replace(_PATRON_NO_DIGITOS, '', regex=True)
+
+def validar_emails(serie):
+    """Emails en minúsculas y sin espacios + máscara de formato válido"""
+    normalizados = serie.fillna('').astype(str).str.strip().str.lower()
+    return normalizados.str.match(PATRON_EMAIL), normalizados
+
+def validar_telefonos(serie):
+    """Teléfonos como 9 dígitos (sin +34) + máscara de formato válido"""
+    normalizados = solo_digitos(serie).str.replace(_PATRON_PREFIJO_ESPANA, '', regex=True)
+    return normalizados.str.match(PATRON_TELEFONO), normalizados
+
+def validar_cifs(serie):
+    """CIF en mayúsculas y sin separadores + máscara de formato válido"""
+    normalizados = (serie.fillna('').astype(str).str.upper()
+                    .str.replace(_PATRON_SEPARADORES_CIF, '', regex=True))
+    return normalizados.str.match(PATRON_CIF), normalizados
+
+def validar_cps(serie):
+    """Códigos postales de 5 dígitos (recupera el 0 inicial perdido) + máscara"""
+    if pd.api.types.is_numeric_dtype(serie):
+        texto = solo_digitos(serie)
+    else:
+        texto = serie.fillna('').astype(str).str.strip().str.replace(_PATRON_DECIMAL_CERO, '', regex=True)
+    # Solo 4 dígitos es un CP que perdió el 0 (08001 -> 8001); otras longitudes son errores
+    normalizados = texto.where(~(texto.str.isdigit() & (texto.str.len() == 4)), '0' + texto)
+    return normalizados.str.match(PATRON_CP), normalizados
+
+# Columna -> validador por columnas usado en la revisión de calidad
+VALIDADORES_COLUMNA = {
+    'Email': validar_emails,
+    'Teléfono': validar_telefonos,
+    'CIF': validar_cifs,
+    'CP': validar_cps
+}
+
+def revisar_calidad_datos(df, columna_nombre='Nombre Comercial', obligatorias=('Nombre Comercial',)):
+    """
+    Revisa una hoja completa en una sola pasada por columna
+
+    Args:
+        df: DataFrame de la hoja (LEADS, CLIENTES_ACTIVOS...)
+        columna_nombre: Columna que identifica el registro en el informe
+        obligatorias: Columnas que no pueden estar vacías
+
+    Returns:
+        DataFrame con ID, Nombre, Columna, Valor y Problema (una fila por incidencia)
+    """
+    columnas_informe = ['ID', 'Nombre', 'Columna', 'Valor', 'Problema']
+    if df.empty:
+        return pd.DataFrame(columns=columnas_informe)
+
+    ids = df['ID'] if 'ID' in df.columns else pd.Series(df.index, index=df.index)
+    nombres = df[columna_nombre] if columna_nombre in df.columns else pd.Series('', index=df.index)
+    incidencias = []
+
+    def anotar(mascara, columna, problema):
+        if mascara.any():
+            incidencias.append(pd.DataFrame({
+                'ID': ids[mascara].to_numpy(),
+                'Nombre': nombres[mascara].to_numpy(),
+                'Columna': columna,
+                'Valor': df.loc[mascara, columna].astype(str).to_numpy(),
+                'Problema': problema
+            }))
+
+    for columna in obligatorias:
+        if columna in df.columns:
+            anotar(df[columna].fillna('').astype(str).str.strip() == '', columna, "Vacío")
+
+    for columna, validador in VALIDADORES_COLUMNA.items():
+        if columna not in df.columns:
+            continue
+        validos, normalizados = validador(df[columna])
+        anotar((normalizados != '') & ~validos, columna, "Formato no válido")
+        if columna in ('Email', 'Teléfono', 'CIF'):
+            repetidos = (normalizados != '') & validos & normalizados.duplicated(keep=False)
+            anotar(repetidos, columna, "Repetido en otro registro")
+
+    if not incidencias:
+        return pd.DataFrame(columns=columnas_informe)
+    return pd.concat(incidencias, ignore_index=True)
 
 # ============================================================================
 # FUNCIONES DE FECHA
@@ -401,3 +867,62 @@ def texto_a_fecha(texto):
         return datetime.strptime(texto, "%d/%m/%Y").date()
     except:
         return None
+
+# ============================================================================
+# FUNCIONES DE PAGINACIÓN
+# ============================================================================
+
+def ordenar_df(df, columna, ascendente=True):
+    """
+    Ordena un DataFrame por una columna (los vacíos van al final)
+    Si la columna mezcla tipos, ordena por su representación en texto
+    """
+    if not columna or columna not in df.columns:
+        return df
+    try:
+        return df.sort_values(columna, ascending=ascendente, na_position='last', kind='stable')
+    except TypeError:
+        return df.sort_values(columna, ascending=ascendente, na_position='last', kind='stable',
+                              key=lambda serie: serie.astype(str))
+
+def filtrar_texto_df(df, texto):
+    """
+    Filas en las que alguna columna contiene el texto (sin distinguir mayúsculas)
+    
+    Se compara columna a columna de forma vectorizada, por la representación
+    en texto de cada valor. Las columnas numéricas y de fecha solo se
+    convierten a texto si lo buscado contiene algún dígito.
+    """
+    texto = str(texto or '').strip()
+    if not texto or df.empty:
+        return df
+    con_digitos = any(c.isdigit() for c in texto)
+    coincide = pd.Series(False, index=df.index)
+    for columna in df.columns:
+        serie = df[columna]
+        if serie.dtype != object and not con_digitos:
+            continue
+        if pd.api.types.is_datetime64_any_dtype(serie) and serie.dt.tz is None:
+            valores = np.datetime_as_string(serie.to_numpy(), unit='s')
+        else:
+            valores = serie.to_numpy().astype(str)
+        serie = pd.Series(valores, index=df.index).where(serie.notna(), '')
+        coincide |= serie.str.contains(texto, case=False, regex=False, na=False).to_numpy()
+    return df[coincide.to_numpy()]
+
+def paginar_df(df, pagina, tamano_pagina):
+    """
+    Devuelve solo las filas de una página
+    
+    Args:
+        df: DataFrame ya filtrado y ordenado
+        pagina: Número de página (empieza en 1; se ajusta al rango válido)
+        tamano_pagina: Filas por página
+    
+    Returns:
+        tuple: (DataFrame de la página, número total de páginas)
+    """
+    total_paginas = max(1, -(-len(df) // tamano_pagina))
+    pagina = min(max(1, int(pagina)), total_paginas)
+    inicio = (pagina - 1) * tamano_pagina
+    return df.iloc[inicio:inicio + tamano_pagina], total_paginas